@@ -0,0 +1,270 @@
+"""
+batch_pipeline.py — Bloodwork pipeline over folders / manifests of PDFs
+------------------------------------------------------------------------
+Batch mode behind run_pipeline.py (used automatically when its input is a
+directory or a manifest file):
+
+  - biomarker extraction runs in a process pool (--workers)
+  - LLM analysis requests run concurrently, at most --concurrency at a time
+  - one JSON line per PDF is appended to --output-jsonl as soon as it is done
+  - re-running with the same --output-jsonl skips PDFs already recorded as
+    "ok" or "no_biomarkers" (failed ones are retried). --extract-only records
+    "extracted", which only another --extract-only run skips: a full run over
+    the same file still analyzes those PDFs
+  - a worker process that dies (e.g. killed for memory) fails the PDFs still
+    in the pool as extract errors instead of aborting the batch
+  - a throughput / latency summary is printed at the end (also on Ctrl-C)
+
+Inputs:
+  - a directory: every *.pdf below it (recursive)
+  - a .txt manifest: one PDF path per line ('#' comments allowed)
+  - a .jsonl manifest: one object per line, {"pdf": "...", ...profile fields}
+    where profile fields (age, sex, weight_kg, height_cm, activity_level,
+    goals, dietary_restrictions) override the command-line defaults
+Relative manifest paths are resolved against the manifest's directory.
+"""
+
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from bloodwork_advisor import analyze_bloodwork
+from bloodwork_cache import extract_bloodwork_cached
+
+PROFILE_FIELDS = ("age", "sex", "weight_kg", "height_cm", "activity_level", "goals", "dietary_restrictions")
+
+# Statuses that count as finished when resuming
+DONE_STATUSES = ("ok", "no_biomarkers")
+EXTRACT_ONLY_DONE_STATUSES = DONE_STATUSES + ("extracted",)
+
+
+def is_batch_input(path) -> bool:
+    path = Path(path)
+    return path.is_dir() or path.suffix.lower() in (".txt", ".jsonl")
+
+
+def load_inputs(source, default_profile=None):
+    """Expand a directory or manifest into [(pdf_path, profile), ...]."""
+    source = Path(source)
+    default_profile = dict(default_profile or {})
+    if source.is_dir():
+        return [(str(p), default_profile) for p in sorted(source.rglob("*.pdf"))]
+
+    items = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if source.suffix.lower() == ".jsonl":
+                entry = json.loads(line)
+                if "pdf" not in entry:
+                    raise ValueError(f"{source}:{line_no}: missing 'pdf'")
+                pdf = entry["pdf"]
+                profile = {**default_profile, **{k: entry[k] for k in PROFILE_FIELDS if entry.get(k) is not None}}
+            else:
+                pdf, profile = line, default_profile
+            pdf_path = Path(pdf)
+            if not pdf_path.is_absolute():
+                pdf_path = source.parent / pdf_path
+            items.append((str(pdf_path), profile))
+    return items
+
+
+def load_done(output_jsonl, extract_only=False):
+    """Inputs already recorded as finished in an earlier (possibly interrupted) run."""
+    statuses = EXTRACT_ONLY_DONE_STATUSES if extract_only else DONE_STATUSES
+    done = set()
+    if not os.path.exists(output_jsonl):
+        return done
+    with open(output_jsonl, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partial last line from an interrupted run
+            if record.get("status") in statuses:
+                done.add(record.get("input"))
+    return done
+
+
+def _extract_one(pdf_path):
+    """Worker-process job: never raises, so one bad PDF cannot break the pool."""
+    t0 = time.perf_counter()
+    try:
+        bloodwork = extract_bloodwork_cached(pdf_path)
+        return bloodwork, None, time.perf_counter() - t0
+    except Exception as exc:
+        return None, f"{type(exc).__name__}: {exc}", time.perf_counter() - t0
+
+
+def _analyze_one(bloodwork, api_key, profile, model):
+    t0 = time.perf_counter()
+    result = analyze_bloodwork(
+        bloodwork_data=bloodwork,
+        api_key=api_key,
+        user_profile=profile or None,
+        model=model,
+    )
+    return result, time.perf_counter() - t0
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]
+
+
+class _Summary:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counts = {}
+        self.extract_s = []
+        self.llm_s = []
+        self.total_s = []
+
+    def add(self, record):
+        self.counts[record["status"]] = self.counts.get(record["status"], 0) + 1
+        for key, values in (("extract_s", self.extract_s), ("llm_s", self.llm_s), ("total_s", self.total_s)):
+            if record.get(key) is not None:
+                values.append(record[key])
+
+    def report(self, skipped):
+        elapsed = time.perf_counter() - self.started
+        processed = sum(self.counts.values())
+
+        def stats(values):
+            return {"p50": _percentile(values, 50), "p95": _percentile(values, 95),
+                    "max": max(values) if values else None}
+
+        return {
+            "processed": processed,
+            "skipped": skipped,
+            "by_status": self.counts,
+            "elapsed_s": round(elapsed, 3),
+            "pdfs_per_s": round(processed / elapsed, 3) if elapsed > 0 else None,
+            "extract_s": stats(self.extract_s),
+            "llm_s": stats(self.llm_s),
+            "total_s": stats(self.total_s),
+        }
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def print_summary(summary):
+    print("\n" + "═" * 70)
+    print("BATCH SUMMARY")
+    print("═" * 70)
+    print(f"  processed   {summary['processed']}  (skipped as already done: {summary['skipped']})")
+    print(f"  by status   {summary['by_status']}")
+    print(f"  elapsed     {summary['elapsed_s']:.1f}s  →  {summary['pdfs_per_s'] or 0:.2f} PDFs/s")
+    for key in ("extract_s", "llm_s", "total_s"):
+        s = summary[key]
+        print(f"  {key:<11} p50 {_fmt(s['p50'])}  p95 {_fmt(s['p95'])}  max {_fmt(s['max'])}")
+
+
+def run_batch(source, output_jsonl, api_key=None, model="deepseek-ai/DeepSeek-R1-0528",
+              default_profile=None, workers=None, concurrency=4, extract_only=False):
+    """
+    Process every PDF in `source`, appending one JSON line per PDF to output_jsonl.
+
+    Returns:
+        The summary dict (also printed)
+    """
+    items = load_inputs(source, default_profile)
+    done = load_done(output_jsonl, extract_only)
+    todo = [(pdf, profile) for pdf, profile in items if pdf not in done]
+    skipped = len(items) - len(todo)
+    print(f"\n📂 {len(items)} PDFs in {source}: {skipped} already done, {len(todo)} to process")
+
+    workers = workers or min(4, os.cpu_count() or 1)
+    summary = _Summary()
+    if not todo:
+        report = summary.report(skipped)
+        print_summary(report)
+        return report
+
+    # Terminate a partial last line left by an interrupted run before appending
+    if os.path.exists(output_jsonl) and os.path.getsize(output_jsonl) > 0:
+        with open(output_jsonl, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    extract_pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+    llm_pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-llm")
+    pending = {}  # future -> (stage, record, profile)
+
+    with open(output_jsonl, "a", encoding="utf-8") as out:
+        if needs_newline:
+            out.write("\n")
+
+        def emit(record):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            summary.add(record)
+            icon = {"ok": "✅", "extracted": "✅", "no_biomarkers": "⚠️ "}.get(record["status"], "🔴")
+            print(f"  {icon} [{sum(summary.counts.values())}/{len(todo)}] {record['input']} ({record['status']})")
+
+        try:
+            for pdf, profile in todo:
+                record = {"input": pdf, "started": time.perf_counter()}
+                pending[extract_pool.submit(_extract_one, pdf)] = ("extract", record, profile)
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, record, profile = pending.pop(future)
+                    if stage == "extract":
+                        try:
+                            bloodwork, error, seconds = future.result()
+                        except BrokenProcessPool as exc:
+                            bloodwork, error = None, f"{type(exc).__name__}: {exc}"
+                            seconds = time.perf_counter() - record["started"]
+                        record["extract_s"] = round(seconds, 3)
+                        if error:
+                            record.update(status="error", stage="extract", error=error)
+                        elif not bloodwork["biomarkers"]:
+                            record.update(status="no_biomarkers", filename=bloodwork["filename"], biomarkers={})
+                        else:
+                            record.update(filename=bloodwork["filename"], biomarkers=bloodwork["biomarkers"])
+                            if extract_only:
+                                record["status"] = "extracted"
+                            else:
+                                llm_future = llm_pool.submit(_analyze_one, bloodwork, api_key, profile, model)
+                                pending[llm_future] = ("llm", record, profile)
+                                continue
+                    else:
+                        try:
+                            result, seconds = future.result()
+                            record.update(
+                                status="ok",
+                                llm_s=round(seconds, 3),
+                                flagged_biomarkers=result["flagged_biomarkers"],
+                                model_used=result["model_used"],
+                                recommendations=result["recommendations"],
+                            )
+                        except Exception as exc:
+                            record.update(status="error", stage="llm", error=f"{type(exc).__name__}: {exc}")
+                    record["total_s"] = round(time.perf_counter() - record.pop("started"), 3)
+                    emit(record)
+        except KeyboardInterrupt:
+            print("\n⏹  Interrupted; re-run the same command to resume.")
+        finally:
+            for future in pending:
+                future.cancel()
+            extract_pool.shutdown(wait=False, cancel_futures=True)
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+
+    report = summary.report(skipped)
+    print_summary(report)
+    return report
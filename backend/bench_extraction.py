@@ -0,0 +1,204 @@
+"""
+bench_extraction.py — Throughput, memory and accuracy benchmark for extract_bloodwork
+--------------------------------------------------------------------------------------
+Runs extract_bloodwork over a synthetic corpus (synthetic_reports.py) and
+records, per extraction mode:
+
+  - pages/s and PDFs/s (best of --repeat passes over the corpus)
+  - peak RSS of the process doing the extraction (each mode runs in a fresh
+    spawned process, so modes do not inherit each other's high-water mark)
+  - accuracy against the manifest's ground truth: recall, precision, wrong
+    values, false positives, fully-correct reports, recall per layout
+
+Results are written as JSON (--out) together with the git commit, extractor
+version and library versions, so runs on different commits can be diffed;
+--compare prints the change against an earlier results file.
+
+Usage:
+    python bench_extraction.py [--corpus bench_corpus] [--generate 50] [--max-pages 40]
+                               [--modes full stream] [--repeat 3]
+                               [--out bench_extraction.json] [--compare old.json]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+_dir = Path(__file__).resolve().parent
+
+MODES = {
+    "full": {"stream": False},
+    "stream": {"stream": True},
+}
+
+
+def _rss_mb():
+    """Peak RSS of this process so far, in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_manifest(corpus):
+    corpus = Path(corpus)
+    with open(corpus / "manifest.jsonl", "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    for entry in entries:
+        entry["path"] = str(corpus / entry["pdf"])
+    return entries
+
+
+def score(entries, outputs, tol=1e-6):
+    """Compare extracted biomarkers with ground truth."""
+    expected = correct = wrong = false_pos = exact = 0
+    by_layout = {}
+    for entry, output in zip(entries, outputs):
+        truth, got = entry["truth"], output["biomarkers"]
+        layout = by_layout.setdefault(entry["layout"], {"expected": 0, "correct": 0})
+        hits = sum(1 for k, v in truth.items() if k in got and abs(got[k] - v) <= tol)
+        expected += len(truth)
+        correct += hits
+        wrong += sum(1 for k, v in truth.items() if k in got and abs(got[k] - v) > tol)
+        false_pos += sum(1 for k in got if k not in truth)
+        exact += hits == len(truth) and len(got) == len(truth)
+        layout["expected"] += len(truth)
+        layout["correct"] += hits
+    extracted = correct + wrong + false_pos
+    return {
+        "markers_expected": expected,
+        "markers_correct": correct,
+        "wrong_values": wrong,
+        "missed": expected - correct - wrong,
+        "false_positives": false_pos,
+        "recall": round(correct / expected, 4) if expected else None,
+        "precision": round(correct / extracted, 4) if extracted else None,
+        "exact_reports": exact,
+        "reports": len(entries),
+        "recall_by_layout": {k: round(v["correct"] / v["expected"], 4) if v["expected"] else None
+                             for k, v in sorted(by_layout.items())},
+    }
+
+
+def run_mode(corpus, mode, repeat):
+    """Executed in a fresh process: time `repeat` passes over the corpus in one mode."""
+    from extract_bloodwork import extract_bloodwork
+
+    entries = load_manifest(corpus)
+    baseline_rss = _rss_mb()
+    best = float("inf")
+    outputs = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        outputs = [extract_bloodwork(e["path"], **MODES[mode]) for e in entries]
+        best = min(best, time.perf_counter() - t0)
+
+    pages_total = sum(e["pages"] for e in entries)
+    pages_read = sum(len(o["pages_read"]) if "pages_read" in o else e["pages"] for e, o in zip(entries, outputs))
+    return {
+        "pdfs": len(entries),
+        "pages_total": pages_total,
+        "pages_read": pages_read,
+        "seconds": round(best, 4),
+        "pdfs_per_s": round(len(entries) / best, 2),
+        "pages_per_s": round(pages_read / best, 2),
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+        "accuracy": score(entries, outputs),
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_dir, capture_output=True,
+                             text=True, timeout=10)
+        commit = out.stdout.strip() or None
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=_dir,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return f"{commit}-dirty" if commit and dirty else commit
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(corpus, modes, repeat):
+    import pdfplumber
+    from extract_bloodwork import EXTRACTOR_VERSION
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    for mode in modes:
+        with ctx.Pool(1) as pool:
+            results[mode] = pool.apply(run_mode, (str(corpus), mode, repeat))
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "extractor_version": EXTRACTOR_VERSION,
+            "python": platform.python_version(),
+            "pdfplumber": pdfplumber.__version__,
+            "platform": platform.platform(),
+            "corpus": str(corpus),
+            "repeat": repeat,
+        },
+        "modes": results,
+    }
+
+
+def _delta(new, old):
+    if new is None or old is None or old == 0:
+        return "     n/a"
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def print_report(report, baseline=None):
+    print(f"\ncommit {report['meta']['git_commit']}  extractor {report['meta']['extractor_version']}")
+    print(f"{'mode':<8} {'pdfs/s':>9} {'pages/s':>10} {'peak MB':>9} {'recall':>8} {'precision':>10} {'exact':>8}")
+    for mode, r in report["modes"].items():
+        acc = r["accuracy"]
+        print(f"{mode:<8} {r['pdfs_per_s']:>9.2f} {r['pages_per_s']:>10.2f} {r['peak_rss_mb']:>9.1f} "
+              f"{acc['recall']:>8.4f} {acc['precision']:>10.4f} {acc['exact_reports']:>4}/{acc['reports']:<3}")
+        old = (baseline or {}).get("modes", {}).get(mode)
+        if old:
+            print(f"{'  vs ' + str(baseline['meta'].get('git_commit')):<8} "
+                  f"{_delta(r['pdfs_per_s'], old['pdfs_per_s']):>9} {_delta(r['pages_per_s'], old['pages_per_s']):>10} "
+                  f"{_delta(r['peak_rss_mb'], old['peak_rss_mb']):>9} "
+                  f"{_delta(acc['recall'], old['accuracy']['recall']):>8} "
+                  f"{_delta(acc['precision'], old['accuracy']['precision']):>10}")
+
+
+# ── CLI entrypoint ────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extract_bloodwork on a synthetic corpus")
+    parser.add_argument("--corpus", default=str(_dir / "bench_corpus"))
+    parser.add_argument("--generate", type=int, default=50,
+                        help="Reports to generate if the corpus does not exist yet")
+    parser.add_argument("--max-pages", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="bench_extraction.json")
+    parser.add_argument("--compare", default=None, help="Earlier results file to diff against")
+    args = parser.parse_args()
+
+    if not (Path(args.corpus) / "manifest.jsonl").exists():
+        from synthetic_reports import generate_corpus
+
+        print(f"Generating {args.generate} reports into {args.corpus}…")
+        generate_corpus(args.corpus, args.generate, args.max_pages, args.seed)
+
+    report = run_benchmark(args.corpus, args.modes, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved to: {args.out}")
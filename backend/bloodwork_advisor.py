@@ -1,8 +1,12 @@
+import hashlib
 import json
-import requests
 import re
 from typing import Optional
 
+import recommendation_cache
+import upstream
+from llm_stream import ThinkFilter, iter_completion_deltas
+
 FEATHERLESS_API_URL = "https://api.featherless.ai/v1/chat/completions"
 DEFAULT_MODEL = "deepseek-ai/DeepSeek-R1-0528"
 
@@ -64,9 +68,23 @@ def _build_system_prompt() -> str:
         "- Sections: Summary, Nutrition Focus, Training Plan, Optional Supplements.\n"
     )
 
-def _build_user_prompt(flagged: dict, user_profile: Optional[dict]) -> str:
+def _build_user_prompt(flagged: dict, user_profile: Optional[dict], shared: bool = False) -> str:
+    """
+    shared: the answer is cached under a status-mode key and served to anyone with the
+    same statuses and profile bucket, so the prompt holds only what that key holds
+    (statuses, age band, BMI class, ...), never exact values
+    """
     profile_text = ""
-    if user_profile:
+    if shared:
+        bucket = recommendation_cache.profile_bucket(user_profile)
+        if bucket:
+            labels = {"age": "Age", "sex": "Sex", "bmi": "BMI class", "activity": "Activity",
+                      "goals": "Goals", "diet": "Diet"}
+            profile_text = "User Profile:\n" + "".join(
+                f"{labels[k]}: {', '.join(v) if isinstance(v, list) else v}\n" for k, v in bucket.items()
+            ) + "\n"
+        flagged = {m: {"unit": info["unit"], "status": info["status"]} for m, info in flagged.items()}
+    elif user_profile:
         profile_text = (
             f"User Profile:\n"
             f"Age: {user_profile.get('age', 'unknown')}\n"
@@ -87,12 +105,61 @@ def _build_user_prompt(flagged: dict, user_profile: Optional[dict]) -> str:
         "Optional Supplements:\n"
     )
 
+def _build_payload(flagged: dict, user_profile: Optional[dict], model: str, max_tokens: int,
+                   shared: bool = False) -> dict:
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": _build_system_prompt()},
+            {"role": "user", "content": _build_user_prompt(flagged, user_profile, shared)},
+        ],
+        "max_tokens": max_tokens,
+        "temperature": 0.3,
+    }
+
+# Part of every recommendation cache key: editing the prompts invalidates cached answers
+PROMPT_VERSION = hashlib.sha256(
+    (_build_system_prompt() + _build_user_prompt({}, {"age": 0})
+     + _build_user_prompt({}, {"age": 0}, shared=True)).encode()
+).hexdigest()[:12]
+
+def _cache_lookup(flagged, user_profile, model, max_tokens, use_cache):
+    """(cache_key, cached recommendations or None); cache_key is None when caching is off."""
+    if not use_cache:
+        return None, None
+    # Same statuses + similar profile → reuse an earlier answer (see recommendation_cache.py)
+    cache_key = recommendation_cache.signature(
+        flagged, user_profile, model=model, max_tokens=max_tokens, prompt=PROMPT_VERSION
+    )
+    return cache_key, recommendation_cache.get(cache_key)
+
+def _shared_answer(cache_key):
+    """True if the answer will be cached under a status-mode key (see _build_user_prompt)."""
+    return cache_key is not None and recommendation_cache.CACHE_MODE == "status"
+
+def _analysis_result(bloodwork_data, flagged, model, recommendations, cached):
+    return {
+        "filename": bloodwork_data.get("filename", "unknown"),
+        "flagged_biomarkers": flagged,
+        "model_used": model,
+        "recommendations": recommendations,
+        "cached": cached,
+    }
+
+def _finish_analysis(response_json, cache_key):
+    raw_output = response_json["choices"][0]["message"]["content"]
+    cleaned_output = _clean_text(raw_output)
+    if cache_key is not None and cleaned_output:
+        recommendation_cache.put(cache_key, cleaned_output)
+    return cleaned_output
+
 def analyze_bloodwork(
     bloodwork_data: dict,
     api_key: str,
     user_profile: Optional[dict] = None,
     model: str = DEFAULT_MODEL,
     max_tokens: int = 1200,
+    use_cache: bool = True,
 ) -> dict:
 
     biomarkers = bloodwork_data.get("biomarkers", {})
@@ -100,28 +167,98 @@ def analyze_bloodwork(
         raise ValueError("No biomarkers found in bloodwork_data.")
 
     flagged = _flag_biomarkers(biomarkers)
+    cache_key, cached = _cache_lookup(flagged, user_profile, model, max_tokens, use_cache)
+    if cached is not None:
+        return _analysis_result(bloodwork_data, flagged, model, cached, cached=True)
 
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": _build_system_prompt()},
-            {"role": "user", "content": _build_user_prompt(flagged, user_profile)},
-        ],
-        "max_tokens": max_tokens,
-        "temperature": 0.3,
-    }
+    payload = _build_payload(flagged, user_profile, model, max_tokens, _shared_answer(cache_key))
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+    response = upstream.post("featherless", FEATHERLESS_API_URL, headers=headers, json=payload, timeout=120)
+    response.raise_for_status()
+    recommendations = _finish_analysis(response.json(), cache_key)
+    return _analysis_result(bloodwork_data, flagged, model, recommendations, cached=False)
 
+async def analyze_bloodwork_async(
+    bloodwork_data: dict,
+    api_key: str,
+    user_profile: Optional[dict] = None,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 1200,
+    use_cache: bool = True,
+) -> dict:
+    """
+    analyze_bloodwork() for the event loop: awaits the pooled async client
+    instead of blocking a thread-pool thread for the whole LLM call.
+    Raises httpx errors instead of requests errors.
+    """
+    biomarkers = bloodwork_data.get("biomarkers", {})
+    if not biomarkers:
+        raise ValueError("No biomarkers found in bloodwork_data.")
+
+    flagged = _flag_biomarkers(biomarkers)
+    cache_key, cached = _cache_lookup(flagged, user_profile, model, max_tokens, use_cache)
+    if cached is not None:
+        return _analysis_result(bloodwork_data, flagged, model, cached, cached=True)
+
+    payload = _build_payload(flagged, user_profile, model, max_tokens, _shared_answer(cache_key))
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
-    response = requests.post(FEATHERLESS_API_URL, headers=headers, json=payload, timeout=120)
+    response = await upstream.apost("featherless", FEATHERLESS_API_URL, headers=headers, json=payload, timeout=120)
     response.raise_for_status()
-    raw_output = response.json()["choices"][0]["message"]["content"]
+    recommendations = _finish_analysis(response.json(), cache_key)
+    return _analysis_result(bloodwork_data, flagged, model, recommendations, cached=False)
 
-    cleaned_output = _clean_text(raw_output)
+def stream_bloodwork_analysis(
+    bloodwork_data: dict,
+    api_key: str,
+    user_profile: Optional[dict] = None,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 1200,
+    use_cache: bool = True,
+):
+    """
+    Streaming variant of analyze_bloodwork(). Yields (event, data) tuples:
 
-    return {
-        "filename": bloodwork_data.get("filename", "unknown"),
-        "flagged_biomarkers": flagged,
-        "model_used": model,
-        "recommendations": cleaned_output,
-    }
\ No newline at end of file
+        ("flagged", {"filename", "flagged_biomarkers"})   immediately, before any LLM call
+        ("delta",   "text")                                recommendation text as it arrives,
+                                                           with <think> blocks already removed
+        ("done",    {"model_used", "recommendations", "cached"})
+
+    Errors from the upstream call propagate to the caller.
+    """
+    biomarkers = bloodwork_data.get("biomarkers", {})
+    if not biomarkers:
+        raise ValueError("No biomarkers found in bloodwork_data.")
+
+    flagged = _flag_biomarkers(biomarkers)
+    yield "flagged", {"filename": bloodwork_data.get("filename", "unknown"), "flagged_biomarkers": flagged}
+
+    cache_key, cached = _cache_lookup(flagged, user_profile, model, max_tokens, use_cache)
+    if cached is not None:
+        yield "delta", cached
+        yield "done", {"model_used": model, "recommendations": cached, "cached": True}
+        return
+
+    payload = {**_build_payload(flagged, user_profile, model, max_tokens, _shared_answer(cache_key)), "stream": True}
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+    think_filter = ThinkFilter()
+    parts = []
+    with upstream.post("featherless", FEATHERLESS_API_URL, headers=headers, json=payload, timeout=120,
+                       stream=True) as response:
+        response.raise_for_status()
+        for delta in iter_completion_deltas(response):
+            text = think_filter.feed(delta)
+            if text:
+                parts.append(text)
+                yield "delta", text
+    tail = think_filter.flush()
+    if tail:
+        parts.append(tail)
+        yield "delta", tail
+
+    cleaned_output = _clean_text("".join(parts))
+    if cache_key is not None and cleaned_output:
+        recommendation_cache.put(cache_key, cleaned_output)
+    yield "done", {"model_used": model, "recommendations": cleaned_output, "cached": False}
@@ -0,0 +1,216 @@
+"""
+bloodwork_cache.py — Content-addressed cache for extract_bloodwork results
+--------------------------------------------------------------------------
+Users upload the same report again and again. Results are keyed by the
+SHA-256 of the PDF bytes plus the extractor version (pattern set) and the
+extraction options, so editing BIOMARKER_PATTERNS invalidates old entries
+automatically.
+
+Two tiers:
+  - an in-process LRU front cache (lru_cache.LRUCache)
+  - an on-disk JSON store with a total size cap and LRU eviction
+    (file mtime is bumped on every hit)
+
+Config (.env):
+    BLOODWORK_CACHE             "0" disables caching (default on)
+    BLOODWORK_CACHE_DIR         default backend/.cache/bloodwork
+    BLOODWORK_CACHE_MAX_MB      disk cap, default 256
+    BLOODWORK_CACHE_MEMORY      in-process entries, default 256
+"""
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from extract_bloodwork import EXTRACTOR_VERSION, extract_bloodwork
+from lru_cache import LRUCache
+
+_dir = Path(__file__).resolve().parent
+
+CACHE_ENABLED = (os.getenv("BLOODWORK_CACHE") or "1").strip().lower() not in ("0", "false", "no")
+CACHE_DIR = Path(os.getenv("BLOODWORK_CACHE_DIR") or (_dir / ".cache" / "bloodwork"))
+CACHE_MAX_BYTES = int(float(os.getenv("BLOODWORK_CACHE_MAX_MB") or 256) * 1024 * 1024)
+CACHE_MEMORY_ENTRIES = int(os.getenv("BLOODWORK_CACHE_MEMORY") or 256)
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def sha256_file(path) -> str:
+    """SHA-256 of a file path or seekable binary file object (rewound afterwards)."""
+    h = hashlib.sha256()
+    if hasattr(path, "read"):
+        path.seek(0)
+        for chunk in iter(lambda: path.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+        path.seek(0)
+        return h.hexdigest()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(pdf_sha256: str, **options) -> str:
+    """Key = PDF content hash + extractor version + any option that changes the result."""
+    opts = json.dumps(options, sort_keys=True, default=list)
+    return hashlib.sha256(f"{pdf_sha256}|{EXTRACTOR_VERSION}|{opts}".encode()).hexdigest()
+
+
+class DiskLRUStore:
+    """JSON files under a directory, evicted least-recently-used once total size exceeds max_bytes."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._total_bytes = None  # computed lazily on first write
+        self.evictions = 0
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(value).encode("utf-8")
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for path in self.directory.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Delete oldest-used entries until the store is back under 90% of the cap."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+
+class ExtractionCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, memory_entries=CACHE_MEMORY_ENTRIES):
+        self.memory = LRUCache(memory_entries)
+        self.disk = DiskLRUStore(directory, max_bytes)
+        self.disk_hits = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        value = self.disk.get(key)
+        if value is not None:
+            self.disk_hits += 1
+            self.memory.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        try:
+            self.disk.put(key, value)
+        except OSError as exc:
+            print(f"[bloodwork_cache] could not write {key}: {exc}")
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "disk_evictions": self.disk.evictions,
+            "extractor_version": EXTRACTOR_VERSION,
+        }
+
+
+_cache = ExtractionCache() if CACHE_ENABLED else None
+
+
+def lookup(pdf_sha256, filename=None, **kwargs):
+    """Cached extraction result for these PDF bytes and options, or None on a miss."""
+    if _cache is None:
+        return None
+    cached = _cache.get(cache_key(pdf_sha256, **kwargs))
+    if cached is None:
+        return None
+    return {"filename": filename, **copy.deepcopy(cached)}
+
+
+def store(pdf_sha256, result, **kwargs):
+    """Remember an extract_bloodwork() result computed elsewhere (e.g. in pdf_workers)."""
+    if _cache is not None:
+        value = copy.deepcopy({k: v for k, v in result.items() if k != "filename"})
+        _cache.put(cache_key(pdf_sha256, **kwargs), value)
+
+
+def extract_bloodwork_cached(pdf_path, output_json_path=None, pdf_sha256=None, filename=None, **kwargs):
+    """
+    Drop-in for extract_bloodwork() that reuses results for identical PDF bytes.
+
+    pdf_path: file path or seekable binary file object
+    pdf_sha256: pass the content hash if the caller already computed it (e.g. while
+    receiving an upload) to skip re-reading the file.
+    filename: name reported in the output (defaults to the file name of pdf_path)
+    """
+    if _cache is None:
+        return extract_bloodwork(pdf_path, output_json_path, filename=filename, **kwargs)
+
+    if filename is None and isinstance(pdf_path, (str, Path)):
+        filename = Path(pdf_path).name
+    pdf_sha256 = pdf_sha256 or sha256_file(pdf_path)
+    output = lookup(pdf_sha256, filename, **kwargs)
+    if output is None:
+        output = extract_bloodwork(pdf_path, filename=filename, **kwargs)
+        store(pdf_sha256, output, **kwargs)
+    if output_json_path:
+        with open(output_json_path, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"Saved to: {output_json_path}")
+    return output
+
+
+def cache_stats():
+    return _cache.stats() if _cache else None
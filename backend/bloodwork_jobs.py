@@ -0,0 +1,509 @@
+"""
+bloodwork_jobs.py — Submit / poll / webhook job queue for bloodwork analyses
+-----------------------------------------------------------------------------
+/analyze-full keeps a connection open for the whole extract + LLM pipeline
+(up to ~2 minutes). Jobs decouple accepting work from doing it:
+
+  - submit() stores the PDF and profile in a local SQLite job store and
+    returns a job id at once; a bounded set of asyncio workers processes
+    jobs in order (PDF parsing in the pdf_workers process pool, the LLM
+    call awaited on the pooled upstream client)
+  - identical submissions (same PDF bytes + same profile + model) that are
+    queued, running, or finished successfully within the dedup window are
+    deduplicated to the existing job
+  - every job records per-stage timings (queued, extract, analyze, total)
+  - an optional webhook receives the finished job as JSON (retried with
+    backoff); delivery status is stored on the job. A deduplicated
+    submission's webhook is added to the existing job, and is called at once
+    if that job has already finished
+  - webhook URLs must resolve to public addresses (checked on submit and
+    again before each delivery), or match BLOODWORK_JOB_WEBHOOK_HOSTS
+  - several API processes can share one store: a worker claims a queued
+    job atomically (conditional UPDATE), so each job runs and calls its
+    webhooks once. The owning process renews a lease on the job while it
+    runs; a job whose lease expires (its process died) is queued again and
+    picked up by any process, while jobs other live processes are running
+    are left alone
+  - the PDF bytes are dropped from the store once a job finishes, and
+    finished jobs are deleted after BLOODWORK_JOB_RETENTION
+
+Config (.env):
+    BLOODWORK_JOBS_DB           SQLite path, default backend/.cache/bloodwork_jobs.sqlite3
+    BLOODWORK_JOB_WORKERS       concurrent jobs, default 2
+    BLOODWORK_JOB_QUEUE_MAX     queued jobs before submit() refuses, default 1000
+    BLOODWORK_JOB_DEDUP_TTL     seconds a finished job is reused for, default 86400
+    BLOODWORK_JOB_WEBHOOK_TRIES webhook attempts, default 3
+    BLOODWORK_JOB_WEBHOOK_HOSTS comma-separated webhook hosts to allow (e.g. internal
+                                services); when set, only these hosts are accepted
+    BLOODWORK_JOB_RETENTION     seconds finished jobs are kept, default 604800 (0 = forever)
+    BLOODWORK_JOB_LEASE         seconds a running job stays claimed without a heartbeat
+                                from its process, default 60
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+
+import bloodwork_cache
+import upstream
+from bloodwork_advisor import analyze_bloodwork_async
+
+_dir = Path(__file__).resolve().parent
+
+JOBS_DB = Path(os.getenv("BLOODWORK_JOBS_DB") or (_dir / ".cache" / "bloodwork_jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("BLOODWORK_JOB_WORKERS") or 2)
+JOB_QUEUE_MAX = int(os.getenv("BLOODWORK_JOB_QUEUE_MAX") or 1000)
+JOB_DEDUP_TTL = float(os.getenv("BLOODWORK_JOB_DEDUP_TTL") or 86400)
+WEBHOOK_TRIES = int(os.getenv("BLOODWORK_JOB_WEBHOOK_TRIES") or 3)
+WEBHOOK_HOSTS = {h.strip().lower() for h in (os.getenv("BLOODWORK_JOB_WEBHOOK_HOSTS") or "").split(",") if h.strip()}
+JOB_RETENTION = float(os.getenv("BLOODWORK_JOB_RETENTION") or 604800)
+JOB_LEASE = float(os.getenv("BLOODWORK_JOB_LEASE") or 60)
+PURGE_INTERVAL = 3600.0
+
+QUEUED, EXTRACTING, ANALYZING, DONE, ERROR = "queued", "extracting", "analyzing", "done", "error"
+ACTIVE_STATUSES = (QUEUED, EXTRACTING, ANALYZING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id              TEXT PRIMARY KEY,
+    dedup_key       TEXT NOT NULL,
+    pdf_sha256      TEXT NOT NULL,
+    filename        TEXT,
+    profile         TEXT NOT NULL,
+    model           TEXT,
+    webhook_url     TEXT,
+    status          TEXT NOT NULL,
+    created_at      REAL NOT NULL,
+    started_at      REAL,
+    finished_at     REAL,
+    timings         TEXT NOT NULL DEFAULT '{}',
+    result          TEXT,
+    error           TEXT,
+    webhook_status  TEXT,
+    pdf             BLOB,
+    owner           TEXT,
+    lease_until     REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_webhooks (
+    job_id  TEXT NOT NULL,
+    url     TEXT NOT NULL,
+    status  TEXT,
+    PRIMARY KEY (job_id, url)
+);
+"""
+
+_PUBLIC_COLUMNS = ("id", "pdf_sha256", "filename", "profile", "model", "webhook_url", "status",
+                   "created_at", "started_at", "finished_at", "timings", "result", "error", "webhook_status")
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class InvalidWebhook(ValueError):
+    pass
+
+
+async def check_webhook_url(url):
+    """
+    Raise InvalidWebhook unless url is http(s) and its host is allowed: listed in
+    BLOODWORK_JOB_WEBHOOK_HOSTS if that is set, otherwise resolving only to
+    public addresses (no loopback, private, link-local or reserved ranges).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise InvalidWebhook("webhook_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if WEBHOOK_HOSTS:
+        if host not in WEBHOOK_HOSTS:
+            raise InvalidWebhook(f"webhook host {host!r} is not allowed")
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, ValueError):
+        raise InvalidWebhook(f"webhook host {host!r} does not resolve") from None
+    for info in infos:
+        ip = ipaddress.ip_address(info[4][0].split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise InvalidWebhook(f"webhook host {host!r} resolves to a non-public address")
+
+
+def dedup_key(pdf_sha256, profile, model):
+    """Jobs with the same PDF bytes, profile and model produce the same answer."""
+    return hashlib.sha256(
+        json.dumps({"pdf": pdf_sha256, "profile": profile, "model": model}, sort_keys=True).encode()
+    ).hexdigest()
+
+
+class JobStore:
+    """SQLite-backed job table. One connection guarded by a lock; every call is a short statement."""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            # Stores created before job leases existed
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def insert(self, job):
+        columns = ", ".join(job)
+        placeholders = ", ".join("?" for _ in job)
+        self._execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})", tuple(job.values()))
+
+    def update(self, job_id, owner=None, **fields):
+        """Set fields; with owner, only while that process still holds the job. True if a row changed."""
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        sql, params = f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id)
+        if owner is not None:
+            sql, params = sql + " AND owner = ?", (*params, owner)
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount > 0
+
+    def claim(self, job_id, owner, lease_until, started_at):
+        """Atomically take a queued job; False if another process got it first."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, started_at = ? WHERE id = ? AND status = ?",
+                (EXTRACTING, owner, lease_until, started_at, job_id, QUEUED),
+            )
+            return cur.rowcount > 0
+
+    def renew(self, job_id, owner, lease_until):
+        """Extend a running job's lease; False if the job is no longer held by owner."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status IN (?, ?)",
+                (lease_until, job_id, owner, EXTRACTING, ANALYZING),
+            )
+            return cur.rowcount > 0
+
+    def release_expired(self, now):
+        """Queue running jobs again whose owner stopped renewing the lease; returns how many."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL "
+                "WHERE status IN (?, ?) AND (lease_until IS NULL OR lease_until < ?)",
+                (QUEUED, EXTRACTING, ANALYZING, now),
+            )
+            return cur.rowcount
+
+    def find_reusable(self, key, since):
+        rows = self._execute(
+            "SELECT id FROM jobs WHERE dedup_key = ? AND status != ? AND created_at >= ? "
+            "ORDER BY created_at DESC LIMIT 1",
+            (key, ERROR, since),
+        )
+        return rows[0]["id"] if rows else None
+
+    def get(self, job_id):
+        rows = self._execute(f"SELECT {', '.join(_PUBLIC_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        for field in ("profile", "timings", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def get_pdf(self, job_id):
+        rows = self._execute("SELECT pdf FROM jobs WHERE id = ?", (job_id,))
+        return rows[0]["pdf"] if rows else None
+
+    def queued(self):
+        rows = self._execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))
+        return [row["id"] for row in rows]
+
+    def add_webhook(self, job_id, url):
+        """Subscribe another webhook to a job; False if it was already subscribed."""
+        with self._lock:
+            cur = self._conn.execute("INSERT OR IGNORE INTO job_webhooks (job_id, url) VALUES (?, ?)", (job_id, url))
+            return cur.rowcount > 0
+
+    def pending_webhooks(self, job_id):
+        rows = self._execute("SELECT url FROM job_webhooks WHERE job_id = ? AND status IS NULL", (job_id,))
+        return [row["url"] for row in rows]
+
+    def claim_webhook(self, job_id, url):
+        """Mark a pending webhook as being delivered; False if someone else already claimed it."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE job_webhooks SET status = 'delivering' WHERE job_id = ? AND url = ? AND status IS NULL",
+                (job_id, url),
+            )
+            return cur.rowcount > 0
+
+    def set_webhook_status(self, job_id, url, status):
+        self._execute("UPDATE job_webhooks SET status = ? WHERE job_id = ? AND url = ?", (status, job_id, url))
+
+    def purge(self, before):
+        """Delete jobs that finished before `before` (epoch seconds); returns how many."""
+        finished = "SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?"
+        with self._lock:
+            self._conn.execute(f"DELETE FROM job_webhooks WHERE job_id IN ({finished})", (DONE, ERROR, before))
+            return self._conn.execute(f"DELETE FROM jobs WHERE id IN ({finished})", (DONE, ERROR, before)).rowcount
+
+    def counts(self):
+        return {row["status"]: row["n"] for row in self._execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+
+class BloodworkJobQueue:
+    """
+    pdf_pool:   pdf_workers.PdfWorkerPool used for extraction
+    api_key_fn: returns the Featherless API key (read at processing time)
+    """
+
+    def __init__(self, pdf_pool, api_key_fn, store=None, workers=JOB_WORKERS, queue_max=JOB_QUEUE_MAX,
+                 extract_options=None):
+        self.pdf_pool = pdf_pool
+        self.api_key_fn = api_key_fn
+        self.store = store or JobStore()
+        self.workers = max(1, int(workers))
+        self.queue_max = max(1, int(queue_max))
+        self.extract_options = dict(extract_options or {})
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = None
+        self._queued_ids = set()  # job ids in this process's in-memory queue
+        self._tasks = []
+        self._deliveries = set()  # webhook tasks for deduplicated submissions of finished jobs
+        self._last_purge = None
+
+    # ── lifecycle ──
+
+    def start(self):
+        """Start the worker tasks on the running event loop and pick up queued or abandoned jobs."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._maybe_purge()
+        self._recover()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover_forever()))
+
+    def _enqueue(self, job_id):
+        if job_id not in self._queued_ids:
+            self._queued_ids.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    def _recover(self):
+        """Re-queue jobs whose lease expired, and queue every queued job this process does not hold yet."""
+        released = self.store.release_expired(time.time())
+        if released:
+            print(f"[bloodwork_jobs] re-queued {released} job(s) abandoned by a stopped process")
+        for job_id in self.store.queued():
+            self._enqueue(job_id)
+
+    async def _recover_forever(self):
+        while True:
+            await asyncio.sleep(JOB_LEASE)
+            try:
+                self._recover()
+            except Exception as exc:
+                print(f"[bloodwork_jobs] recovery failed: {exc}")
+
+    async def stop(self):
+        tasks = self._tasks + list(self._deliveries)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ── API ──
+
+    def submit(self, pdf_bytes, pdf_sha256, filename=None, profile=None, model=None, webhook_url=None):
+        """
+        Queue a job, or return the existing one for an identical submission.
+        webhook_url must already have passed check_webhook_url().
+
+        Returns:
+            (job dict, deduplicated: bool)
+        """
+        self.start()
+        profile = profile or {}
+        key = dedup_key(pdf_sha256, profile, model)
+        existing = self.store.find_reusable(key, since=time.time() - JOB_DEDUP_TTL)
+        if existing:
+            if webhook_url and self.store.add_webhook(existing, webhook_url):
+                # Read after subscribing: a job that finishes after this read delivers it itself
+                job = self.store.get(existing)
+                if job["status"] not in ACTIVE_STATUSES:
+                    task = asyncio.create_task(self._deliver_extra_webhook(existing, webhook_url))
+                    self._deliveries.add(task)
+                    task.add_done_callback(self._deliveries.discard)
+                return job, True
+            return self.store.get(existing), True
+        if self._queue.qsize() >= self.queue_max:
+            raise QueueFull("Job queue is full")
+
+        job_id = uuid.uuid4().hex
+        self.store.insert({
+            "id": job_id,
+            "dedup_key": key,
+            "pdf_sha256": pdf_sha256,
+            "filename": filename,
+            "profile": json.dumps(profile),
+            "model": model,
+            "webhook_url": webhook_url,
+            "status": QUEUED,
+            "created_at": time.time(),
+            "pdf": pdf_bytes,
+        })
+        self._enqueue(job_id)
+        return self.store.get(job_id), False
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "queued_in_memory": self._queue.qsize() if self._queue else 0,
+            "queue_max": self.queue_max,
+            "owner": self.owner,
+            "jobs_by_status": self.store.counts(),
+        }
+
+    # ── processing ──
+
+    async def _worker(self, index):
+        while True:
+            job_id = await self._queue.get()
+            self._queued_ids.discard(job_id)
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # never let one job kill the worker
+                print(f"[bloodwork_jobs] worker {index}: job {job_id} crashed: {exc}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != QUEUED:
+            return
+        started = time.time()
+        if not self.store.claim(job_id, self.owner, started + JOB_LEASE, started):
+            return  # another process claimed it first
+        timings = {"queued_s": round(started - job["created_at"], 3)}
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+
+        try:
+            t0 = time.perf_counter()
+            bloodwork = bloodwork_cache.lookup(job["pdf_sha256"], job["filename"], **self.extract_options)
+            if bloodwork is None:
+                pdf = self.store.get_pdf(job_id)
+                bloodwork = await self.pdf_pool.extract(pdf, filename=job["filename"], **self.extract_options)
+                bloodwork_cache.store(job["pdf_sha256"], bloodwork, **self.extract_options)
+            timings["extract_s"] = round(time.perf_counter() - t0, 3)
+            if not bloodwork.get("biomarkers"):
+                raise ValueError("No biomarkers extracted.")
+
+            self.store.update(job_id, owner=self.owner, status=ANALYZING, timings=json.dumps(timings))
+            t0 = time.perf_counter()
+            kwargs = {"model": job["model"]} if job["model"] else {}
+            analysis = await analyze_bloodwork_async(
+                bloodwork_data=bloodwork,
+                api_key=self.api_key_fn(),
+                user_profile=job["profile"] or None,
+                **kwargs,
+            )
+            timings["analyze_s"] = round(time.perf_counter() - t0, 3)
+            result = {
+                "extracted_biomarkers": bloodwork["biomarkers"],
+                "flagged_biomarkers": analysis["flagged_biomarkers"],
+                "recommendations": analysis["recommendations"],
+                "cached_recommendations": analysis.get("cached", False),
+            }
+            fields = {"status": DONE, "result": json.dumps(result)}
+        except Exception as exc:
+            fields = {"status": ERROR, "error": f"{type(exc).__name__}: {exc}"}
+        finally:
+            heartbeat.cancel()
+
+        finished = time.time()
+        timings["total_s"] = round(finished - job["created_at"], 3)
+        if not self.store.update(job_id, owner=self.owner, finished_at=finished, timings=json.dumps(timings),
+                                 pdf=None, lease_until=None, **fields):
+            # The lease expired and another process re-ran the job; it sends the webhooks
+            print(f"[bloodwork_jobs] job {job_id}: lost its lease, dropping this result")
+            return
+
+        finished_job = self.store.get(job_id)
+        if job["webhook_url"]:
+            status = await self._deliver_webhook(job["webhook_url"], finished_job)
+            self.store.update(job_id, webhook_status=status)
+        for url in self.store.pending_webhooks(job_id):
+            await self._deliver_extra_webhook(job_id, url, finished_job)
+        self._maybe_purge()
+
+    async def _heartbeat(self, job_id):
+        """Renew the job's lease while it runs."""
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            if not self.store.renew(job_id, self.owner, time.time() + JOB_LEASE):
+                print(f"[bloodwork_jobs] job {job_id}: lease lost")
+                return
+
+    def _maybe_purge(self):
+        """Delete finished jobs past the retention window, at most once per PURGE_INTERVAL."""
+        now = time.monotonic()
+        if JOB_RETENTION <= 0 or (self._last_purge is not None and now - self._last_purge < PURGE_INTERVAL):
+            return
+        self._last_purge = now
+        purged = self.store.purge(before=time.time() - JOB_RETENTION)
+        if purged:
+            print(f"[bloodwork_jobs] purged {purged} finished job(s) older than {JOB_RETENTION:.0f}s")
+
+    async def _deliver_extra_webhook(self, job_id, url, job=None):
+        """Deliver to a webhook added by a deduplicated submission, exactly once."""
+        if not self.store.claim_webhook(job_id, url):
+            return
+        status = await self._deliver_webhook(url, job or self.store.get(job_id))
+        self.store.set_webhook_status(job_id, url, status)
+
+    @staticmethod
+    async def _deliver_webhook(url, job):
+        try:
+            await check_webhook_url(url)  # again: DNS may have changed since submit
+        except InvalidWebhook as exc:
+            return f"rejected: {exc}"
+        delay = 1.0
+        for attempt in range(1, WEBHOOK_TRIES + 1):
+            try:
+                response = await upstream.apost("webhook", url, json=job)
+                if response.status_code < 400:
+                    return f"delivered ({response.status_code})"
+                outcome = f"HTTP {response.status_code}"
+            except httpx.HTTPError as exc:
+                outcome = type(exc).__name__
+            if attempt < WEBHOOK_TRIES:
+                await asyncio.sleep(delay)
+                delay *= 2
+        return f"failed after {WEBHOOK_TRIES} attempts: {outcome}"
@@ -5,12 +5,13 @@ See https://cal.com/docs/api-reference/v2/bookings/create-a-booking
 """
 import os
 import re
-import requests
 from pathlib import Path
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 
+import upstream
+
 _CAL_ENV_PATH = Path(__file__).resolve().parent / ".env"
 
 CAL_API_URL = "https://api.cal.com/v2/bookings"
@@ -52,23 +53,18 @@ def _normalize_start_iso(start: str) -> str:
     return s
 
 
-def create_booking(
+def _booking_request(
     start: str,
     name: str,
     email: str,
-    time_zone: str = "America/New_York",
-    event_type_id: int | None = None,
-    event_type_slug: str | None = None,
-    username: str | None = None,
-    organization_slug: str | None = None,
-    length_in_minutes: int | None = None,
-) -> dict:
-    """
-    Create a Cal.com booking.
-    start: ISO 8601 datetime in UTC (e.g. 2024-08-13T18:00:00Z).
-    name, email: attendee details.
-    Identify event type by event_type_id OR (event_type_slug + username).
-    """
+    time_zone: str,
+    event_type_id: int | None,
+    event_type_slug: str | None,
+    username: str | None,
+    organization_slug: str | None,
+    length_in_minutes: int | None,
+) -> tuple[dict, dict]:
+    """Headers and JSON payload for a booking request."""
     api_key = _get_cal_api_key()
     if not api_key:
         raise ValueError(
@@ -99,32 +95,20 @@ def create_booking(
         "Content-Type": "application/json",
         "cal-api-version": CAL_API_VERSION,
     }
-    r = requests.post(CAL_API_URL, headers=headers, json=payload, timeout=15)
-    if not r.ok:
-        try:
-            err_body = r.json()
-            msg = err_body.get("message") or err_body.get("error") or str(err_body) or r.text or r.reason
-        except Exception:
-            msg = r.text or r.reason
-        raise ValueError(f"Cal.com {r.status_code}: {msg}")
-    return r.json()
+    return headers, payload
 
 
-def get_available_slots(
+def _slots_request(
     start: str,
     end: str,
-    time_zone: str = "America/New_York",
-    event_type_id: int | None = None,
-    event_type_slug: str | None = None,
-    username: str | None = None,
-    organization_slug: str | None = None,
-    duration_minutes: int | None = None,
-) -> dict:
-    """
-    Get available time slots from Cal.com.
-    start, end: date or ISO range (e.g. 2025-02-24, 2025-03-10) in UTC.
-    Returns Cal.com response data: { "YYYY-MM-DD": [ { "start", "end" }, ... ], ... }.
-    """
+    time_zone: str,
+    event_type_id: int | None,
+    event_type_slug: str | None,
+    username: str | None,
+    organization_slug: str | None,
+    duration_minutes: int | None,
+) -> tuple[dict, dict]:
+    """Headers and query params for a slots request."""
     api_key = _get_cal_api_key()
     if not api_key:
         raise ValueError(
@@ -146,15 +130,23 @@ def get_available_slots(
         "Authorization": f"Bearer {api_key}",
         "cal-api-version": CAL_SLOTS_API_VERSION,
     }
-    r = requests.get(CAL_SLOTS_URL, params=params, headers=headers, timeout=15)
-    if not r.ok:
-        try:
-            err_body = r.json()
-            msg = err_body.get("message") or err_body.get("error") or str(err_body) or r.text or r.reason
-        except Exception:
-            msg = r.text or r.reason
-        raise ValueError(f"Cal.com slots {r.status_code}: {msg}")
-    out = r.json()
+    return headers, params
+
+
+def _raise_for_cal_error(r, label: str) -> None:
+    """Raise ValueError with Cal.com's message for a failed requests / httpx response."""
+    if r.status_code < 400:
+        return
+    reason = getattr(r, "reason", None) or getattr(r, "reason_phrase", "")
+    try:
+        err_body = r.json()
+        msg = err_body.get("message") or err_body.get("error") or str(err_body) or r.text or reason
+    except Exception:
+        msg = r.text or reason
+    raise ValueError(f"{label} {r.status_code}: {msg}")
+
+
+def _filter_slots(out, time_zone: str):
     data = out.get("data") if isinstance(out, dict) and "data" in out else out
     if not data or not isinstance(data, dict):
         return data
@@ -181,3 +173,86 @@ def get_available_slots(
         if keep:
             filtered[date_key] = keep
     return filtered
+
+
+def create_booking(
+    start: str,
+    name: str,
+    email: str,
+    time_zone: str = "America/New_York",
+    event_type_id: int | None = None,
+    event_type_slug: str | None = None,
+    username: str | None = None,
+    organization_slug: str | None = None,
+    length_in_minutes: int | None = None,
+) -> dict:
+    """
+    Create a Cal.com booking.
+    start: ISO 8601 datetime in UTC (e.g. 2024-08-13T18:00:00Z).
+    name, email: attendee details.
+    Identify event type by event_type_id OR (event_type_slug + username).
+    """
+    headers, payload = _booking_request(start, name, email, time_zone, event_type_id, event_type_slug,
+                                        username, organization_slug, length_in_minutes)
+    r = upstream.post("cal", CAL_API_URL, headers=headers, json=payload)
+    _raise_for_cal_error(r, "Cal.com")
+    return r.json()
+
+
+async def acreate_booking(
+    start: str,
+    name: str,
+    email: str,
+    time_zone: str = "America/New_York",
+    event_type_id: int | None = None,
+    event_type_slug: str | None = None,
+    username: str | None = None,
+    organization_slug: str | None = None,
+    length_in_minutes: int | None = None,
+) -> dict:
+    """Async variant of create_booking()."""
+    headers, payload = _booking_request(start, name, email, time_zone, event_type_id, event_type_slug,
+                                        username, organization_slug, length_in_minutes)
+    r = await upstream.apost("cal", CAL_API_URL, headers=headers, json=payload)
+    _raise_for_cal_error(r, "Cal.com")
+    return r.json()
+
+
+def get_available_slots(
+    start: str,
+    end: str,
+    time_zone: str = "America/New_York",
+    event_type_id: int | None = None,
+    event_type_slug: str | None = None,
+    username: str | None = None,
+    organization_slug: str | None = None,
+    duration_minutes: int | None = None,
+) -> dict:
+    """
+    Get available time slots from Cal.com.
+    start, end: date or ISO range (e.g. 2025-02-24, 2025-03-10) in UTC.
+    Returns Cal.com response data: { "YYYY-MM-DD": [ { "start", "end" }, ... ], ... }.
+    """
+    headers, params = _slots_request(start, end, time_zone, event_type_id, event_type_slug,
+                                     username, organization_slug, duration_minutes)
+    r = upstream.get("cal", CAL_SLOTS_URL, params=params, headers=headers)
+    _raise_for_cal_error(r, "Cal.com slots")
+    return _filter_slots(r.json(), time_zone)
+
+
+async def aget_available_slots(
+    start: str,
+    end: str,
+    time_zone: str = "America/New_York",
+    event_type_id: int | None = None,
+    event_type_slug: str | None = None,
+    username: str | None = None,
+    organization_slug: str | None = None,
+    duration_minutes: int | None = None,
+) -> dict:
+    """Async variant of get_available_slots()."""
+    headers, params = _slots_request(start, end, time_zone, event_type_id, event_type_slug,
+                                     username, organization_slug, duration_minutes)
+    r = await upstream.aget("cal", CAL_SLOTS_URL, params=params, headers=headers)
+    _raise_for_cal_error(r, "Cal.com slots")
+    return _filter_slots(r.json(), time_zone)
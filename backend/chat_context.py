@@ -0,0 +1,288 @@
+"""
+chat_context.py — Token-budgeted chat history with a rolling summary
+---------------------------------------------------------------------
+Clients send the whole conversation on every /chat turn. Without a bound the
+prompt (and upstream latency and cost) grows with every message. ChatContext
+keeps the history sent upstream within a token budget:
+
+  - while the history fits the budget it is sent unchanged
+  - once it does not, the oldest turns are folded into a running summary that
+    goes into the system prompt; the last CHAT_KEEP_RECENT messages are always
+    sent verbatim
+  - summaries are cached under a hash of the exact message prefix they cover,
+    so the next turn (same history + one more exchange) reuses the summary
+    without another LLM call; when the tail outgrows the budget again, only
+    the newly compacted turns are summarized on top of the cached summary
+  - compaction cuts the kept tail down to CHAT_COMPACT_TARGET of the budget,
+    so summary updates happen every few turns rather than every turn
+  - prepare() also returns the summary and how many messages it covers, so a
+    server-side session (chat_sessions.py) can store just summary + tail
+
+Token counts are estimates (~4 characters per token plus per-message
+overhead); chatbot.chat() also records the upstream's own prompt_tokens when
+the response reports it. Every request fills a usage dict, and stats() sums
+them up so the savings are visible in /chat/metrics.
+
+Config (.env):
+    CHAT_CONTEXT_BUDGET        history tokens sent upstream, default 1500 (0 = unbounded)
+    CHAT_KEEP_RECENT           messages always sent verbatim, default 6
+    CHAT_COMPACT_TARGET        fraction of the budget kept after compaction, default 0.5
+    CHAT_SUMMARY_MODEL         default meta-llama/Meta-Llama-3.1-8B-Instruct
+    CHAT_SUMMARY_MAX_TOKENS    default 200
+    CHAT_SUMMARY_CACHE_SIZE    cached summaries, default 2048
+    CHAT_SUMMARY_CACHE_TTL     seconds, default 86400
+"""
+
+import hashlib
+import os
+import threading
+
+import upstream
+from lru_cache import LRUCache
+
+CHAT_CONTEXT_BUDGET = int(os.getenv("CHAT_CONTEXT_BUDGET") or 1500)
+CHAT_KEEP_RECENT = int(os.getenv("CHAT_KEEP_RECENT") or 6)
+CHAT_COMPACT_TARGET = float(os.getenv("CHAT_COMPACT_TARGET") or 0.5)
+SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL") or "meta-llama/Meta-Llama-3.1-8B-Instruct"
+SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS") or 200)
+SUMMARY_CACHE_SIZE = int(os.getenv("CHAT_SUMMARY_CACHE_SIZE") or 2048)
+SUMMARY_CACHE_TTL = float(os.getenv("CHAT_SUMMARY_CACHE_TTL") or 86400)
+
+FEATHERLESS_URL = "https://api.featherless.ai/v1/chat/completions"
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role + separators per chat message
+
+SUMMARY_SYSTEM = (
+    "You maintain a running summary of a conversation between a user and a health assistant. "
+    "Merge the new turns into the existing summary. Keep every concrete fact the user shared "
+    "(symptoms, numbers, answers, preferences, concerns) and what the assistant advised. "
+    "Drop greetings and filler. Write plain sentences, under 120 words."
+)
+
+SUMMARY_HEADER = "\n\n━━━ EARLIER IN THIS CONVERSATION (summary) ━━━\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text (~4 characters per token)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def message_tokens(messages: list[dict]) -> int:
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _prefix_hashes(messages: list[dict], summary_model: str, summary: str | None) -> list[str]:
+    """hashes[j] identifies (summary, messages[:j]) exactly (chained, so each prefix costs one hash)."""
+    h = hashlib.sha256(f"{summary_model}|{SUMMARY_SYSTEM}|{summary or ''}".encode()).hexdigest()
+    hashes = [h]
+    for m in messages:
+        h = hashlib.sha256(f"{h}|{m.get('role')}|{m.get('content') or ''}".encode()).hexdigest()
+        hashes.append(h)
+    return hashes
+
+
+class _Plan:
+    __slots__ = ("summary", "start", "compact_to", "hashes")
+
+    def __init__(self, summary, start, compact_to, hashes):
+        self.summary = summary        # summary text covering messages[:start], or None
+        self.start = start
+        self.compact_to = compact_to  # new start to summarize up to, or None
+        self.hashes = hashes
+
+
+class ChatContext:
+    """
+    Builds the message list sent upstream for one chat turn.
+
+    budget:      history tokens (system prompt excluded); <= 0 disables compaction
+    keep_recent: trailing messages never summarized
+    """
+
+    def __init__(self, budget=CHAT_CONTEXT_BUDGET, keep_recent=CHAT_KEEP_RECENT,
+                 compact_target=CHAT_COMPACT_TARGET, summary_model=SUMMARY_MODEL):
+        self.budget = int(budget)
+        self.keep_recent = max(0, int(keep_recent))
+        self.compact_target = float(compact_target)
+        self.summary_model = summary_model
+        self._summaries = LRUCache(SUMMARY_CACHE_SIZE, ttl=SUMMARY_CACHE_TTL)
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "compacted_requests": 0,
+            "summary_updates": 0,
+            "summary_failures": 0,
+            "prompt_tokens": 0,
+            "full_prompt_tokens": 0,
+            "upstream_prompt_tokens": 0,
+        }
+
+    # ── planning (no I/O) ──
+
+    def _plan(self, messages, summary=None):
+        if self.budget <= 0 or message_tokens(messages) + estimate_tokens(summary or "") <= self.budget:
+            return _Plan(summary, 0, None, None)
+
+        hashes = _prefix_hashes(messages, self.summary_model, summary)
+        limit = max(0, len(messages) - self.keep_recent)
+
+        # Longest prefix that already has a summary (peek while scanning; get() counts the hit)
+        start = 0
+        for j in range(limit, 0, -1):
+            if self._summaries.peek(hashes[j]) is not None:
+                start, summary = j, self._summaries.get(hashes[j])
+                break
+
+        if message_tokens(messages[start:]) + estimate_tokens(summary or "") <= self.budget or start >= limit:
+            return _Plan(summary, start, None, hashes)
+
+        # Cut so the kept tail fits the compaction target, on a user turn if possible
+        target = self.budget * self.compact_target
+        cut = limit
+        for k in range(start + 1, limit + 1):
+            if message_tokens(messages[k:]) <= target:
+                cut = k
+                break
+        while cut < limit and messages[cut].get("role") != "user":
+            cut += 1
+        return _Plan(summary, start, cut, hashes)
+
+    def _summary_request(self, previous, turns):
+        transcript = "\n".join(f"{m.get('role', 'user').upper()}: {m.get('content') or ''}" for m in turns)
+        user = (f"Existing summary:\n{previous}\n\n" if previous else "") + f"New turns:\n{transcript}"
+        return {
+            "model": self.summary_model,
+            "messages": [
+                {"role": "system", "content": SUMMARY_SYSTEM},
+                {"role": "user", "content": user},
+            ],
+            "max_tokens": SUMMARY_MAX_TOKENS,
+            "temperature": 0.2,
+        }
+
+    @staticmethod
+    def _summary_text(data):
+        return data["choices"][0]["message"]["content"].strip()
+
+    def _assemble(self, system_prompt, messages, summary, start, status, usage, earlier_tokens):
+        system = system_prompt + (SUMMARY_HEADER + summary if summary else "")
+        tail = messages[start:]
+        full = [{"role": "system", "content": system}, *tail]
+
+        prompt_tokens = message_tokens(full)
+        full_prompt_tokens = message_tokens([{"role": "system", "content": system_prompt}, *messages]) + earlier_tokens
+        report = {
+            "history_messages": len(messages),
+            "sent_messages": len(tail),
+            "summarized_messages": start,
+            "summary": status,
+            "prompt_tokens": prompt_tokens,
+            "full_prompt_tokens": full_prompt_tokens,
+            "saved_tokens": full_prompt_tokens - prompt_tokens,
+        }
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["compacted_requests"] += start > 0
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["full_prompt_tokens"] += full_prompt_tokens
+        if usage is not None:
+            usage.update(report)
+        return full
+
+    def _after_summary(self, plan, summary, error):
+        """Cache a fresh summary; on failure keep the previous one (over budget this turn, retried next)."""
+        if error is None:
+            self._summaries.put(plan.hashes[plan.compact_to], summary)
+            with self._lock:
+                self._stats["summary_updates"] += 1
+            return summary, plan.compact_to, "updated"
+        print(f"[chat_context] summary update failed, sending the longer history this turn: {error}")
+        with self._lock:
+            self._stats["summary_failures"] += 1
+        return plan.summary, plan.start, "failed"
+
+    # ── public ──
+
+    def prepare(self, system_prompt, messages, api_key, usage=None, summary=None, earlier_tokens=0):
+        """
+        Compact messages for one turn. May make one summary call.
+
+        summary:        summary of turns before `messages` (server-side sessions keep it)
+        earlier_tokens: tokens of those turns, so usage still compares against the full history
+
+        Returns:
+            (messages to send upstream, system first; summary now in effect; number of
+             leading `messages` it covers)
+        """
+        plan = self._plan(messages, summary)
+        if plan.compact_to is None:
+            # cached: reused from the summary cache; carried: the caller's summary as is
+            status = "cached" if plan.start else ("carried" if plan.summary else "none")
+            full = self._assemble(system_prompt, messages, plan.summary, plan.start, status, usage, earlier_tokens)
+            return full, plan.summary, plan.start
+        try:
+            response = upstream.post(
+                "featherless", FEATHERLESS_URL,
+                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+                json=self._summary_request(plan.summary, messages[plan.start:plan.compact_to]),
+                timeout=30,
+            )
+            response.raise_for_status()
+            new_summary, start, status = self._after_summary(plan, self._summary_text(response.json()), None)
+        except Exception as exc:
+            new_summary, start, status = self._after_summary(plan, None, exc)
+        full = self._assemble(system_prompt, messages, new_summary, start, status, usage, earlier_tokens)
+        return full, new_summary, start
+
+    async def aprepare(self, system_prompt, messages, api_key, usage=None, summary=None, earlier_tokens=0):
+        """Async variant of prepare()."""
+        plan = self._plan(messages, summary)
+        if plan.compact_to is None:
+            # cached: reused from the summary cache; carried: the caller's summary as is
+            status = "cached" if plan.start else ("carried" if plan.summary else "none")
+            full = self._assemble(system_prompt, messages, plan.summary, plan.start, status, usage, earlier_tokens)
+            return full, plan.summary, plan.start
+        try:
+            response = await upstream.apost(
+                "featherless", FEATHERLESS_URL,
+                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+                json=self._summary_request(plan.summary, messages[plan.start:plan.compact_to]),
+                timeout=30,
+            )
+            response.raise_for_status()
+            new_summary, start, status = self._after_summary(plan, self._summary_text(response.json()), None)
+        except Exception as exc:
+            new_summary, start, status = self._after_summary(plan, None, exc)
+        full = self._assemble(system_prompt, messages, new_summary, start, status, usage, earlier_tokens)
+        return full, new_summary, start
+
+    def build(self, system_prompt, messages, api_key, usage=None):
+        """Messages to send upstream for a client-held history (system first)."""
+        return self.prepare(system_prompt, messages, api_key, usage)[0]
+
+    async def abuild(self, system_prompt, messages, api_key, usage=None):
+        """Async variant of build()."""
+        return (await self.aprepare(system_prompt, messages, api_key, usage))[0]
+
+    def record_upstream_usage(self, usage, response_json):
+        """Copy the upstream's reported prompt_tokens (if any) into usage and the totals."""
+        reported = ((response_json or {}).get("usage") or {}).get("prompt_tokens")
+        if reported is None:
+            return
+        if usage is not None:
+            usage["upstream_prompt_tokens"] = reported
+        with self._lock:
+            self._stats["upstream_prompt_tokens"] += int(reported)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        full = stats["full_prompt_tokens"]
+        stats["saved_tokens"] = full - stats["prompt_tokens"]
+        stats["saved_ratio"] = round(stats["saved_tokens"] / full, 4) if full else 0.0
+        stats["budget"] = self.budget
+        stats["summary_cache"] = self._summaries.stats()
+        return stats
+
+
+CONTEXT = ChatContext()
@@ -0,0 +1,254 @@
+"""
+chat_sessions.py — Server-side chat sessions
+---------------------------------------------
+With /chat the client re-sends the whole message list and patient context
+every turn, and the backend re-renders the context each time. A session
+keeps that state on the server instead:
+
+  - create() renders the system prompt + patient context once and returns a
+    session id
+  - each turn the client sends only the session id and the new message; the
+    session holds the running summary and the unsummarized tail of the
+    history (compacted by chat_context.ChatContext), so the stored state and
+    the per-turn work stay bounded however long the conversation gets
+  - a failed turn leaves the session unchanged, so the client can retry
+  - "checkin" sessions hold a checkin.py state: the five questions are asked
+    locally, and only the answers (not the question-and-answer transcript)
+    go into the history for the report and any follow-ups
+  - sessions expire CHAT_SESSION_TTL seconds after their last turn
+
+Backends: "memory" (default, per process, LRU-bounded) or "sqlite" (shared by
+workers on one host, survives restarts).
+
+Config (.env):
+    CHAT_SESSION_BACKEND    "memory" or "sqlite", default "memory"
+    CHAT_SESSION_TTL        idle seconds before a session expires, default 86400
+    CHAT_SESSION_MAX        memory backend: max sessions kept, default 10000
+    CHAT_SESSIONS_DB        sqlite backend: path, default backend/.cache/chat_sessions.sqlite3
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+
+import chatbot
+import checkin
+from chat_context import CONTEXT, message_tokens
+from lru_cache import LRUCache
+
+_dir = Path(__file__).resolve().parent
+
+CHAT_SESSION_BACKEND = (os.getenv("CHAT_SESSION_BACKEND") or "memory").strip().lower()
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL") or 86400)
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX") or 10000)
+CHAT_SESSIONS_DB = Path(os.getenv("CHAT_SESSIONS_DB") or (_dir / ".cache" / "chat_sessions.sqlite3"))
+
+BACKENDS = ("memory", "sqlite")
+if CHAT_SESSION_BACKEND not in BACKENDS:
+    raise ValueError(f"CHAT_SESSION_BACKEND must be one of {BACKENDS}, got {CHAT_SESSION_BACKEND!r}")
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class MemorySessionStore:
+    """Sessions in this process; least recently used sessions are dropped past max_size."""
+
+    backend = "memory"
+
+    def __init__(self, ttl=CHAT_SESSION_TTL, max_size=CHAT_SESSION_MAX):
+        self.ttl = ttl
+        self._cache = LRUCache(max_size, ttl=ttl)
+
+    def get(self, session_id):
+        session = self._cache.get(session_id)
+        return json.loads(session) if session is not None else None
+
+    def put(self, session):
+        # Stored serialized so callers never share (and mutate) a stored session
+        self._cache.put(session["id"], json.dumps(session))
+
+    def delete(self, session_id):
+        return self._cache.pop(session_id)
+
+    def count(self):
+        return len(self._cache)
+
+
+class SqliteSessionStore:
+    """Sessions in a local SQLite file. One connection guarded by a lock; every call is a short statement."""
+
+    backend = "sqlite"
+
+    def __init__(self, path=CHAT_SESSIONS_DB, ttl=CHAT_SESSION_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions "
+                "(id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, session_id):
+        rows = self._execute("SELECT data FROM chat_sessions WHERE id = ? AND expires_at > ?",
+                             (session_id, time.time()))
+        return json.loads(rows[0][0]) if rows else None
+
+    def put(self, session):
+        self._execute("INSERT OR REPLACE INTO chat_sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                      (session["id"], json.dumps(session), time.time() + self.ttl))
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._conn.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def purge_expired(self):
+        self._execute("DELETE FROM chat_sessions WHERE expires_at <= ?", (time.time(),))
+
+    def count(self):
+        return self._execute("SELECT COUNT(*) FROM chat_sessions WHERE expires_at > ?", (time.time(),))[0][0]
+
+
+def make_store(backend=CHAT_SESSION_BACKEND):
+    return SqliteSessionStore() if backend == "sqlite" else MemorySessionStore()
+
+
+class ChatSessions:
+    """Session lifecycle plus one chat turn at a time per session."""
+
+    def __init__(self, store=None, context=CONTEXT):
+        self.store = store or make_store()
+        self.context = context
+        self._locks = weakref.WeakValueDictionary()  # session id -> asyncio.Lock while a turn runs
+        self.created = 0
+        self.turns = 0
+
+    def create(self, mode="general", user_context=None, system=None):
+        """Start a session; the system prompt and patient context are rendered here, once."""
+        now = time.time()
+        session = {
+            "id": uuid.uuid4().hex,
+            "mode": mode,
+            "system_prompt": chatbot.system_prompt(system, mode, user_context),
+            "summary": None,
+            "messages": [],
+            "earlier_tokens": 0,  # tokens of turns folded into the summary, for usage reports
+            "turns": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if mode == "checkin":
+            session["checkin"] = checkin.new_state()
+        if hasattr(self.store, "purge_expired"):
+            self.store.purge_expired()
+        self.store.put(session)
+        self.created += 1
+        return session
+
+    def delete(self, session_id):
+        return self.store.delete(session_id)
+
+    def _lock_for(self, session_id):
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    def _load(self, session_id):
+        session = self.store.get(session_id)
+        if session is None:
+            raise SessionNotFound(session_id)
+        return session
+
+    def _checkin_step(self, session, content, usage):
+        """
+        Run a check-in session's question flow. Returns the local reply (already
+        stored), or None and the content for the model: the collected answers
+        once the last question is answered, otherwise the message unchanged.
+        """
+        state = session.get("checkin")
+        if state is None or checkin.is_complete(state):
+            return None, content
+        reply, state = checkin.advance(state, content)
+        checkin.record(reply)
+        if usage is not None:
+            usage["checkin"] = checkin.usage_report(state, local=reply is not None)
+        session["checkin"] = state
+        if reply is None:
+            return None, checkin.answers_message(state)  # stored with the report by _commit()
+        session["turns"] += 1
+        session["updated_at"] = time.time()
+        self.store.put(session)
+        self.turns += 1
+        return reply, None
+
+    async def _prepare(self, session, content, usage):
+        history = session["messages"] + [{"role": "user", "content": content}]
+        full, summary, start = await self.context.aprepare(
+            session["system_prompt"], history, chatbot.featherless_api_key(), usage,
+            summary=session["summary"], earlier_tokens=session["earlier_tokens"],
+        )
+        return history, full, summary, start
+
+    def _commit(self, session, history, summary, start, reply):
+        session["earlier_tokens"] += message_tokens(history[:start])
+        session["summary"] = summary
+        session["messages"] = history[start:] + [{"role": "assistant", "content": reply}]
+        session["turns"] += 1
+        session["updated_at"] = time.time()
+        self.store.put(session)
+        self.turns += 1
+
+    async def turn(self, session_id, content, usage=None):
+        """Send one user message; returns the assistant reply."""
+        async with self._lock_for(session_id):
+            session = self._load(session_id)
+            reply, content = self._checkin_step(session, content, usage)
+            if reply is not None:
+                return reply
+            history, full, summary, start = await self._prepare(session, content, usage)
+            reply = await chatbot.acomplete(full, usage)
+            self._commit(session, history, summary, start, reply)
+            return reply
+
+    async def stream_turn(self, session_id, content, usage=None):
+        """
+        Streaming turn(): an async generator of reply deltas. The turn is stored
+        only once the reply completes; an abandoned stream leaves the session as it was.
+        """
+        async with self._lock_for(session_id):
+            session = self._load(session_id)
+            reply, content = self._checkin_step(session, content, usage)
+            if reply is not None:
+                yield reply
+                return
+            history, full, summary, start = await self._prepare(session, content, usage)
+            parts = []
+            async for text in chatbot.astream_completion(full):
+                parts.append(text)
+                yield text
+            self._commit(session, history, summary, start, "".join(parts).strip())
+
+    def metrics(self):
+        return {
+            "backend": self.store.backend,
+            "ttl_s": self.store.ttl,
+            "active": self.store.count(),
+            "created": self.created,
+            "turns": self.turns,
+        }
@@ -1,9 +1,13 @@
 import os
 from pathlib import Path
 
-import requests
 from dotenv import load_dotenv
 
+import checkin
+import upstream
+from chat_context import CONTEXT
+from llm_stream import aiter_completion_deltas
+
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
 FEATHERLESS_URL = "https://api.featherless.ai/v1/chat/completions"
@@ -16,29 +20,16 @@ DEFAULT_SYSTEM = (
     "IMPORTANT: Keep every reply under 50 words. Be concise and direct."
 )
 
+# The five check-in questions are asked by checkin.py without the model; this
+# prompt only covers the report, written from the collected answers.
 CHECKIN_SYSTEM = """You are a compassionate daily health check-in assistant for Health Bridge. \
-Your job is to ask the user 5 questions one at a time, then deliver a thorough mental-health assessment.
-
-═══════════════════════════════════════════
-PHASE 1 — COLLECT (ask these in exact order, one at a time)
-═══════════════════════════════════════════
-Q1. How many steps did you take today?
-Q2. What did you eat today?
-Q3. How many glasses of water did you drink today?
-Q4. What exercises did you do today?
-Q5. On a scale of 1 to 10, how was your day? (1 = the worst, 10 = the best)
-
-Rules for Phase 1:
-- Greet the user warmly and ask Q1 immediately.
-- Ask exactly ONE question at a time. Never ask the next question until the user answers the current one.
-- After each answer give ONE short, warm acknowledgement sentence, then ask the next question.
-- Do NOT skip ahead or ask multiple questions at once.
-- If the user goes off-topic, gently redirect: "I'd love to hear that — let's finish the check-in first!"
+The user has just answered five daily check-in questions (steps, food, water, exercise, and a 1–10 day rating); \
+their answers arrive as a structured list. Your job is to deliver a thorough mental-health assessment.
 
 ═══════════════════════════════════════════
-PHASE 2 — ANALYSIS (only after all 5 answers are collected)
+ANALYSIS
 ═══════════════════════════════════════════
-Once you have all five answers, produce the following report in this exact order:
+Using the five answers, produce the following report in this exact order:
 
 1. **Day Summary** (2–3 sentences)
    A warm, personalised recap of their activity, nutrition, hydration, exercise, and overall mood.
@@ -73,11 +64,11 @@ or mindfulness as immediate tools.
    _This is a wellness tool, not a clinical diagnosis. Please consult a qualified mental health professional \
 for personalised support._
 
-Tone rules for Phase 2:
+Tone rules:
 - Be warm, empathetic, and never alarmist.
 - Never shame the user for low scores — frame everything as care and encouragement.
 - Keep the whole report concise but complete.
-- IMPORTANT: Every individual response must be under 50 words. During Phase 1 (one question at a time) be especially brief."""
+- IMPORTANT: Every individual response must be under 50 words."""
 
 
 def _build_user_context_block(user_context: dict) -> str:
@@ -120,21 +111,15 @@ def _build_user_context_block(user_context: dict) -> str:
     return "\n".join(lines)
 
 
-def chat(messages: list[dict], system: str | None = None, mode: str = "general",
-         user_context: dict | None = None) -> str:
-    """
-    Send messages to Featherless chat API and return the assistant reply.
-
-    Args:
-        messages:     list of {"role": "user"|"assistant", "content": "..."}
-        system:       override system prompt (optional)
-        mode:         "general" (default) | "checkin" — selects built-in system prompt
-        user_context: dict with optional keys "biomarkers" and "backgroundInfo"
-    """
+def featherless_api_key() -> str:
     api_key = os.getenv("FEATHERLESS_API_KEY")
     if not api_key:
         raise ValueError("FEATHERLESS_API_KEY environment variable is not set")
+    return api_key
+
 
+def system_prompt(system: str | None = None, mode: str = "general", user_context: dict | None = None) -> str:
+    """The system prompt for a conversation: override, or the mode's built-in prompt, plus patient context."""
     if system:
         resolved_system = system
     elif mode == "checkin":
@@ -146,24 +131,23 @@ def chat(messages: list[dict], system: str | None = None, mode: str = "general",
     context_block = _build_user_context_block(user_context or {})
     if context_block:
         resolved_system = resolved_system + context_block
+    return resolved_system
 
-    full_messages = [{"role": "system", "content": resolved_system}]
-    full_messages.extend(messages)
-    response = requests.post(
-        FEATHERLESS_URL,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-        },
-        json={
-            "model": "Qwen/Qwen2.5-72B-Instruct",
-            "messages": full_messages,
-            "max_tokens": 80,
-        },
-        timeout=60,
-    )
-    response.raise_for_status()
-    data = response.json()
+
+def _request(api_key: str, full_messages: list[dict]) -> tuple[dict, dict]:
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    }
+    payload = {
+        "model": "Qwen/Qwen2.5-72B-Instruct",
+        "messages": full_messages,
+        "max_tokens": 80,
+    }
+    return headers, payload
+
+
+def _reply_text(data: dict) -> str:
     choices = data.get("choices") or []
     if not choices:
         raise ValueError("No choices in chat response")
@@ -172,3 +156,92 @@ def chat(messages: list[dict], system: str | None = None, mode: str = "general",
     if content is None:
         raise ValueError("No content in chat choice")
     return content.strip()
+
+
+async def acomplete(full_messages: list[dict], usage: dict | None = None) -> str:
+    """Reply to an already-built message list (system first, history compacted)."""
+    headers, payload = _request(featherless_api_key(), full_messages)
+    response = await upstream.apost("featherless", FEATHERLESS_URL, headers=headers, json=payload, timeout=60)
+    response.raise_for_status()
+    data = response.json()
+    CONTEXT.record_upstream_usage(usage, data)
+    return _reply_text(data)
+
+
+async def astream_completion(full_messages: list[dict]):
+    """Streaming acomplete(): an async generator of reply text deltas."""
+    headers, payload = _request(featherless_api_key(), full_messages)
+    async with upstream.astream("featherless", "POST", FEATHERLESS_URL, headers=headers,
+                                json={**payload, "stream": True}, timeout=60) as response:
+        response.raise_for_status()
+        async for text in aiter_completion_deltas(response):
+            yield text
+
+
+def _checkin_turn(messages: list[dict], system: str | None, mode: str, usage: dict | None):
+    """
+    Check-in questions are answered locally (checkin.py). Returns (reply, messages):
+    the local reply, or None and the history to send to the model for the report.
+    """
+    if mode != "checkin" or system:
+        return None, messages
+    reply, history, state = checkin.route(messages)
+    if usage is not None:
+        usage["checkin"] = checkin.usage_report(state, local=reply is not None)
+    return reply, history
+
+
+def chat(messages: list[dict], system: str | None = None, mode: str = "general",
+         user_context: dict | None = None, usage: dict | None = None) -> str:
+    """
+    Send messages to Featherless chat API and return the assistant reply.
+
+    Args:
+        messages:     list of {"role": "user"|"assistant", "content": "..."}
+        system:       override system prompt (optional)
+        mode:         "general" (default) | "checkin" — selects built-in system prompt
+        user_context: dict with optional keys "biomarkers" and "backgroundInfo"
+        usage:        optional dict, filled with prompt-token counts (see chat_context.py)
+
+    Long histories are compacted to the CHAT_CONTEXT_BUDGET token budget first.
+    In "checkin" mode the five questions are asked without calling the model.
+    """
+    reply, messages = _checkin_turn(messages, system, mode, usage)
+    if reply is not None:
+        return reply
+    api_key = featherless_api_key()
+    full_messages = CONTEXT.build(system_prompt(system, mode, user_context), messages, api_key, usage)
+    headers, payload = _request(api_key, full_messages)
+    response = upstream.post("featherless", FEATHERLESS_URL, headers=headers, json=payload, timeout=60)
+    response.raise_for_status()
+    data = response.json()
+    CONTEXT.record_upstream_usage(usage, data)
+    return _reply_text(data)
+
+
+async def achat(messages: list[dict], system: str | None = None, mode: str = "general",
+                user_context: dict | None = None, usage: dict | None = None) -> str:
+    """Async variant of chat(); raises httpx errors instead of requests errors."""
+    reply, messages = _checkin_turn(messages, system, mode, usage)
+    if reply is not None:
+        return reply
+    full_messages = await CONTEXT.abuild(system_prompt(system, mode, user_context), messages, featherless_api_key(), usage)
+    return await acomplete(full_messages, usage)
+
+
+async def chat_stream(messages: list[dict], system: str | None = None, mode: str = "general",
+                      user_context: dict | None = None, usage: dict | None = None):
+    """
+    Streaming variant of chat(): an async generator of reply text deltas.
+
+    The upstream request is made with httpx on the event loop, so closing or
+    cancelling the generator (e.g. when the client disconnects) closes the
+    connection and the provider stops generating.
+    """
+    reply, messages = _checkin_turn(messages, system, mode, usage)
+    if reply is not None:
+        yield reply
+        return
+    full_messages = await CONTEXT.abuild(system_prompt(system, mode, user_context), messages, featherless_api_key(), usage)
+    async for text in astream_completion(full_messages):
+        yield text
@@ -0,0 +1,268 @@
+"""
+checkin.py — Daily check-in questions, asked without the LLM
+-------------------------------------------------------------
+The check-in asks five fixed questions, then writes one report. Asking the
+questions is scripted work, so a small state machine does it locally instead
+of sending each one through the 72B model:
+
+  - the first message gets a greeting and Q1; every later message answers
+    the current question
+  - answers are parsed and checked here: steps and glasses of water must be
+    numbers ("8,000", "8k", "ten thousand", "3 miles", "2 litres"), the day rating a whole
+    number from 1 to 10. An answer that does not parse gets the question
+    again with a short hint
+  - once all five are answered, answers_message() turns them into one
+    structured user message, and the caller makes the single LLM call for
+    the Phase 2 report (chatbot.CHECKIN_SYSTEM)
+
+State is a plain dict, so a chat session can store it as JSON. For stateless
+/chat callers, route() rebuilds the state by replaying the user messages in
+the history; the parsing is deterministic, so the result is the same.
+"""
+
+import re
+import threading
+
+# (key, question, kind) in the order they are asked
+QUESTIONS = (
+    ("steps", "How many steps did you take today?", "steps"),
+    ("food", "What did you eat today?", "text"),
+    ("water", "How many glasses of water did you drink today?", "water"),
+    ("exercise", "What exercises did you do today?", "text"),
+    ("rating", "On a scale of 1 to 10, how was your day? (1 = the worst, 10 = the best)", "rating"),
+)
+
+GREETING = "Hi! Let's do your daily check-in — five quick questions."
+REDIRECT = "I'd love to hear that — let's finish the check-in first!"
+# What to send back when a numeric answer has no number in it
+NUMBER_HINTS = {
+    "steps": "Please reply with a number of steps, e.g. 6000.",
+    "water": "Please reply with a number of glasses, e.g. 6.",
+    "rating": "Please reply with a number from 1 to 10.",
+}
+
+MAX_STEPS = 100_000
+STEPS_PER_MILE = 2000
+STEPS_PER_KM = 1300
+MAX_GLASSES = 40
+ML_PER_GLASS = 250
+
+_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70,
+    "eighty": 80, "ninety": 90,
+}
+_NONE_WORDS = {"none", "nothing", "zero"}
+_NUMBER_RE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(k|thousand|ml|l|litres?|liters?|km|kilomet(?:er|re)s?|mi|miles?)?\b"
+)
+
+_stats = {"local_replies": 0, "reports": 0}
+_stats_lock = threading.Lock()
+
+
+def record(reply):
+    """Count a finished turn: a local reply, or (reply None) a report handed to the LLM."""
+    with _stats_lock:
+        _stats["local_replies" if reply is not None else "reports"] += 1
+
+
+def stats():
+    """Replies answered locally vs. report calls; each report replaces five LLM round-trips."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+# ── parsing ──
+
+def _words_number(text):
+    """First number written in words ("ten thousand", "two hundred and fifty"), or None."""
+    total = current = 0
+    found = False
+    for word in re.findall(r"[a-z]+", text):
+        if word in _UNITS:
+            current += _UNITS[word]
+        elif word == "hundred" and found:
+            current = max(current, 1) * 100
+        elif word == "thousand" and found:
+            total += max(current, 1) * 1000
+            current = 0
+        elif word == "and" and found:
+            continue
+        elif found:
+            break
+        else:
+            continue
+        found = True
+    if found:
+        return total + current
+    if _NONE_WORDS & set(re.findall(r"[a-z]+", text)):
+        return 0
+    return None
+
+
+def parse_number(text):
+    """
+    The first number in a free-text answer, or None.
+
+    Returns (value, unit); unit is "thousand", "ml", "l", "km", "mile" or None.
+    """
+    text = re.sub(r"(?<=\d),(?=\d{3}\b)", "", text.lower())
+    match = _NUMBER_RE.search(text)
+    if match:
+        unit = match.group(2)
+        if unit in ("k", "thousand"):
+            unit = "thousand"
+        elif unit and unit.startswith("l"):
+            unit = "l"
+        elif unit and unit.startswith("k"):
+            unit = "km"
+        elif unit and unit.startswith("mi"):
+            unit = "mile"
+        return float(match.group(1)), unit
+    value = _words_number(text)
+    return (float(value), None) if value is not None else None
+
+
+def _whole(value):
+    return int(value) if float(value).is_integer() else value
+
+
+def _parse_steps(text):
+    parsed = parse_number(text)
+    if parsed is None:
+        return None, NUMBER_HINTS["steps"]
+    value, unit = parsed
+    value *= {"thousand": 1000, "mile": STEPS_PER_MILE, "km": STEPS_PER_KM}.get(unit, 1)
+    if not 0 <= value <= MAX_STEPS:
+        return None, f"That doesn't look right — roughly how many steps, between 0 and {MAX_STEPS:,}?"
+    return int(round(value)), None
+
+
+def _parse_water(text):
+    parsed = parse_number(text)
+    if parsed is None:
+        return None, NUMBER_HINTS["water"]
+    value, unit = parsed
+    if unit == "l":
+        value = value * 1000 / ML_PER_GLASS
+    elif unit == "ml":
+        value = value / ML_PER_GLASS
+    value = round(value * 2) / 2  # to the nearest half glass
+    if not 0 <= value <= MAX_GLASSES:
+        return None, f"That doesn't look right — how many glasses, between 0 and {MAX_GLASSES}?"
+    return _whole(value), None
+
+
+def _parse_rating(text):
+    parsed = parse_number(text)
+    if parsed is None:
+        return None, NUMBER_HINTS["rating"]
+    value, _ = parsed
+    if not value.is_integer() or not 1 <= value <= 10:
+        return None, "Please answer with a whole number from 1 to 10."
+    return int(value), None
+
+
+def _parse_text(text):
+    text = text.strip()
+    return (text, None) if text else (None, REDIRECT)
+
+
+_PARSERS = {"steps": _parse_steps, "water": _parse_water, "rating": _parse_rating, "text": _parse_text}
+
+
+def _acknowledge(key, value):
+    if key == "steps":
+        if value >= 10000:
+            return "Amazing — that's a very active day!"
+        if value >= 5000:
+            return "Nice, that's a solid amount of movement."
+        return "Thanks — every step counts." if value else "Thanks for being honest — rest days happen."
+    if key == "water":
+        if value >= 8:
+            return "Great hydration!"
+        return "Thanks, good to know." if value >= 4 else "Thanks — a few more glasses tomorrow could help."
+    if key == "food":
+        return "Thanks for sharing what you ate."
+    return "Got it, thanks!"
+
+
+# ── state machine ──
+
+def new_state():
+    return {"started": False, "step": 0, "answers": {}}
+
+
+def is_complete(state):
+    return state["step"] >= len(QUESTIONS)
+
+
+def advance(state, text):
+    """
+    Feed one user message to the check-in.
+
+    Returns (reply, new_state). reply is None once the last answer is in: the
+    caller then asks the LLM for the report with answers_message(). The state
+    passed in is not modified.
+    """
+    state = {**state, "answers": dict(state["answers"])}
+    if not state["started"]:
+        state["started"] = True
+        return f"{GREETING} {QUESTIONS[0][1]}", state
+
+    key, question, kind = QUESTIONS[state["step"]]
+    value, problem = _PARSERS[kind](text)
+    if problem:
+        return f"{problem} {question}", state
+
+    state["answers"][key] = value
+    state["step"] += 1
+    if is_complete(state):
+        return None, state
+    return f"{_acknowledge(key, value)} {QUESTIONS[state['step']][1]}", state
+
+
+def answers_message(state):
+    """The collected answers as the user message for the report call."""
+    a = state["answers"]
+    return (
+        "Here are my check-in answers for today:\n"
+        f"- Steps: {a['steps']:,}\n"
+        f"- Food: {a['food']}\n"
+        f"- Water: {a['water']} glasses\n"
+        f"- Exercise: {a['exercise']}\n"
+        f"- Day rating: {a['rating']}/10"
+    )
+
+
+def usage_report(state, local):
+    """The "checkin" entry of a chat usage dict."""
+    return {"answered": min(state["step"], len(QUESTIONS)), "of": len(QUESTIONS), "local": local}
+
+
+def route(messages):
+    """
+    Check-in turn for a stateless caller that sends the whole history.
+
+    Returns (reply, None, state) while questions are still being asked, or
+    (None, history, state) when the LLM should answer: history starts with
+    answers_message() in place of the question-and-answer transcript, followed
+    by whatever came after the last answer (the report and any follow-ups).
+    """
+    state = new_state()
+    reply = None
+    for i, message in enumerate(messages):
+        if message["role"] != "user":
+            continue
+        reply, state = advance(state, message["content"])
+        if reply is None:
+            if i == len(messages) - 1:
+                record(None)
+            return None, [{"role": "user", "content": answers_message(state)}] + messages[i + 1:], state
+    if reply is None:  # no user message yet
+        reply, state = advance(state, "")
+    record(reply)
+    return reply, None, state
@@ -0,0 +1,161 @@
+"""
+cohort_flags.py — Vectorized biomarker flagging for whole patient cohorts
+--------------------------------------------------------------------------
+bloodwork_advisor._flag_biomarkers() classifies one patient's dict at a time.
+This module classifies a whole table at once: rows = patients, columns =
+biomarkers, missing values = NaN. REFERENCE_RANGES is precomputed into
+column-aligned NumPy arrays, so flagging is a handful of array comparisons
+regardless of cohort size. Statuses match _flag_biomarkers exactly.
+
+Status codes (int8):
+    -2 no_reference   column has no entry in REFERENCE_RANGES
+    -1 missing        NaN (marker not measured for that patient)
+     0 optimal
+     1 borderline
+     2 low
+     3 high
+
+Typical use:
+    markers, values = cohort_matrix(list_of_biomarker_dicts)
+    result = flag_cohort(values, markers)
+    result["status"]       # (n_patients, n_markers) int8 codes
+    result["prevalence"]   # {marker: {"optimal": n, "borderline": n, ...}}
+
+After editing REFERENCE_RANGES at runtime, call refresh_reference() and
+re-flag.
+"""
+
+import numpy as np
+
+from bloodwork_advisor import REFERENCE_RANGES
+
+NO_REFERENCE, MISSING, OPTIMAL, BORDERLINE, LOW, HIGH = -2, -1, 0, 1, 2, 3
+STATUS_NAMES = {
+    NO_REFERENCE: "no_reference",
+    MISSING: "missing",
+    OPTIMAL: "optimal",
+    BORDERLINE: "borderline",
+    LOW: "low",
+    HIGH: "high",
+}
+
+
+class ReferenceArrays:
+    """REFERENCE_RANGES as parallel float64 arrays, one entry per marker."""
+
+    def __init__(self, ranges):
+        self.markers = tuple(ranges)
+        self.index = {marker: i for i, marker in enumerate(self.markers)}
+        self.low = np.array([ranges[m]["low"] for m in self.markers], dtype=np.float64)
+        self.optimal_low = np.array([ranges[m]["optimal_low"] for m in self.markers], dtype=np.float64)
+        self.optimal_high = np.array([ranges[m]["optimal_high"] for m in self.markers], dtype=np.float64)
+        self.high = np.array([ranges[m]["high"] for m in self.markers], dtype=np.float64)
+        self.units = tuple(ranges[m]["unit"] for m in self.markers)
+
+    def take(self, markers):
+        """Bounds aligned to `markers` (NaN where a marker has no reference) plus a has-reference mask."""
+        cols = np.array([self.index.get(m, -1) for m in markers], dtype=np.intp)
+        known = cols >= 0
+        safe = np.where(known, cols, 0)
+
+        def aligned(arr):
+            return np.where(known, arr[safe], np.nan)
+
+        return aligned(self.low), aligned(self.optimal_low), aligned(self.optimal_high), aligned(self.high), known
+
+
+REFERENCE = ReferenceArrays(REFERENCE_RANGES)
+
+
+def refresh_reference(ranges=None):
+    """Rebuild the precomputed arrays, e.g. after REFERENCE_RANGES was edited."""
+    global REFERENCE
+    REFERENCE = ReferenceArrays(REFERENCE_RANGES if ranges is None else ranges)
+    return REFERENCE
+
+
+def cohort_matrix(patients, markers=None):
+    """
+    Convert a list of {marker: value} dicts into (markers, values).
+
+    markers defaults to the referenced markers that occur in the cohort (in
+    REFERENCE order), then any other marker in first-seen order. Absent values
+    become NaN.
+    """
+    if markers is None:
+        seen = {}
+        for patient in patients:
+            seen.update(dict.fromkeys(patient))
+        markers = [m for m in REFERENCE.markers if m in seen] + [m for m in seen if m not in REFERENCE.index]
+    markers = list(markers)
+    col = {m: j for j, m in enumerate(markers)}
+    values = np.full((len(patients), len(markers)), np.nan, dtype=np.float64)
+    for i, patient in enumerate(patients):
+        for marker, value in patient.items():
+            j = col.get(marker)
+            if j is not None and value is not None:
+                values[i, j] = value
+    return markers, values
+
+
+def classify(values, markers, reference=None):
+    """
+    Status codes for a (n_patients, n_markers) array whose columns are `markers`.
+
+    Same precedence as _flag_biomarkers: low, then high, then borderline
+    (outside the optimal band), else optimal.
+    """
+    reference = reference or REFERENCE
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim != 2 or values.shape[1] != len(markers):
+        raise ValueError(f"Expected a (patients, {len(markers)}) table, got shape {values.shape}")
+    low, opt_low, opt_high, high, known = reference.take(markers)
+
+    status = np.full(values.shape, OPTIMAL, dtype=np.int8)
+    with np.errstate(invalid="ignore"):  # NaN comparisons are False; fixed up below
+        status[(values < opt_low) | (values > opt_high)] = BORDERLINE
+        status[values > high] = HIGH
+        status[values < low] = LOW
+    status[np.isnan(values)] = MISSING
+    status[:, ~known] = NO_REFERENCE
+    return status
+
+
+def prevalence(status, markers):
+    """Per-marker count of patients in each status."""
+    lowest = min(STATUS_NAMES)
+    result = {}
+    for j, marker in enumerate(markers):
+        counts = np.bincount(status[:, j].astype(np.intp) - lowest, minlength=len(STATUS_NAMES))
+        result[marker] = {STATUS_NAMES[code]: int(counts[code - lowest]) for code in STATUS_NAMES}
+    return result
+
+
+def flag_cohort(values, markers=None, reference=None):
+    """
+    Flag a whole cohort.
+
+    Args:
+        values: (n_patients, n_markers) array-like (NaN = not measured), a
+            pandas DataFrame (columns = markers), or a list of {marker: value} dicts
+        markers: column names; defaults to the DataFrame columns / cohort_matrix()
+            order / REFERENCE order
+
+    Returns:
+        {"markers", "status" (int8 array), "prevalence", "patients"}
+    """
+    if isinstance(values, list) and (not values or isinstance(values[0], dict)):
+        markers, values = cohort_matrix(values, markers)
+    elif markers is None and hasattr(values, "columns"):
+        markers = [str(c) for c in values.columns]
+        values = values.to_numpy(dtype=np.float64)
+    elif markers is None:
+        markers = list((reference or REFERENCE).markers)
+    markers = list(markers)
+    status = classify(values, markers, reference)
+    return {
+        "markers": markers,
+        "status": status,
+        "prevalence": prevalence(status, markers),
+        "patients": int(status.shape[0]),
+    }
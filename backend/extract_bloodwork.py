@@ -1,66 +1,151 @@
+import argparse
+import hashlib
 import pdfplumber
 import re
 import json
-import sys
 from pathlib import Path
 
-def extract_bloodwork(pdf_path, output_json_path=None):
+# Define biomarkers and their regex patterns
+BIOMARKER_PATTERNS = {
+    'total_cholesterol': r'total\s+cholesterol[:\s]+(\d+\.?\d*)',
+    'ldl': r'ldl[:\s]+(\d+\.?\d*)|low\s+density[:\s]+(\d+\.?\d*)',
+    'hdl': r'hdl[:\s]+(\d+\.?\d*)|high\s+density[:\s]+(\d+\.?\d*)',
+    'triglycerides': r'triglycerides?[:\s]+(\d+\.?\d*)',
+    'glucose': r'glucose[:\s]+(\d+\.?\d*)',
+    'hba1c': r'hb?a1c[:\s]+(\d+\.?\d*)',
+    'hemoglobin': r'hemoglobin[:\s]+(\d+\.?\d*)',
+    'hematocrit': r'hematocrit[:\s]+(\d+\.?\d*)',
+    'wbc': r'wbc[:\s]+(\d+\.?\d*)|white\s+blood[:\s]+(\d+\.?\d*)',
+    'platelets': r'platelets?[:\s]+(\d+\.?\d*)',
+    'vitamin_d': r'vitamin\s+d[:\s]+(\d+\.?\d*)',
+    'vitamin_b12': r'vitamin\s+b12[:\s]+(\d+\.?\d*)',
+    'ferritin': r'ferritin[:\s]+(\d+\.?\d*)',
+    'iron': r'iron[:\s]+(\d+\.?\d*)',
+    'tsh': r'tsh[:\s]+(\d+\.?\d*)',
+    'creatinine': r'creatinine[:\s]+(\d+\.?\d*)',
+    'bun': r'bun[:\s]+(\d+\.?\d*)',
+    'alt': r'alt[:\s]+(\d+\.?\d*)',
+    'ast': r'ast[:\s]+(\d+\.?\d*)',
+}
+
+# Bump when extraction logic changes in a way the pattern text does not capture;
+# cached results (bloodwork_cache.py) are keyed on EXTRACTOR_VERSION
+EXTRACTOR_REVISION = 1
+EXTRACTOR_VERSION = f"{EXTRACTOR_REVISION}-" + hashlib.sha256(
+    json.dumps(BIOMARKER_PATTERNS, sort_keys=True).encode()
+).hexdigest()[:12]
+
+
+# Compiled once at import time. Kept as one search per marker: each pattern starts with a
+# literal keyword, so CPython's re finds candidates faster than with one combined alternation
+# (measured by bench_bloodwork_scanner.py)
+_COMPILED_PATTERNS = [(name, re.compile(pattern)) for name, pattern in BIOMARKER_PATTERNS.items()]
+
+
+def scan_biomarkers(text, results=None, markers=None):
+    """
+    Extract biomarker values from lowercased text.
+
+    Args:
+        text: lowercased report text
+        results: values found earlier (e.g. on previous pages); those markers are skipped
+        markers: optional subset of biomarker names to look for
+
+    Returns:
+        Dictionary {biomarker: float}, in BIOMARKER_PATTERNS order
+    """
+    found = dict(results or {})
+    wanted = set(markers) if markers is not None else None
+    for name, regex in _COMPILED_PATTERNS:
+        if name in found or (wanted is not None and name not in wanted):
+            continue
+        match = regex.search(text)
+        if match:
+            # Get the first non-None group
+            value = next((g for g in match.groups() if g is not None), None)
+            if value:
+                found[name] = float(value)
+    return {name: found[name] for name in BIOMARKER_PATTERNS if name in found}
+
+
+# Characters of the previous page re-scanned with the next one, so a value split across a
+# page break ("... ferritin:" | "45 ...") is still found in streaming mode
+PAGE_OVERLAP_CHARS = 64
+
+
+def _stream_pages(pdf, markers=None, max_pages=None):
+    """
+    Extract and scan one page at a time, stopping once every wanted marker is found
+    or max_pages pages have been read. Only one page's text is held at a time.
+
+    Returns:
+        (results, pages_read) where pages_read lists 1-based page numbers
+    """
+    wanted = set(markers) if markers is not None else set(BIOMARKER_PATTERNS)
+    results = {}
+    pages_read = []
+    tail = ""
+    for number, page in enumerate(pdf.pages, start=1):
+        if max_pages is not None and len(pages_read) >= max_pages:
+            break
+        page_text = (page.extract_text() or "").lower()
+        page.close()  # drop pdfplumber's per-page object cache
+        pages_read.append(number)
+        results = scan_biomarkers(tail + " " + page_text, results, markers)
+        if wanted <= results.keys():
+            break
+        tail = page_text[-PAGE_OVERLAP_CHARS:]
+    return results, pages_read
+
+
+def _source_name(pdf_path):
+    if isinstance(pdf_path, (str, Path)):
+        return Path(pdf_path).name
+    return None
+
+
+def extract_bloodwork(pdf_path, output_json_path=None, stream=False, max_pages=None, markers=None,
+                      filename=None):
     """
     Extract bloodwork data from PDF and return as JSON/dict.
     
     Args:
-        pdf_path: Path to PDF file
+        pdf_path: Path to PDF file, or a seekable binary file object
+            (e.g. an upload's spooled buffer)
         output_json_path: Optional path to save JSON file
-        
+        stream: Extract and match page by page, stopping early once every
+            biomarker in `markers` is found (adds 'pages_read' / 'total_pages')
+        max_pages: Page budget for streaming mode (None = no limit)
+        markers: Biomarker names to look for (None = all of BIOMARKER_PATTERNS)
+        filename: Name reported in the output (defaults to the file name of pdf_path)
     
     Returns:
         Dictionary with extracted biomarkers
     """
     
-    # Extract text from PDF
-    with pdfplumber.open(pdf_path) as pdf:
-        text = " ".join([page.extract_text() or "" for page in pdf.pages])
-    
-    text_lower = text.lower()
-    
-    # Define biomarkers and their regex patterns
-    patterns = {
-        'total_cholesterol': r'total\s+cholesterol[:\s]+(\d+\.?\d*)',
-        'ldl': r'ldl[:\s]+(\d+\.?\d*)|low\s+density[:\s]+(\d+\.?\d*)',
-        'hdl': r'hdl[:\s]+(\d+\.?\d*)|high\s+density[:\s]+(\d+\.?\d*)',
-        'triglycerides': r'triglycerides?[:\s]+(\d+\.?\d*)',
-        'glucose': r'glucose[:\s]+(\d+\.?\d*)',
-        'hba1c': r'hb?a1c[:\s]+(\d+\.?\d*)',
-        'hemoglobin': r'hemoglobin[:\s]+(\d+\.?\d*)',
-        'hematocrit': r'hematocrit[:\s]+(\d+\.?\d*)',
-        'wbc': r'wbc[:\s]+(\d+\.?\d*)|white\s+blood[:\s]+(\d+\.?\d*)',
-        'platelets': r'platelets?[:\s]+(\d+\.?\d*)',
-        'vitamin_d': r'vitamin\s+d[:\s]+(\d+\.?\d*)',
-        'vitamin_b12': r'vitamin\s+b12[:\s]+(\d+\.?\d*)',
-        'ferritin': r'ferritin[:\s]+(\d+\.?\d*)',
-        'iron': r'iron[:\s]+(\d+\.?\d*)',
-        'tsh': r'tsh[:\s]+(\d+\.?\d*)',
-        'creatinine': r'creatinine[:\s]+(\d+\.?\d*)',
-        'bun': r'bun[:\s]+(\d+\.?\d*)',
-        'alt': r'alt[:\s]+(\d+\.?\d*)',
-        'ast': r'ast[:\s]+(\d+\.?\d*)',
-    }
-    
-    # Extract values
-    results = {}
-    for name, pattern in patterns.items():
-        match = re.search(pattern, text_lower)
-        if match:
-            # Get the first non-None group
-            value = next((g for g in match.groups() if g is not None), None)
-            if value:
-                results[name] = float(value)
+    pages_read = total_pages = None
+    if stream:
+        with pdfplumber.open(pdf_path) as pdf:
+            total_pages = len(pdf.pages)
+            results, pages_read = _stream_pages(pdf, markers, max_pages)
+    else:
+        # Extract text from PDF
+        with pdfplumber.open(pdf_path) as pdf:
+            text = " ".join([page.extract_text() or "" for page in pdf.pages])
+        
+        text_lower = text.lower()
+        
+        # Extract values
+        results = scan_biomarkers(text_lower, markers=markers)
     
     # Build final structure
     output = {
-        'filename': Path(pdf_path).name,
+        'filename': filename or _source_name(pdf_path),
         'biomarkers': results
     }
+    if stream:
+        output['pages_read'] = pages_read
+        output['total_pages'] = total_pages
     
     # Save to JSON if path provided
     if output_json_path:
@@ -73,12 +158,12 @@ def extract_bloodwork(pdf_path, output_json_path=None):
 
 # Command line usage
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python extract_bloodwork.py <input.pdf> [output.json]")
-        sys.exit(1)
-    
-    pdf_file = sys.argv[1]
-    json_file = sys.argv[2] if len(sys.argv) > 2 else None
+    parser = argparse.ArgumentParser(description="Extract biomarkers from a bloodwork PDF")
+    parser.add_argument("pdf", help="Path to bloodwork PDF")
+    parser.add_argument("output_json", nargs="?", default=None, help="Optional path to save JSON")
+    parser.add_argument("--stream", action="store_true", help="Read page by page and stop early")
+    parser.add_argument("--max-pages", type=int, default=None, help="Page budget for --stream")
+    args = parser.parse_args()
     
-    data = extract_bloodwork(pdf_file, json_file)
+    data = extract_bloodwork(args.pdf, args.output_json, stream=args.stream, max_pages=args.max_pages)
     print(json.dumps(data, indent=2))
\ No newline at end of file
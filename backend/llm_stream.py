@@ -0,0 +1,109 @@
+"""
+llm_stream.py — Helpers for streaming Featherless chat completions to clients
+------------------------------------------------------------------------------
+  - iter_completion_deltas() / aiter_completion_deltas(): parse an
+    OpenAI-style `stream: true` response (SSE "data: {...}" lines) from
+    requests / httpx into content text deltas
+  - ThinkFilter: drop <think>…</think> reasoning incrementally, even when a
+    tag is split across chunks (e.g. "<thi" + "nk>")
+  - sse(): format one server-sent event for a StreamingResponse
+"""
+
+import json
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class ThinkFilter:
+    """
+    Streaming equivalent of re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).
+
+    feed() returns the text that is safe to show now; a trailing fragment that
+    could still turn into a tag is held back until the next chunk (or flush()).
+    Unlike the regex, an unterminated <think> block is dropped rather than shown.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._inside = False
+
+    @staticmethod
+    def _partial_tag_len(text, tag):
+        """Length of the longest suffix of text that is a proper prefix of tag."""
+        for n in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:n]):
+                return n
+        return 0
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        out = []
+        while self._buffer:
+            tag = THINK_CLOSE if self._inside else THINK_OPEN
+            pos = self._buffer.find(tag)
+            if pos >= 0:
+                if not self._inside:
+                    out.append(self._buffer[:pos])
+                self._buffer = self._buffer[pos + len(tag):]
+                self._inside = not self._inside
+                continue
+            keep = self._partial_tag_len(self._buffer, tag)
+            if not self._inside:
+                out.append(self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+        return "".join(out)
+
+    def flush(self):
+        """Emit whatever is held back at end of stream."""
+        text = "" if self._inside else self._buffer
+        self._buffer = ""
+        return text
+
+
+_DONE = object()
+
+
+def _line_deltas(line):
+    """Content deltas carried by one SSE line, or _DONE at the end-of-stream marker."""
+    if not line or not line.startswith("data:"):
+        return []
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return _DONE
+    try:
+        event = json.loads(data)
+    except json.JSONDecodeError:
+        return []
+    return [
+        text for choice in event.get("choices") or []
+        if (text := (choice.get("delta") or {}).get("content"))
+    ]
+
+
+def iter_completion_deltas(response):
+    """
+    Yield content deltas from a streaming chat-completions requests.Response.
+    Reasoning fields some providers send separately (e.g. reasoning_content) are ignored.
+    """
+    for line in response.iter_lines(decode_unicode=True):
+        deltas = _line_deltas(line)
+        if deltas is _DONE:
+            break
+        yield from deltas
+
+
+async def aiter_completion_deltas(response):
+    """Async variant of iter_completion_deltas() for a streaming httpx.Response."""
+    async for line in response.aiter_lines():
+        deltas = _line_deltas(line)
+        if deltas is _DONE:
+            break
+        for text in deltas:
+            yield text
+
+
+def sse(event, data):
+    """One server-sent event; data is JSON-encoded."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
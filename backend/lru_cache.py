@@ -0,0 +1,93 @@
+"""
+lru_cache.py — Small thread-safe LRU cache with hit/miss counters
+------------------------------------------------------------------
+Used to memoize pure, repeatable work (e.g. symptom-vector predictions).
+functools.lru_cache is not enough here: callers need to clear the cache
+when an artifact changes, to report hit rates and, optionally, to expire
+entries after a TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded mapping that evicts the least recently used key. max_size <= 0 disables caching.
+    ttl: optional lifetime in seconds; expired entries count as misses and are dropped on access.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        self.max_size = int(max_size)
+        self.ttl = float(ttl) if ttl else None
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key, default=None):
+        """Like get(), but without touching recency or the hit/miss counters."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or (entry[0] is not None and entry[0] <= time.monotonic()):
+                return default
+            return entry[1]
+
+    def put(self, key, value) -> None:
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key) -> bool:
+        """Remove one entry; True if it was present."""
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept so hit rates survive an invalidation)."""
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -1,3 +1,4 @@
+import atexit
 import json
 import os
 from pathlib import Path
@@ -5,18 +6,28 @@ from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
 from fastapi import FastAPI, File, UploadFile, Depends, Form, HTTPException
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 
 from fastapi.middleware.cors import CORSMiddleware
 
 from pydantic import BaseModel
+import httpx
 import requests
 from dotenv import load_dotenv
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from extract_bloodwork import extract_bloodwork
-from bloodwork_advisor import analyze_bloodwork
-from med_recommender import get_otc_recommendation 
+import bloodwork_cache
+import upstream
+from pdf_workers import PdfJobTimeout, PdfWorkerPool, PoolBusy
+from bloodwork_jobs import BloodworkJobQueue, InvalidWebhook, QueueFull, check_webhook_url
+from upload_stream import UPLOAD_MAX_BYTES, UploadSizeLimitMiddleware, UploadTooLarge, hash_upload
+from bloodwork_advisor import analyze_bloodwork_async, stream_bloodwork_analysis
+from llm_stream import sse
+import recommendation_cache
+from cohort_flags import STATUS_NAMES, flag_cohort
+from otc_cache import OTC_RECOMMENDATIONS
+from otc_table import OTCTable
 
 from typing import Optional
 
@@ -25,12 +36,14 @@ _load_env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(_load_env_path)
 
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import tempfile
 
-from tts import text_to_speech
-from chatbot import chat as chatbot_chat
-from cal_com import create_booking as cal_create_booking, get_available_slots as cal_get_available_slots
-from sicknessPredictor import predict_disease
+from tts import atext_to_speech
+from chatbot import achat as chatbot_achat, chat_stream as chatbot_chat_stream
+from chat_context import CONTEXT as CHAT_CONTEXT
+from chat_sessions import ChatSessions, SessionNotFound
+from checkin import stats as checkin_stats
+from cal_com import acreate_booking as cal_acreate_booking, aget_available_slots as cal_aget_available_slots
+from sicknessPredictor import predict_disease, predict_disease_batch, predictor_metrics, active_symptom_names
 
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
@@ -41,8 +54,53 @@ firebase_admin.initialize_app(cred)
 db = firestore.client()
 
 
+# Bloodwork PDFs are parsed page by page and stop once every biomarker is found;
+# BLOODWORK_MAX_PAGES (optional) caps how many pages of a large export are read
+BLOODWORK_MAX_PAGES = int(os.getenv("BLOODWORK_MAX_PAGES") or 0) or None
+
+
 app = FastAPI(title="Hack Axxess 2026 API")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+# Reject oversized PDF uploads while they stream in (413), before the form is fully parsed
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=UPLOAD_MAX_BYTES, paths=("/upload-pdf", "/analyze-full", "/analyze-full/stream", "/jobs/analyze-full"))
+
+
+# CPU-bound PDF parsing runs in worker processes so it never blocks the event loop
+PDF_POOL = PdfWorkerPool()
+atexit.register(PDF_POOL.close)
+
+# Outbound API calls share pooled keep-alive clients (see upstream.py)
+atexit.register(upstream.close)
+
+
+async def _extract_upload(file: UploadFile):
+    """
+    Extract biomarkers from an upload: cache lookup by content hash, otherwise the
+    worker pool parses the spooled upload in place (never read into memory here,
+    no named temp file either way).
+    """
+    try:
+        pdf_sha256, _ = await hash_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    options = {"stream": True, "max_pages": BLOODWORK_MAX_PAGES}
+    cached = bloodwork_cache.lookup(pdf_sha256, file.filename, **options)
+    if cached is not None:
+        return cached
+
+    try:
+        result = await PDF_POOL.extract(file.file, filename=file.filename, **options)
+    except PoolBusy as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many PDFs are being processed, try again shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except PdfJobTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    bloodwork_cache.store(pdf_sha256, result, **options)
+    return result
 
 
 class TranscriptBody(BaseModel):
@@ -60,6 +118,15 @@ class ChatBody(BaseModel):
     user_context: dict = {}  # biomarkers + backgroundInfo injected by the frontend
 
 
+class ChatSessionBody(BaseModel):
+    mode: str = "general"  # "general" | "checkin"
+    user_context: dict = {}  # sent once; rendered into the session's system prompt
+
+
+class ChatTurnBody(BaseModel):
+    content: str
+
+
 class SendEmailBody(BaseModel):
     email: str
 
@@ -128,7 +195,8 @@ def _send_medication_reminder_email(to_email: str) -> None:
     if not api_key:
         raise ValueError("RESEND_API_KEY must be set in .env")
     from_email = os.getenv("RESEND_FROM_EMAIL") or "onboarding@resend.dev"
-    r = requests.post(
+    r = upstream.post(
+        "resend",
         RESEND_EMAILS_URL,
         headers={
             "Authorization": f"Bearer {api_key}",
@@ -140,7 +208,6 @@ def _send_medication_reminder_email(to_email: str) -> None:
             "subject": "Reminder: time to take your medication",
             "text": "Good morning!\n\nThis is your daily reminder to take your medication.\n\nStay healthy!",
         },
-        timeout=10,
     )
     r.raise_for_status()
 
@@ -196,12 +263,10 @@ async def upload_pdf(file: UploadFile = File(...)):
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
-    
-    result = extract_bloodwork(tmp_path)
-    return result
+    try:
+        return await _extract_upload(file)
+    finally:
+        await file.close()
 
 # Firebase token security
 security = HTTPBearer()
@@ -232,22 +297,74 @@ def health():
 
 
 @app.post("/chat")
-def chat_endpoint(body: ChatBody):
+async def chat_endpoint(body: ChatBody):
     if not body.messages:
         raise HTTPException(status_code=400, detail="messages cannot be empty")
     try:
         msg_list = [{"role": m.role, "content": m.content} for m in body.messages]
-        reply = chatbot_chat(msg_list, mode=body.mode, user_context=body.user_context or {})
-        return {"message": reply}
+        usage = {}
+        reply = await chatbot_achat(msg_list, mode=body.mode, user_context=body.user_context or {}, usage=usage)
+        return {"message": reply, "usage": usage}
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Chat failed: {e!s}")
 
-        
 
+async def _chat_sse_response(deltas, usage):
+    """
+    StreamingResponse for a chat reply generator: delta / done / error events.
+    The first token is awaited here, so failures before it get a normal HTTP status.
+    """
+    try:
+        first = await anext(deltas, None)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=502, detail=f"Chat failed: Featherless API error: {e.response.status_code}")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Chat failed: {type(e).__name__}")
+
+    async def events():
+        parts = []
+        try:
+            if first is not None:
+                parts.append(first)
+                yield sse("delta", {"text": first})
+            async for text in deltas:
+                parts.append(text)
+                yield sse("delta", {"text": text})
+            yield sse("done", {"message": "".join(parts).strip(), "usage": usage})
+        except httpx.HTTPError as e:
+            yield sse("error", {"detail": f"Chat failed: {type(e).__name__}"})
+        finally:
+            await deltas.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(body: ChatBody):
+    """
+    Same as /chat, streamed as server-sent events while the model generates:
+      event: delta  {"text": "..."}   — reply text, in order
+      event: done   {"message": "...", "usage": {...}} — full reply, same as /chat returns
+      event: error  {"detail": "..."} — upstream failed mid-stream
+    Failures before the first token get a normal HTTP error status. If the
+    client disconnects, the upstream request is closed so generation stops.
+    """
+    if not body.messages:
+        raise HTTPException(status_code=400, detail="messages cannot be empty")
+    msg_list = [{"role": m.role, "content": m.content} for m in body.messages]
+    usage = {}
+    deltas = chatbot_chat_stream(msg_list, mode=body.mode, user_context=body.user_context or {}, usage=usage)
+    return await _chat_sse_response(deltas, usage)
 
 
 FIREBASE_SEND_EMAIL_URL = "https://identitytoolkit.googleapis.com/v1/accounts:sendOobCode"
@@ -267,13 +384,14 @@ def get_doctor_info(user=Depends(verify_token)):
     return {"doctor": data.get("doctor")}
 
 
-def _send_welcome_email(to_email: str) -> None:
+async def _send_welcome_email(to_email: str) -> None:
     """Send a welcome email via Resend API. Raises on failure."""
     api_key = (os.getenv("RESEND_API_KEY") or "").strip().strip('"').strip("'")
     if not api_key:
         raise ValueError("RESEND_API_KEY must be set in .env")
     from_email = os.getenv("RESEND_FROM_EMAIL") or "onboarding@resend.dev"
-    r = requests.post(
+    r = await upstream.apost(
+        "resend",
         RESEND_EMAILS_URL,
         headers={
             "Authorization": f"Bearer {api_key}",
@@ -285,19 +403,18 @@ def _send_welcome_email(to_email: str) -> None:
             "subject": "Welcome to Bloodwork Analyzer",
             "text": "Hi,\n\nWelcome to Bloodwork Analyzer!\n",
         },
-        timeout=10,
     )
     r.raise_for_status()
 
 
 @app.post("/send-welcome-email")
-def send_welcome_email(body: SendEmailBody):
+async def send_welcome_email(body: SendEmailBody):
     """Send a custom welcome email: 'Hi, welcome to Bloodwork Analyzer'."""
     email = (body.email or "").strip()
     if not email:
         raise HTTPException(status_code=400, detail="Email is required")
     try:
-        _send_welcome_email(email)
+        await _send_welcome_email(email)
         return {"message": "Welcome email sent."}
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -344,7 +461,7 @@ def unsubscribe_medication_reminder(body: SendEmailBody):
 
 
 @app.get("/available-slots")
-def available_slots(
+async def available_slots(
     start: str,
     end: str,
     time_zone: str = "America/New_York",
@@ -359,7 +476,7 @@ def available_slots(
     raw_minutes = os.getenv("CAL_LENGTH_IN_MINUTES")
     duration_minutes = int(raw_minutes) if raw_minutes and str(raw_minutes).isdigit() else None
     try:
-        data = cal_get_available_slots(
+        data = await cal_aget_available_slots(
             start=start.strip(),
             end=end.strip(),
             time_zone=time_zone or "America/New_York",
@@ -372,7 +489,7 @@ def available_slots(
         return {"slots": data}
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         err = getattr(e, "response", None)
         msg = str(e)
         if err is not None and getattr(err, "text", None):
@@ -385,7 +502,7 @@ def available_slots(
 
 
 @app.post("/create-appointment")
-def create_appointment(body: CreateAppointmentBody):
+async def create_appointment(body: CreateAppointmentBody):
     """Create a Cal.com booking. Set CAL_API_KEY and CAL_EVENT_TYPE_ID (or CAL_EVENT_TYPE_SLUG + CAL_USERNAME) in .env."""
     load_dotenv(_load_env_path)
     start = (body.start or "").strip()
@@ -401,7 +518,7 @@ def create_appointment(body: CreateAppointmentBody):
     raw_minutes = os.getenv("CAL_LENGTH_IN_MINUTES")
     length_in_minutes = int(raw_minutes) if raw_minutes and str(raw_minutes).isdigit() else None
     try:
-        result = cal_create_booking(
+        result = await cal_acreate_booking(
             start=start,
             name=name,
             email=email,
@@ -415,7 +532,7 @@ def create_appointment(body: CreateAppointmentBody):
         return result
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         err = getattr(e, "response", None)
         msg = str(e)
         if err is not None and getattr(err, "text", None):
@@ -448,7 +565,7 @@ def save_doctor_info(
 
 
 @app.post("/send-password-reset-email")
-def send_password_reset_email(body: SendEmailBody):
+async def send_password_reset_email(body: SendEmailBody):
     """Ask Firebase Auth to send a password reset email to the given address."""
     email = (body.email or "").strip()
     if not email:
@@ -457,26 +574,26 @@ def send_password_reset_email(body: SendEmailBody):
     if not api_key:
         raise HTTPException(status_code=500, detail="FIREBASE_WEB_API_KEY is not set")
     try:
-        r = requests.post(
+        r = await upstream.apost(
+            "firebase",
             f"{FIREBASE_SEND_EMAIL_URL}?key={api_key}",
             json={"requestType": "PASSWORD_RESET", "email": email},
-            timeout=10,
         )
         if r.status_code != 200:
             # Don't leak whether the email exists; return generic message
             return {"message": "If an account exists for this email, a reset link was sent."}
         return {"message": "Password reset email sent."}
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Failed to send email: {e!s}")
 
 
 @app.post("/transcript")
-def submit_transcript(body: TranscriptBody):
+async def submit_transcript(body: TranscriptBody):
     text = (body.transcript or "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="Transcript is empty")
     try:
-        audio_bytes = text_to_speech(text)
+        audio_bytes = await atext_to_speech(text)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
@@ -511,14 +628,9 @@ async def analyze_full(
     if not api_key:
         raise HTTPException(status_code=500, detail="FEATHERLESS_API_KEY not set in .env")
 
-    # Save uploaded PDF temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
-
     try:
-        # Step 1: Extract bloodwork
-        bloodwork = extract_bloodwork(tmp_path)
+        # Step 1: Extract bloodwork (parsed from the upload buffer, no temp file)
+        bloodwork = await _extract_upload(file)
 
         if not bloodwork.get("biomarkers"):
             raise HTTPException(status_code=400, detail="No biomarkers extracted.")
@@ -536,8 +648,8 @@ async def analyze_full(
             }.items() if v is not None
         }
 
-        # Step 3: Analyze with LLM
-        result = analyze_bloodwork(
+        # Step 3: Analyze with LLM (awaited on the pooled async client, no thread held)
+        result = await analyze_bloodwork_async(
             bloodwork_data=bloodwork,
             api_key=api_key,
             user_profile=user_profile or None,
@@ -551,29 +663,335 @@ async def analyze_full(
         }
 
     finally:
-        os.unlink(tmp_path)
+        await file.close()
+
+
+@app.post("/analyze-full/stream")
+async def analyze_full_stream(
+    file: UploadFile = File(...),
+    age: Optional[int] = Form(None),
+    sex: Optional[str] = Form(None),
+    weight_kg: Optional[float] = Form(None),
+    height_cm: Optional[float] = Form(None),
+    activity: Optional[str] = Form(None),
+    goals: Optional[str] = Form(None),
+    diet: Optional[str] = Form(None),
+):
+    """
+    Same pipeline as /analyze-full, streamed as server-sent events:
+
+        event: biomarkers   {"extracted_biomarkers", "flagged_biomarkers"}   right after extraction
+        event: delta        {"text"}   recommendation text as the model produces it (<think> removed)
+        event: done         {"recommendations", "cached"}
+        event: error        {"detail"}   upstream failure after the stream has started
+
+    Extraction errors are still reported as normal HTTP errors before the stream starts.
+    """
+    api_key = os.getenv("FEATHERLESS_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="FEATHERLESS_API_KEY not set in .env")
+
+    try:
+        bloodwork = await _extract_upload(file)
+    finally:
+        await file.close()
+    if not bloodwork.get("biomarkers"):
+        raise HTTPException(status_code=400, detail="No biomarkers extracted.")
+
+    user_profile = {
+        k: v for k, v in {
+            "age": age,
+            "sex": sex,
+            "weight_kg": weight_kg,
+            "height_cm": height_cm,
+            "activity_level": activity,
+            "goals": goals,
+            "dietary_restrictions": diet,
+        }.items() if v is not None
+    }
+
+    async def events():
+        analysis = stream_bloodwork_analysis(
+            bloodwork_data=bloodwork,
+            api_key=api_key,
+            user_profile=user_profile or None,
+            model="deepseek-ai/DeepSeek-R1-0528",
+        )
+        try:
+            # The upstream request is blocking: pull each chunk in the thread pool
+            async for event, data in iterate_in_threadpool(analysis):
+                if event == "flagged":
+                    yield sse("biomarkers", {
+                        "extracted_biomarkers": bloodwork["biomarkers"],
+                        "flagged_biomarkers": data["flagged_biomarkers"],
+                    })
+                elif event == "delta":
+                    yield sse("delta", {"text": data})
+                else:
+                    yield sse("done", {"recommendations": data["recommendations"], "cached": data["cached"]})
+        except requests.exceptions.HTTPError as e:
+            yield sse("error", {"detail": f"Featherless API error: {e.response.status_code}"})
+        except requests.exceptions.RequestException as e:
+            yield sse("error", {"detail": f"Could not reach Featherless API: {type(e).__name__}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ── Chat sessions (history + patient context kept server-side) ───────────────
+
+CHAT_SESSIONS = ChatSessions()
+
+
+@app.post("/chat/sessions", status_code=201)
+def create_chat_session(body: ChatSessionBody):
+    """Start a session; user_context is sent once here instead of on every turn."""
+    session = CHAT_SESSIONS.create(mode=body.mode, user_context=body.user_context or {})
+    return {"session_id": session["id"], "mode": session["mode"], "expires_in": CHAT_SESSIONS.store.ttl}
+
+
+@app.post("/chat/sessions/{session_id}/messages")
+async def chat_session_turn(session_id: str, body: ChatTurnBody):
+    content = (body.content or "").strip()
+    if not content:
+        raise HTTPException(status_code=400, detail="content cannot be empty")
+    usage = {}
+    try:
+        reply = await CHAT_SESSIONS.turn(session_id, content, usage=usage)
+        return {"message": reply, "usage": usage}
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Chat failed: {e!s}")
+
+
+@app.post("/chat/sessions/{session_id}/messages/stream")
+async def chat_session_turn_stream(session_id: str, body: ChatTurnBody):
+    """Session turn streamed like /chat/stream."""
+    content = (body.content or "").strip()
+    if not content:
+        raise HTTPException(status_code=400, detail="content cannot be empty")
+    usage = {}
+    return await _chat_sse_response(CHAT_SESSIONS.stream_turn(session_id, content, usage=usage), usage)
+
+
+@app.delete("/chat/sessions/{session_id}")
+def delete_chat_session(session_id: str):
+    if not CHAT_SESSIONS.delete(session_id):
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    return {"deleted": session_id}
+
+
+@app.get("/chat/metrics")
+def chat_metrics():
+    """Prompt-token totals before / after history compaction, summary cache, session and check-in stats."""
+    return {**CHAT_CONTEXT.stats(), "sessions": CHAT_SESSIONS.metrics(), "checkin": checkin_stats()}
+
+
+# ── Bloodwork job queue (submit / poll / webhook) ────────────────────────────
+
+JOBS = BloodworkJobQueue(
+    pdf_pool=PDF_POOL,
+    api_key_fn=lambda: os.getenv("FEATHERLESS_API_KEY"),
+    extract_options={"stream": True, "max_pages": BLOODWORK_MAX_PAGES},
+)
+
+
+@app.on_event("startup")
+async def _start_bloodwork_jobs():
+    JOBS.start()  # also resumes jobs left unfinished by a restart
+
+
+@app.on_event("shutdown")
+async def _stop_bloodwork_jobs():
+    await JOBS.stop()
+    await upstream.aclose()
+
+
+@app.post("/jobs/analyze-full", status_code=202)
+async def submit_analyze_full_job(
+    file: UploadFile = File(...),
+    age: Optional[int] = Form(None),
+    sex: Optional[str] = Form(None),
+    weight_kg: Optional[float] = Form(None),
+    height_cm: Optional[float] = Form(None),
+    activity: Optional[str] = Form(None),
+    goals: Optional[str] = Form(None),
+    diet: Optional[str] = Form(None),
+    webhook_url: Optional[str] = Form(None),
+):
+    """
+    Queue the /analyze-full pipeline and return immediately with a job id.
+    Poll GET /jobs/{job_id}, or pass webhook_url to receive the finished job as a POST.
+    Re-submitting the same PDF with the same profile returns the existing job.
+    """
+    if not os.getenv("FEATHERLESS_API_KEY"):
+        raise HTTPException(status_code=500, detail="FEATHERLESS_API_KEY not set in .env")
+    if webhook_url:
+        try:
+            await check_webhook_url(webhook_url)
+        except InvalidWebhook as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        try:
+            pdf_sha256, _ = await hash_upload(file)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        pdf_bytes = await file.read()
+    finally:
+        await file.close()
+
+    user_profile = {
+        k: v for k, v in {
+            "age": age,
+            "sex": sex,
+            "weight_kg": weight_kg,
+            "height_cm": height_cm,
+            "activity_level": activity,
+            "goals": goals,
+            "dietary_restrictions": diet,
+        }.items() if v is not None
+    }
+    try:
+        job, deduplicated = JOBS.submit(
+            pdf_bytes,
+            pdf_sha256,
+            filename=file.filename,
+            profile=user_profile,
+            model="deepseek-ai/DeepSeek-R1-0528",
+            webhook_url=webhook_url,
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "deduplicated": deduplicated,
+        "poll_url": f"/jobs/{job['id']}",
+    }
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Job status, per-stage timings and, once done, the same result body as /analyze-full."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/bloodwork/metrics")
+def bloodwork_metrics():
+    """Extraction cache, PDF worker pool, recommendation cache and job queue counters."""
+    return {
+        "extraction_cache": bloodwork_cache.cache_stats(),
+        "pdf_pool": PDF_POOL.metrics(),
+        "recommendation_cache": recommendation_cache.cache_stats(),
+        "jobs": JOBS.metrics(),
+    }
+
+
+# ── Cohort flagging endpoint ──────────────────────────────────────────────────
+
+class CohortFlagsBody(BaseModel):
+    # One {biomarker: value} dict per patient, e.g. from stored extract_bloodwork results
+    patients: list[dict[str, Optional[float]]]
+    include_status: bool = True  # False = prevalence only (dashboards)
+
+
+@app.post("/bloodwork/cohort-flags")
+def cohort_flags_endpoint(body: CohortFlagsBody):
+    """
+    Flag many patients' biomarkers at once (vectorized, see cohort_flags.py).
+    Returns per-marker prevalence counts and, optionally, a status code per
+    patient and marker (legend in "status_names").
+    """
+    try:
+        result = flag_cohort(body.patients)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response = {
+        "patients": result["patients"],
+        "markers": result["markers"],
+        "prevalence": result["prevalence"],
+        "status_names": {str(code): name for code, name in STATUS_NAMES.items()},
+    }
+    if body.include_status:
+        response["status"] = result["status"].tolist()
+    return response
 
 
 # ── Disease prediction endpoint ──────────────────────────────────────────────
 
 class PredictDiseaseBody(BaseModel):
-    symptoms: dict  # e.g. {"bronchial_asthma_patient": 0, "itching": 1, ...}
+    # Preferred: active symptom names, e.g. ["itching", "chills"].
+    # Still accepted: full symptom dict, e.g. {"itching": 1, "skin_rash": 0, ...}
+    symptoms: list[str] | dict
 
 
 @app.post("/predict-disease")
 def predict_disease_endpoint(body: PredictDiseaseBody):
-    """Accept a symptom dict and return the predicted disease label."""
+    """Accept active symptom names (or a symptom dict) and return the predicted disease label."""
     if not body.symptoms:
-        raise HTTPException(status_code=400, detail="symptoms dict is required")
+        raise HTTPException(status_code=400, detail="symptoms are required")
     try:
         disease = predict_disease(body.symptoms)
         return {"disease": disease}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {e!s}")
 
 
+class PredictDiseaseBatchBody(BaseModel):
+    patients: list[list[str] | dict]  # one entry per patient, same shape as /predict-disease symptoms
+
+
+@app.post("/predict-disease/batch")
+def predict_disease_batch_endpoint(body: PredictDiseaseBatchBody):
+    """Score many symptom dicts with a single model call; results come back in input order."""
+    if not body.patients:
+        raise HTTPException(status_code=400, detail="patients list is required")
+    if any(not p for p in body.patients):
+        raise HTTPException(status_code=400, detail="every patient needs symptoms")
+    try:
+        return {"predictions": predict_disease_batch(body.patients)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {e!s}")
+
+
+@app.get("/predict-disease/metrics")
+def predict_disease_metrics():
+    """Predictor engine and micro-batching stats (queue depth, batch sizes, queue wait p50/p99)."""
+    return predictor_metrics()
+
+
+# Recommendations for every label the classifier can emit, generated ahead of
+# time (`python otc_table.py build`) and topped up in the background
+OTC_TABLE = OTCTable()
+OTC_TABLE.load()
+
+
+@app.on_event("startup")
+async def _start_otc_table_refresh():
+    OTC_TABLE.start(api_key_fn=lambda: os.getenv("FEATHERLESS_API_KEY"))
+
+
+@app.on_event("shutdown")
+async def _stop_otc_table_refresh():
+    await OTC_TABLE.stop()
+
+
 class PredictRecommendBody(BaseModel):
-    symptoms: dict
+    symptoms: list[str] | dict  # active symptom names (or legacy symptom dict)
     patient_name: str = "the patient"
     patient_email: str = ""
     doctor_email: str = ""
@@ -583,25 +1001,29 @@ class PredictRecommendBody(BaseModel):
 def predict_and_recommend(body: PredictRecommendBody):
     """
     1. Predict disease from symptom dict.
-    2. Get OTC recommendation from Featherless.
+    2. Look up the precomputed OTC recommendation (otc_table.py); only a label
+       missing from the table calls Featherless (cached per disease, see otc_cache.py).
     3. Send doctor notification email (if doctor_email provided).
     Returns disease label + OTC recommendation text.
     """
     if not body.symptoms:
-        raise HTTPException(status_code=400, detail="symptoms dict is required")
+        raise HTTPException(status_code=400, detail="symptoms are required")
 
     # Step 1 — predict
     try:
         disease = predict_disease(body.symptoms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {e!s}")
 
-    # Step 2 — recommend OTC
+    # Step 2 — recommend OTC (precomputed for every label the model can predict)
+    result = OTC_TABLE.lookup(disease)
     api_key = os.getenv("FEATHERLESS_API_KEY")
-    if not api_key:
+    if result is None and not api_key:
         raise HTTPException(status_code=500, detail="FEATHERLESS_API_KEY not set in .env")
     try:
-        result = get_otc_recommendation(disease=disease, api_key=api_key)
+        result = result or OTC_RECOMMENDATIONS.get(disease, api_key=api_key)
         recommendation = result["recommendation"]
     except requests.exceptions.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Featherless API error: {e.response.status_code} - {e.response.text}")
@@ -619,7 +1041,7 @@ def predict_and_recommend(body: PredictRecommendBody):
             print(f"[predict-and-recommend] RESEND_API_KEY present: {bool(resend_key)}")
             from_email = os.getenv("RESEND_FROM_EMAIL") or "onboarding@resend.dev"
             patient_name = body.patient_name or "the patient"
-            selected_symptoms = [k for k, v in body.symptoms.items() if v == 1]
+            selected_symptoms = active_symptom_names(body.symptoms)
             symptom_list = "\n".join(f"  • {s.replace('_', ' ').title()}" for s in selected_symptoms) or "  (none reported)"
             today = datetime.now().strftime("%B %d, %Y")
             email_body = (
@@ -646,7 +1068,8 @@ def predict_and_recommend(body: PredictRecommendBody):
                 f"Best regards,\n"
                 f"Health Bridge Platform"
             )
-            r = requests.post(
+            r = upstream.post(
+                "resend",
                 RESEND_EMAILS_URL,
                 headers={"Authorization": f"Bearer {resend_key}", "Content-Type": "application/json"},
                 json={
@@ -655,7 +1078,6 @@ def predict_and_recommend(body: PredictRecommendBody):
                     "subject": f"[Health Bridge] Patient Symptom Report — {patient_name} — {today}",
                     "text": email_body,
                 },
-                timeout=10,
             )
             r.raise_for_status()
             email_sent = True
@@ -704,11 +1126,18 @@ async def recommend_otc(body: OTCRequest):
         )
 
     try:
-        result = get_otc_recommendation(disease=body.disease.strip(), api_key=api_key)
+        disease = body.disease.strip()
+        result = OTC_TABLE.lookup(disease) or await OTC_RECOMMENDATIONS.aget(disease, api_key=api_key)
         return result
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=502, detail=f"Featherless API error: {e.response.status_code} - {e.response.text}")
-    except requests.exceptions.ConnectionError:
+    except (httpx.ConnectError, httpx.ConnectTimeout):
         raise HTTPException(status_code=503, detail="Could not connect to Featherless API.")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/recommend-otc/metrics")
+def recommend_otc_metrics():
+    """OTC recommendation cache hit rate, coalesced misses and precomputed-table coverage."""
+    return {**OTC_RECOMMENDATIONS.stats(), "table": OTC_TABLE.stats()}
@@ -9,7 +9,7 @@ Given a disease or illness as text input, this module:
 Can be used standalone (CLI) or imported into the FastAPI app.
 """
 
-import requests
+import upstream
 
 FEATHERLESS_API_URL = "https://api.featherless.ai/v1/chat/completions"
 DEFAULT_MODEL = "meta-llama/Meta-Llama-3.1-8B-Instruct"
@@ -32,18 +32,7 @@ End with one line: "See a doctor if symptoms worsen or last more than X days."
 No lengthy explanations. No disclaimers beyond the final line."""
 
 
-def get_otc_recommendation(disease: str, api_key: str, model: str = DEFAULT_MODEL) -> dict:
-    """
-    Call Featherless AI to get an OTC medication recommendation for a given disease.
-
-    Args:
-        disease:  The disease or illness string entered by the user.
-        api_key:  Your Featherless.ai API key.
-        model:    Featherless model string.
-
-    Returns:
-        dict with keys: disease (str), recommendation (str), model_used (str)
-    """
+def _prepare_request(disease: str, api_key: str, model: str) -> tuple[dict, dict]:
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
@@ -58,8 +47,23 @@ def get_otc_recommendation(disease: str, api_key: str, model: str = DEFAULT_MODE
         "temperature": 0.2,
         "max_tokens": 800,
     }
+    return headers, payload
+
+
+def get_otc_recommendation(disease: str, api_key: str, model: str = DEFAULT_MODEL) -> dict:
+    """
+    Call Featherless AI to get an OTC medication recommendation for a given disease.
 
-    response = requests.post(FEATHERLESS_API_URL, headers=headers, json=payload, timeout=60)
+    Args:
+        disease:  The disease or illness string entered by the user.
+        api_key:  Your Featherless.ai API key.
+        model:    Featherless model string.
+
+    Returns:
+        dict with keys: disease (str), recommendation (str), model_used (str)
+    """
+    headers, payload = _prepare_request(disease, api_key, model)
+    response = upstream.post("featherless", FEATHERLESS_API_URL, headers=headers, json=payload, timeout=60)
     response.raise_for_status()
 
     data = response.json()
@@ -72,11 +76,26 @@ def get_otc_recommendation(disease: str, api_key: str, model: str = DEFAULT_MODE
     }
 
 
+async def aget_otc_recommendation(disease: str, api_key: str, model: str = DEFAULT_MODEL) -> dict:
+    """Async variant of get_otc_recommendation(); raises httpx errors instead of requests errors."""
+    headers, payload = _prepare_request(disease, api_key, model)
+    response = await upstream.apost("featherless", FEATHERLESS_API_URL, headers=headers, json=payload, timeout=60)
+    response.raise_for_status()
+
+    data = response.json()
+    return {
+        "disease": disease,
+        "recommendation": data["choices"][0]["message"]["content"],
+        "model_used": model,
+    }
+
+
 # ── CLI entrypoint ────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
     import os
     import sys
+    import requests
     from dotenv import load_dotenv
 
     load_dotenv()
@@ -0,0 +1,260 @@
+"""
+numpy_predictor.py — TensorFlow-free inference for the symptom classifier
+--------------------------------------------------------------------------
+The disease model is a small stack of Dense layers, so serving it does not
+need the Keras runtime. This module:
+  - exports my_model.h5 + scaler.pkl + label_encoder.pkl into one .npz
+    artifact, with the StandardScaler folded into the first Dense layer
+    and the training column order (symptom_features.py) stored alongside
+  - runs the forward pass with plain NumPy (NumpyClassifier)
+  - checks the NumPy outputs against Keras (parity check)
+
+TensorFlow is only imported by the export and parity commands.
+
+Usage:
+    python numpy_predictor.py export [--out symptom_model.npz] [--no-check]
+    python numpy_predictor.py check  [--artifact symptom_model.npz]
+"""
+
+import argparse
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from symptom_features import SYMPTOM_FEATURES
+
+_dir = Path(__file__).resolve().parent
+
+DEFAULT_H5_PATH = _dir / "my_model.h5"
+DEFAULT_SCALER_PATH = _dir / "scaler.pkl"
+DEFAULT_LABEL_ENCODER_PATH = _dir / "label_encoder.pkl"
+DEFAULT_ARTIFACT_PATH = _dir / "symptom_model.npz"
+
+
+def _relu(z):
+    return np.maximum(z, 0.0)
+
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+ACTIVATIONS = {
+    "linear": lambda z: z,
+    "relu": _relu,
+    "softmax": _softmax,
+    "sigmoid": _sigmoid,
+    "tanh": np.tanh,
+}
+
+
+class NumpyClassifier:
+    """
+    Dense forward pass over weights exported from the Keras model.
+
+    kernel_scales: optional per-output-channel float32 scales. When given, kernels are int8
+    (weight-only quantization, see quantize_model.py) and each layer computes
+    (x @ q) * scale + b.
+    """
+
+    def __init__(self, kernels, biases, activations, classes, feature_names=None, kernel_scales=None):
+        if not (len(kernels) == len(biases) == len(activations)):
+            raise ValueError("kernels, biases and activations must have the same length")
+        for act in activations:
+            if act not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {act}")
+        if kernel_scales is None:
+            self.kernels = [np.ascontiguousarray(k, dtype=np.float32) for k in kernels]
+            self.kernel_scales = [None] * len(self.kernels)
+        else:
+            self.kernels = [np.ascontiguousarray(k, dtype=np.int8) for k in kernels]
+            self.kernel_scales = [np.asarray(sc, dtype=np.float32) for sc in kernel_scales]
+        self.quantized = kernel_scales is not None
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        self.classes_ = np.asarray(classes)
+        self.n_features = self.kernels[0].shape[0]
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        if self.feature_names is not None and len(self.feature_names) != self.n_features:
+            raise ValueError(f"{len(self.feature_names)} feature names for {self.n_features} inputs")
+
+    @classmethod
+    def load(cls, path=DEFAULT_ARTIFACT_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            n_layers = int(data["n_layers"])
+            kernels = [data[f"kernel_{i}"] for i in range(n_layers)]
+            biases = [data[f"bias_{i}"] for i in range(n_layers)]
+            activations = [str(a) for a in data["activations"]]
+            classes = [str(c) for c in data["classes"]]
+            features = [str(f) for f in data["features"]] if "features" in data.files else None
+            scales = None
+            if "kernel_scale_0" in data.files:
+                scales = [data[f"kernel_scale_{i}"] for i in range(n_layers)]
+        return cls(kernels, biases, activations, classes, features, scales)
+
+    def predict_proba(self, x):
+        """
+        x: (n_samples, n_features) array of raw (unscaled) symptom flags
+        returns: (n_samples, n_classes) float32 class probabilities
+        """
+        h = np.asarray(x, dtype=np.float32)
+        if h.ndim != 2 or h.shape[1] != self.n_features:
+            raise ValueError(f"expected shape (n, {self.n_features}), got {h.shape}")
+        for kernel, scale, bias, act in zip(self.kernels, self.kernel_scales, self.biases, self.activations):
+            z = h @ kernel
+            if scale is not None:
+                z = z.astype(np.float32) * scale
+            h = ACTIVATIONS[act](z + bias)
+        return h
+
+    def nbytes(self):
+        """Size of the weights held in memory."""
+        arrays = self.kernels + self.biases + [sc for sc in self.kernel_scales if sc is not None]
+        return int(sum(a.nbytes for a in arrays))
+
+
+def fold_scaler(kernel, bias, scaler):
+    """
+    Fold StandardScaler into a Dense layer:
+        ((x - mean) / scale) @ W + b  ==  x @ (W / scale[:, None]) + (b - (mean / scale) @ W)
+    """
+    n_features = kernel.shape[0]
+    mean = scaler.mean_ if getattr(scaler, "mean_", None) is not None else np.zeros(n_features)
+    scale = scaler.scale_ if getattr(scaler, "scale_", None) is not None else np.ones(n_features)
+    mean = np.asarray(mean, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+    kernel = np.asarray(kernel, dtype=np.float64)
+    folded_kernel = kernel / scale[:, None]
+    folded_bias = np.asarray(bias, dtype=np.float64) - (mean / scale) @ kernel
+    return folded_kernel.astype(np.float32), folded_bias.astype(np.float32)
+
+
+def _load_keras_parts(h5_path, scaler_path, label_encoder_path):
+    from tensorflow.keras.models import load_model
+
+    model = load_model(str(h5_path))
+    with open(scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+    with open(label_encoder_path, "rb") as f:
+        le = pickle.load(f)
+    return model, scaler, le
+
+
+def export_artifact(
+    out_path=DEFAULT_ARTIFACT_PATH,
+    h5_path=DEFAULT_H5_PATH,
+    scaler_path=DEFAULT_SCALER_PATH,
+    label_encoder_path=DEFAULT_LABEL_ENCODER_PATH,
+):
+    """Write the Keras weights, scaler and label encoder into one .npz artifact."""
+    model, scaler, le = _load_keras_parts(h5_path, scaler_path, label_encoder_path)
+
+    kernels, biases, activations = [], [], []
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind in ("InputLayer", "Dropout"):
+            continue  # no-ops at inference time
+        if kind != "Dense":
+            raise ValueError(f"Cannot export layer {layer.name!r} of type {kind}")
+        kernel, bias = layer.get_weights()
+        kernels.append(kernel)
+        biases.append(bias)
+        activations.append(layer.get_config()["activation"])
+
+    kernels[0], biases[0] = fold_scaler(kernels[0], biases[0], scaler)
+
+    arrays = {"n_layers": np.int64(len(kernels))}
+    for i, (kernel, bias) in enumerate(zip(kernels, biases)):
+        arrays[f"kernel_{i}"] = np.asarray(kernel, dtype=np.float32)
+        arrays[f"bias_{i}"] = np.asarray(bias, dtype=np.float32)
+    arrays["activations"] = np.array(activations)
+    arrays["classes"] = np.array([str(c) for c in le.classes_])
+    if len(SYMPTOM_FEATURES) != kernels[0].shape[0]:
+        raise ValueError(f"SYMPTOM_FEATURES has {len(SYMPTOM_FEATURES)} names, model expects {kernels[0].shape[0]}")
+    arrays["features"] = np.array(SYMPTOM_FEATURES)
+
+    np.savez_compressed(out_path, **arrays)
+    return Path(out_path)
+
+
+def sample_symptom_inputs(n_features, n_random=2000, seed=0):
+    """Empty vector, every single symptom, and random sparse symptom combinations."""
+    rng = np.random.default_rng(seed)
+    rows = [np.zeros((1, n_features)), np.eye(n_features)]
+    random_rows = (rng.random((n_random, n_features)) < 5.0 / n_features).astype(np.float64)
+    rows.append(random_rows)
+    return np.vstack(rows).astype(np.float32)
+
+
+def check_parity(
+    artifact_path=DEFAULT_ARTIFACT_PATH,
+    h5_path=DEFAULT_H5_PATH,
+    scaler_path=DEFAULT_SCALER_PATH,
+    label_encoder_path=DEFAULT_LABEL_ENCODER_PATH,
+    atol=1e-4,
+):
+    """Compare NumPy and Keras outputs. Returns a dict with max_abs_diff and label_agreement."""
+    model, scaler, le = _load_keras_parts(h5_path, scaler_path, label_encoder_path)
+    clf = NumpyClassifier.load(artifact_path)
+
+    x = sample_symptom_inputs(clf.n_features)
+    keras_probs = model.predict(scaler.transform(x), batch_size=len(x), verbose=0)
+    numpy_probs = clf.predict_proba(x)
+
+    max_abs_diff = float(np.abs(keras_probs - numpy_probs).max())
+    label_agreement = float((keras_probs.argmax(axis=1) == numpy_probs.argmax(axis=1)).mean())
+    classes_match = [str(c) for c in le.classes_] == [str(c) for c in clf.classes_]
+    return {
+        "samples": int(len(x)),
+        "max_abs_diff": max_abs_diff,
+        "label_agreement": label_agreement,
+        "classes_match": classes_match,
+        "ok": classes_match and max_abs_diff <= atol and label_agreement == 1.0,
+    }
+
+
+# ── CLI entrypoint ────────────────────────────────────────────────────────────
+
+def _print_parity(report):
+    print(f"   samples:         {report['samples']}")
+    print(f"   max |Δprob|:     {report['max_abs_diff']:.2e}")
+    print(f"   label agreement: {report['label_agreement']:.4f}")
+    print(f"   classes match:   {report['classes_match']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / verify the NumPy symptom classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="Build the .npz artifact from my_model.h5 + pickles")
+    p_export.add_argument("--out", default=str(DEFAULT_ARTIFACT_PATH))
+    p_export.add_argument("--no-check", action="store_true", help="Skip the Keras parity check")
+
+    p_check = sub.add_parser("check", help="Compare an existing artifact against Keras")
+    p_check.add_argument("--artifact", default=str(DEFAULT_ARTIFACT_PATH))
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        out = export_artifact(args.out)
+        print(f"Saved to: {out} ({out.stat().st_size} bytes)")
+        if args.no_check:
+            sys.exit(0)
+        artifact = out
+    else:
+        artifact = args.artifact
+
+    report = check_parity(artifact)
+    _print_parity(report)
+    if not report["ok"]:
+        print("Parity check FAILED")
+        sys.exit(1)
+    print("Parity check passed")
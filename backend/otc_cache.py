@@ -0,0 +1,147 @@
+"""
+otc_cache.py — Cached, single-flight OTC recommendations
+---------------------------------------------------------
+get_otc_recommendation() depends only on the disease and the model (at
+temperature 0.2), and predicted labels repeat: many symptom submissions map
+to the same few dozen diseases, often at the same moment. This module puts
+two things in front of med_recommender:
+
+  - a TTL cache keyed on (normalized disease name, model), so "Common Cold",
+    "common_cold" and " common  cold " share one entry
+  - single-flight coalescing: concurrent misses for the same key wait for
+    the one upstream call already in flight instead of starting their own.
+    Sync callers (thread-pool handlers) and async callers share the same
+    in-flight table, so they coalesce with each other too
+
+Failures are not cached; callers waiting on a failed call get its error.
+
+Config (.env):
+    OTC_CACHE           "0" disables caching (calls are still coalesced), default on
+    OTC_CACHE_TTL       seconds, default 86400 (1 day)
+    OTC_CACHE_SIZE      max entries, default 512
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import re
+import threading
+
+from lru_cache import LRUCache
+from med_recommender import DEFAULT_MODEL, aget_otc_recommendation, get_otc_recommendation
+
+OTC_CACHE_ENABLED = (os.getenv("OTC_CACHE") or "1").strip().lower() not in ("0", "false", "no")
+OTC_CACHE_TTL = float(os.getenv("OTC_CACHE_TTL") or 86400)
+OTC_CACHE_SIZE = int(os.getenv("OTC_CACHE_SIZE") or 512)
+
+
+def normalize_disease(disease):
+    """'  Common_Cold ' -> 'common cold'."""
+    return " ".join(re.sub(r"[_\-]+", " ", str(disease)).lower().split())
+
+
+class OTCRecommendations:
+    """TTL cache + single-flight wrapper around get_otc_recommendation / aget_otc_recommendation."""
+
+    def __init__(self, ttl=OTC_CACHE_TTL, max_size=OTC_CACHE_SIZE, enabled=OTC_CACHE_ENABLED):
+        self.ttl = ttl
+        self._cache = LRUCache(max_size if enabled else 0, ttl=ttl)
+        self._inflight = {}  # key -> concurrent.futures.Future holding the recommendation text
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    @staticmethod
+    def key(disease, model=DEFAULT_MODEL):
+        return normalize_disease(disease), model
+
+    @staticmethod
+    def _result(disease, model, recommendation, cached):
+        return {"disease": disease, "recommendation": recommendation, "model_used": model, "cached": cached}
+
+    def _claim(self, key):
+        """
+        (cached text, None, False) on a cache hit, otherwise (None, future, leader).
+        The leader makes the upstream call; everyone else waits on its future.
+        """
+        with self._lock:
+            # Re-checked under the lock: a leader may have finished since the caller's get()
+            text = self._cache.peek(key)
+            if text is not None:
+                return text, None, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False
+            future = self._inflight[key] = concurrent.futures.Future()
+            self.upstream_calls += 1
+            return None, future, True
+
+    def _settle(self, key, future, text=None, exc=None):
+        with self._lock:
+            if exc is None:
+                self._cache.put(key, text)  # cached before the key leaves the in-flight table
+            else:
+                self.failures += 1
+            del self._inflight[key]
+        if exc is None:
+            future.set_result(text)
+        else:
+            future.set_exception(exc)
+
+    def get(self, disease, api_key, model=DEFAULT_MODEL):
+        """Blocking lookup; same return value as get_otc_recommendation() plus "cached"."""
+        key = self.key(disease, model)
+        text = self._cache.get(key)
+        if text is None:
+            text, future, leader = self._claim(key)
+            if future is not None and not leader:
+                text = future.result()
+            elif future is not None:
+                try:
+                    text = get_otc_recommendation(key[0], api_key, model)["recommendation"]
+                except BaseException as exc:
+                    self._settle(key, future, exc=exc)
+                    raise
+                self._settle(key, future, text)
+                return self._result(disease, model, text, cached=False)
+        return self._result(disease, model, text, cached=True)
+
+    async def aget(self, disease, api_key, model=DEFAULT_MODEL):
+        """Async get(); the upstream call is awaited on the pooled httpx client."""
+        key = self.key(disease, model)
+        text = self._cache.get(key)
+        if text is None:
+            text, future, leader = self._claim(key)
+            if future is not None and not leader:
+                # shield: a cancelled waiter must not cancel the shared future
+                text = await asyncio.shield(asyncio.wrap_future(future))
+            elif future is not None:
+                try:
+                    result = await aget_otc_recommendation(key[0], api_key, model)
+                    text = result["recommendation"]
+                except BaseException as exc:
+                    self._settle(key, future, exc=exc)
+                    raise
+                self._settle(key, future, text)
+                return self._result(disease, model, text, cached=False)
+        return self._result(disease, model, text, cached=True)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._inflight)
+        return {
+            "ttl_s": self.ttl,
+            **self._cache.stats(),
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "in_flight": in_flight,
+        }
+
+
+OTC_RECOMMENDATIONS = OTCRecommendations()
@@ -0,0 +1,349 @@
+"""
+otc_table.py — Precomputed OTC recommendations for every predictable disease
+-----------------------------------------------------------------------------
+The symptom classifier can only predict the diseases in its label set
+(sicknessPredictor.labels, i.e. le.classes_), so every recommendation
+/predict-and-recommend can need is known in advance. This module generates
+them ahead of time into a local JSON artifact:
+
+  - `python otc_table.py build` asks Featherless for every label (bounded
+    concurrency) and writes otc_recommendations.json atomically; labels that
+    are already present and fresh are kept, so a rerun only fills the gaps
+  - the API loads the artifact at startup and serves hits from memory, with
+    no network call; a miss falls back to otc_cache.OTC_RECOMMENDATIONS
+  - a background task reloads the file when it changes on disk and generates
+    labels that are missing (e.g. after a retrain) or older than
+    OTC_TABLE_MAX_AGE, then saves the artifact again. With several API worker
+    processes only one of them does this: the one holding an exclusive lock
+    on <artifact>.lock. The others only reload the file it saves, and one of
+    them takes over the lock if that process exits
+
+The artifact records the model and a hash of the exact request template
+(prompt, temperature, max_tokens). If either differs from the running code,
+its entries are ignored and regenerated. Each save gets a new "version".
+
+Config (.env):
+    OTC_TABLE_PATH                artifact path, default backend/otc_recommendations.json
+    OTC_TABLE_CONCURRENCY         concurrent generation calls, default 4
+    OTC_TABLE_REFRESH_INTERVAL    seconds between background refreshes, default 3600 (0 = off)
+    OTC_TABLE_MAX_AGE             seconds before an entry is regenerated, default 604800 (0 = never)
+
+Usage:
+    python otc_table.py build  [--out otc_recommendations.json] [--concurrency 4] [--force]
+    python otc_table.py status [--path otc_recommendations.json]
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import sicknessPredictor
+from med_recommender import DEFAULT_MODEL, _prepare_request
+from otc_cache import OTC_RECOMMENDATIONS, normalize_disease
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_dir = Path(__file__).resolve().parent
+
+OTC_TABLE_PATH = Path(os.getenv("OTC_TABLE_PATH") or (_dir / "otc_recommendations.json"))
+OTC_TABLE_CONCURRENCY = int(os.getenv("OTC_TABLE_CONCURRENCY") or 4)
+OTC_TABLE_REFRESH_INTERVAL = float(os.getenv("OTC_TABLE_REFRESH_INTERVAL") or 3600)
+OTC_TABLE_MAX_AGE = float(os.getenv("OTC_TABLE_MAX_AGE") or 604800)
+
+FORMAT_VERSION = 1
+
+
+def request_fingerprint(model=DEFAULT_MODEL):
+    """Hash of the request sent for a disease (prompt, model, sampling settings)."""
+    _, payload = _prepare_request("{disease}", "", model)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def current_labels():
+    """Every disease the loaded classifier can predict."""
+    return [str(label) for label in sicknessPredictor.labels]
+
+
+class OTCTable:
+    """In-memory view of the artifact: normalized label -> recommendation."""
+
+    def __init__(self, path=OTC_TABLE_PATH, model=DEFAULT_MODEL):
+        self.path = Path(path)
+        self.model = model
+        self.fingerprint = request_fingerprint(model)
+        self.version = None
+        self._entries = {}  # normalized label -> {"label", "recommendation", "generated_at"}
+        self._file_stat = None
+        self._lock = threading.Lock()
+        self._task = None
+        self._refresh_lock = None  # open lock file while this process owns the background refresh
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.generated = 0
+        self.failed = 0
+
+    # ── artifact ──
+
+    def _stat(self):
+        try:
+            st = self.path.stat()
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def load(self):
+        """Read the artifact; a missing file or one built for another model/prompt loads as empty."""
+        stat = self._stat()
+        entries, version = {}, None
+        if stat is not None:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                print(f"[otc_table] could not read {self.path}: {exc}")
+                data = {}
+            if data.get("format") == FORMAT_VERSION and data.get("model") == self.model \
+                    and data.get("request_sha256") == self.fingerprint:
+                version = data.get("version")
+                for label, entry in (data.get("recommendations") or {}).items():
+                    entries[normalize_disease(label)] = {"label": label, **entry}
+            elif data:
+                print(f"[otc_table] {self.path} was built for a different model or prompt; ignoring it")
+        with self._lock:
+            self._entries, self.version, self._file_stat = entries, version, stat
+        return len(entries)
+
+    def reload_if_changed(self):
+        if self._stat() != self._file_stat:
+            print(f"[otc_table] {self.path} changed on disk, reloading")
+            self.load()
+
+    def save(self):
+        """Write the artifact atomically under a new version."""
+        with self._lock:
+            recommendations = {
+                e["label"]: {"recommendation": e["recommendation"], "generated_at": e["generated_at"]}
+                for e in sorted(self._entries.values(), key=lambda e: e["label"])
+            }
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+        data = {
+            "format": FORMAT_VERSION,
+            "version": version,
+            "model": self.model,
+            "request_sha256": self.fingerprint,
+            "recommendations": recommendations,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(suffix=".json", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1, ensure_ascii=False)
+            os.chmod(tmp_name, 0o644)  # mkstemp creates 0600
+            os.replace(tmp_name, self.path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+        with self._lock:
+            self.version, self._file_stat = version, self._stat()
+        return version
+
+    # ── lookups ──
+
+    def lookup(self, disease, model=DEFAULT_MODEL):
+        """Same shape as OTC_RECOMMENDATIONS.get(), or None if the table has no entry."""
+        entry = self._entries.get(normalize_disease(disease)) if model == self.model else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"disease": disease, "recommendation": entry["recommendation"], "model_used": self.model,
+                "cached": True}
+
+    def stale_labels(self, labels, max_age=OTC_TABLE_MAX_AGE):
+        """Labels with no entry, or an entry older than max_age seconds."""
+        cutoff = time.time() - max_age if max_age > 0 else None
+        out = []
+        for label in labels:
+            entry = self._entries.get(normalize_disease(label))
+            if entry is None or (cutoff is not None and entry["generated_at"] < cutoff):
+                out.append(label)
+        return out
+
+    # ── generation ──
+
+    async def warm(self, labels, api_key, concurrency=OTC_TABLE_CONCURRENCY):
+        """
+        Generate recommendations for labels, at most `concurrency` at a time.
+        Each result is served as soon as it arrives; call save() to persist.
+
+        Returns:
+            {label: error message} for the labels that failed
+        """
+        semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+        failures = {}
+
+        async def one(label):
+            async with semaphore:
+                try:
+                    result = await OTC_RECOMMENDATIONS.aget(label, api_key, self.model)
+                except Exception as exc:
+                    failures[label] = f"{type(exc).__name__}: {exc}"
+                    return
+            with self._lock:
+                self._entries[normalize_disease(label)] = {
+                    "label": label, "recommendation": result["recommendation"], "generated_at": time.time(),
+                }
+
+        await asyncio.gather(*(one(label) for label in labels))
+        with self._lock:
+            self.generated += len(labels) - len(failures)
+            self.failed += len(failures)
+        return failures
+
+    async def refresh(self, api_key):
+        """Reload a changed artifact, then generate and save any missing or expired labels."""
+        self.reload_if_changed()
+        labels = self.stale_labels(current_labels())
+        self.refreshes += 1
+        if not labels or not api_key:
+            return {}
+        print(f"[otc_table] generating {len(labels)} recommendation(s)")
+        failures = await self.warm(labels, api_key)
+        if len(failures) < len(labels):
+            self.save()
+        for label, error in failures.items():
+            print(f"[otc_table] {label}: {error}")
+        return failures
+
+    # ── background refresh ──
+
+    def _claim_refresh(self):
+        """True if this process owns the background refresh (holds <artifact>.lock)."""
+        if self._refresh_lock is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path.with_name(self.path.name + ".lock"), "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._refresh_lock = f
+        print(f"[otc_table] this process (pid {os.getpid()}) refreshes {self.path}")
+        return True
+
+    def _release_refresh(self):
+        if self._refresh_lock is not None:
+            self._refresh_lock.close()  # closing the file releases the lock
+            self._refresh_lock = None
+
+    def start(self, api_key_fn, interval=OTC_TABLE_REFRESH_INTERVAL):
+        """
+        Every interval seconds on the running event loop (the first time now):
+        refresh if this process owns the refresh lock, otherwise reload the
+        artifact if the owner saved a new one.
+        """
+        if self._task is not None or interval <= 0:
+            return
+        self._task = asyncio.create_task(self._refresh_forever(api_key_fn, interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._release_refresh()
+
+    async def _refresh_forever(self, api_key_fn, interval):
+        while True:
+            try:
+                if self._claim_refresh():
+                    await self.refresh(api_key_fn())
+                else:
+                    self.reload_if_changed()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # keep refreshing; the table still serves what it has
+                print(f"[otc_table] refresh failed: {exc}")
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": str(self.path),
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "refresh_owner": self._refresh_lock is not None,
+                "refreshes": self.refreshes,
+                "generated": self.generated,
+                "failed": self.failed,
+            }
+
+
+# ── CLI entrypoint ────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from dotenv import load_dotenv
+
+    load_dotenv(_dir / ".env")
+
+    parser = argparse.ArgumentParser(description="Build / inspect the precomputed OTC recommendation table")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Generate recommendations for every disease label")
+    p_build.add_argument("--out", default=str(OTC_TABLE_PATH))
+    p_build.add_argument("--concurrency", type=int, default=OTC_TABLE_CONCURRENCY)
+    p_build.add_argument("--force", action="store_true", help="regenerate every label, not just missing/expired ones")
+
+    p_status = sub.add_parser("status", help="Show coverage of an existing artifact")
+    p_status.add_argument("--path", default=str(OTC_TABLE_PATH))
+
+    args = parser.parse_args()
+    table = OTCTable(args.out if args.command == "build" else args.path)
+    table.load()
+    labels = current_labels()
+
+    if args.command == "build":
+        api_key = os.getenv("FEATHERLESS_API_KEY")
+        if not api_key:
+            print("ERROR: Set FEATHERLESS_API_KEY in your .env file or environment.")
+            sys.exit(1)
+        todo = labels if args.force else table.stale_labels(labels)
+        print(f"{len(labels)} labels, {len(todo)} to generate (concurrency {args.concurrency})")
+        t0 = time.perf_counter()
+        failures = asyncio.run(table.warm(todo, api_key, args.concurrency)) if todo else {}
+        for label, error in failures.items():
+            print(f"  FAILED {label}: {error}")
+        if len(failures) < len(todo) or not table.path.exists():
+            print(f"Saved version {table.save()} to: {table.path}")
+        print(f"{len(todo) - len(failures)} generated, {len(failures)} failed in {time.perf_counter() - t0:.1f}s")
+        sys.exit(1 if failures else 0)
+    else:
+        missing = table.stale_labels(labels, max_age=0)
+        expired = [label for label in table.stale_labels(labels) if label not in missing]
+        print(f"Artifact: {table.path} (version {table.version})")
+        print(f"Labels:   {len(labels)} in the classifier, {len(labels) - len(missing)} in the table")
+        print(f"Expired:  {len(expired)} older than {OTC_TABLE_MAX_AGE:.0f}s")
+        for label in missing:
+            print(f"  missing: {label}")
@@ -0,0 +1,288 @@
+"""
+pdf_workers.py — Process pool for bloodwork PDF extraction
+-----------------------------------------------------------
+pdfplumber is pure-Python and CPU-bound, so parsing a large report inside an
+async handler stalls the whole event loop. Async endpoints instead await
+PdfWorkerPool.extract(), which runs extract_bloodwork() in a worker process:
+
+  - pool size is configurable; workers are spawned lazily on first use
+  - every job has a timeout, enforced inside the worker (SIGALRM) with a
+    parent-side backstop. Both count from the moment a worker starts the job
+    (workers report it on a queue), so time spent waiting behind other jobs
+    never turns into a 504; the pool is recycled only when a job that was
+    actually running overran
+  - backpressure: once PDF_QUEUE_MAX jobs are running or waiting, new jobs
+    fail fast with PoolBusy (the API answers 503 + Retry-After)
+
+extract() takes PDF bytes or an upload's spooled file. A spooled file is not
+read into the API process: thread mode parses it in place, and worker
+processes open it through /proc/<pid>/fd (the anonymous temp file
+Starlette's spool rolls over to), so no named temp file is written and API
+memory stays bounded per upload. Where /proc is unavailable the file is read
+and sent as bytes (already capped by upload_stream).
+
+Config (.env):
+    PDF_WORKERS         worker processes, default min(4, cpu count); 0 runs
+                        extraction in a thread instead (still off the loop)
+    PDF_JOB_TIMEOUT     seconds per PDF, default 60
+    PDF_QUEUE_MAX       running + waiting jobs before 503, default 4 x workers
+    PDF_RETRY_AFTER     Retry-After seconds sent with 503, default 5
+"""
+
+import asyncio
+import io
+import multiprocessing as mp
+import os
+import itertools
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from starlette.concurrency import run_in_threadpool
+
+from extract_bloodwork import extract_bloodwork
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS") or min(4, os.cpu_count() or 1))
+PDF_JOB_TIMEOUT = float(os.getenv("PDF_JOB_TIMEOUT") or 60)
+PDF_QUEUE_MAX = int(os.getenv("PDF_QUEUE_MAX") or 4 * max(1, PDF_WORKERS))
+PDF_RETRY_AFTER = int(os.getenv("PDF_RETRY_AFTER") or 5)
+
+# Extra time the parent waits beyond the in-worker alarm before giving up on a job
+_TIMEOUT_GRACE = 5.0
+# How often the parent checks whether a queued job has started yet
+_START_POLL = 0.5
+
+
+class PoolBusy(RuntimeError):
+    """Too many PDF jobs are running or queued; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__("PDF extraction queue is full")
+        self.retry_after = retry_after
+
+
+class PdfJobTimeout(RuntimeError):
+    # Not a TimeoutError subclass: asyncio.TimeoutError is TimeoutError on 3.11+, and a
+    # timeout raised inside the worker must not be mistaken for the parent-side backstop
+    pass
+
+
+_timed_out = False
+_started_queue = None  # in a worker: where it reports the id of each job it starts
+
+
+def _init_worker(started_queue):
+    global _started_queue
+    _started_queue = started_queue
+
+
+def _alarm(signum, frame):
+    global _timed_out
+    _timed_out = True
+    raise PdfJobTimeout("PDF extraction timed out")
+
+
+def _shareable(fileobj):
+    """
+    Something a worker process can parse: a /proc path to the file's descriptor,
+    or (no /proc, or no descriptor) the file's bytes.
+    """
+    try:
+        fd = fileobj.fileno()  # a SpooledTemporaryFile rolls over to its anonymous temp file here
+        fileobj.flush()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fd = None
+    if fd is not None:
+        path = f"/proc/{os.getpid()}/fd/{fd}"
+        if os.path.exists(path):
+            return path
+    fileobj.seek(0)
+    return fileobj.read()
+
+
+def _extract_job(job_id, data, filename, timeout, kwargs):
+    """
+    Runs inside a worker process (in its main thread, so SIGALRM can interrupt the parse).
+    data: PDF bytes, or a path to open.
+    """
+    global _timed_out
+    if _started_queue is not None:
+        _started_queue.put(job_id)
+    use_alarm = timeout and hasattr(signal, "setitimer")
+    _timed_out = False
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        source = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+        return extract_bloodwork(source, filename=filename, **kwargs)
+    except Exception:
+        # pdfplumber re-wraps errors raised mid-parse (PdfminerException)
+        if _timed_out:
+            raise PdfJobTimeout("PDF extraction timed out") from None
+        raise
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class PdfWorkerPool:
+    """
+    n_workers:  worker processes (0 = run in the default thread pool)
+    timeout:    seconds allowed per job
+    max_queue:  running + waiting jobs accepted before PoolBusy
+    """
+
+    def __init__(self, n_workers=PDF_WORKERS, timeout=PDF_JOB_TIMEOUT, max_queue=PDF_QUEUE_MAX,
+                 retry_after=PDF_RETRY_AFTER):
+        self.n_workers = max(0, int(n_workers))
+        self.timeout = float(timeout)
+        self.max_queue = max(1, int(max_queue))
+        self.retry_after = int(retry_after)
+        self._executor = None
+        self._started_queue = None
+        self._started_at = {}  # job id -> time.monotonic() the worker started it, None while queued
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._jobs = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._crashes = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: the API process holds threads (scheduler, firebase) that must not be forked
+                ctx = mp.get_context("spawn")
+                self._started_queue = ctx.SimpleQueue()
+                self._executor = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=ctx,
+                                                     initializer=_init_worker,
+                                                     initargs=(self._started_queue,))
+                threading.Thread(target=self._watch_starts, args=(self._started_queue,),
+                                 name="pdf-job-starts", daemon=True).start()
+            return self._executor
+
+    def _watch_starts(self, started_queue):
+        """Record when workers start jobs; runs until a None is put on the queue."""
+        while True:
+            job_id = started_queue.get()
+            if job_id is None:
+                return
+            now = time.monotonic()
+            with self._lock:
+                if job_id in self._started_at:
+                    self._started_at[job_id] = now
+
+    def _stop_watching(self, started_queue):
+        if started_queue is not None:
+            started_queue.put(None)
+
+    def _reset_executor(self, executor):
+        """Drop a broken or wedged executor; the next job spawns a fresh one."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            started_queue, self._started_queue = self._started_queue, None
+        self._stop_watching(started_queue)
+        for proc in list((getattr(executor, "_processes", None) or {}).values()):
+            proc.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def extract(self, data, filename=None, **kwargs):
+        """
+        Run extract_bloodwork() off the event loop.
+        data: PDF bytes, or a seekable binary file such as UploadFile.file.
+        """
+        in_memory = isinstance(data, (bytes, bytearray))
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                raise PoolBusy(self.retry_after)
+            self._pending += 1
+            self._jobs += 1
+        try:
+            if self.n_workers == 0:
+                if not in_memory:
+                    data.seek(0)
+                return await asyncio.wait_for(
+                    run_in_threadpool(extract_bloodwork, io.BytesIO(data) if in_memory else data,
+                                      filename=filename, **kwargs),
+                    self.timeout,
+                )
+            executor = self._get_executor()
+            payload = data if in_memory else _shareable(data)
+            job_id = next(self._job_ids)
+            with self._lock:
+                self._started_at[job_id] = None
+            try:
+                future = executor.submit(_extract_job, job_id, payload, filename, self.timeout, kwargs)
+                return await self._wait_job(job_id, future)
+            except asyncio.TimeoutError:
+                # The in-worker alarm did not fire (e.g. stuck in C code): recycle the pool
+                print(f"[pdf_workers] job exceeded {self.timeout:g}s; restarting pool")
+                self._reset_executor(executor)
+                raise PdfJobTimeout("PDF extraction timed out") from None
+            except BrokenProcessPool:
+                with self._lock:
+                    self._crashes += 1
+                print("[pdf_workers] worker process died; restarting pool")
+                self._reset_executor(executor)
+                raise
+            finally:
+                with self._lock:
+                    del self._started_at[job_id]
+        except (PdfJobTimeout, asyncio.TimeoutError):
+            with self._lock:
+                self._timeouts += 1
+            raise PdfJobTimeout(f"PDF extraction exceeded {self.timeout:g}s") from None
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def _wait_job(self, job_id, future):
+        """
+        Result of a submitted job. Raises asyncio.TimeoutError only once the job has
+        been running for timeout + grace; time spent queued does not count.
+        """
+        waiter = asyncio.wrap_future(future)
+        try:
+            while True:
+                with self._lock:
+                    started_at = self._started_at[job_id]
+                if started_at is None:
+                    wait = _START_POLL
+                else:
+                    wait = started_at + self.timeout + _TIMEOUT_GRACE - time.monotonic()
+                    if wait <= 0:
+                        raise asyncio.TimeoutError
+                done, _ = await asyncio.wait({waiter}, timeout=min(wait, _START_POLL))
+                if done:
+                    return waiter.result()
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "workers": self.n_workers,
+                "started": self._executor is not None,
+                "pending": self._pending,
+                "max_queue": self.max_queue,
+                "jobs": self._jobs,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "crashes": self._crashes,
+            }
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            started_queue, self._started_queue = self._started_queue, None
+        self._stop_watching(started_queue)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,199 @@
+"""
+prediction_batcher.py — Dynamic micro-batching for single-row model calls
+--------------------------------------------------------------------------
+FastAPI runs sync handlers on a threadpool, so concurrent /predict-disease
+requests each end up calling the model with one row. MicroBatcher puts a
+queue in front of a batch function: a background thread takes the first
+waiting request, keeps collecting for up to `window_ms` or `max_rows`
+(whichever comes first), runs the whole group as one batch and hands each
+caller its own result.
+
+metrics() reports queue depth, batch sizes and queue wait percentiles so the
+window can be tuned against p99 latency.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+def _bucket(n: int) -> str:
+    """Power-of-two histogram bucket label for a batch size (1, 2, 3-4, 5-8, ...)."""
+    if n <= 2:
+        return str(n)
+    upper = 1 << (n - 1).bit_length()
+    return f"{upper // 2 + 1}-{upper}"
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item calls into batched calls.
+
+    batch_fn:  callable(list[item]) -> sequence of results, same length and order
+    window_ms: how long to keep collecting after the first item arrives
+    max_rows:  flush immediately once this many items are waiting
+    """
+
+    def __init__(self, batch_fn, window_ms: float = 2.0, max_rows: int = 64, name: str = "microbatcher"):
+        self._batch_fn = batch_fn
+        self.window_ms = max(0.0, float(window_ms))
+        self.max_rows = max(1, int(max_rows))
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Metrics
+        self._submitted = 0
+        self._batches = 0
+        self._rows = 0
+        self._errors = 0
+        self._max_batch_size = 0
+        self._last_batch_size = 0
+        self._max_queue_depth = 0
+        self._histogram: dict[str, int] = {}
+        self._waits_ms: deque = deque(maxlen=2048)
+        self._batch_ms: deque = deque(maxlen=2048)
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def submit(self, item) -> Future:
+        """Queue one item; the returned Future resolves to its result."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        fut: Future = Future()
+        self._queue.put((item, fut, time.perf_counter()))
+        depth = self._queue.qsize()
+        with self._lock:
+            self._submitted += 1
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+        return fut
+
+    def __call__(self, item, timeout: float | None = None):
+        """Submit one item and block until its result is ready."""
+        return self.submit(item).result(timeout)
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        """Flush whatever is queued, then stop the worker thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            batch_ms = sorted(self._batch_ms)
+            return {
+                "window_ms": self.window_ms,
+                "max_rows": self.max_rows,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "submitted": self._submitted,
+                "batches": self._batches,
+                "rows": self._rows,
+                "errors": self._errors,
+                "mean_batch_size": round(self._rows / self._batches, 3) if self._batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "max_batch_size": self._max_batch_size,
+                "batch_size_histogram": dict(self._histogram),
+                "queue_wait_ms": {
+                    "p50": round(_percentile(waits, 50), 3),
+                    "p99": round(_percentile(waits, 99), 3),
+                },
+                "batch_run_ms": {
+                    "p50": round(_percentile(batch_ms, 50), 3),
+                    "p99": round(_percentile(batch_ms, 99), 3),
+                },
+            }
+
+    # ── Worker ────────────────────────────────────────────────────────────────
+
+    def _collect(self) -> tuple[list, bool]:
+        """Block for the first entry, then gather more until the window or row cap is hit."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.window_ms / 1000
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._dispatch(batch)
+            if stop:
+                # Drain anything submitted before close() so no caller hangs
+                leftovers = []
+                while True:
+                    try:
+                        entry = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if entry is not _STOP:
+                        leftovers.append(entry)
+                for i in range(0, len(leftovers), self.max_rows):
+                    self._dispatch(leftovers[i:i + self.max_rows])
+                return
+
+    def _dispatch(self, batch: list) -> None:
+        started = time.perf_counter()
+        live = [(item, fut, queued_at) for item, fut, queued_at in batch if fut.set_running_or_notify_cancel()]
+        if not live:
+            return
+
+        items = [item for item, _, _ in live]
+        errors = 0
+        try:
+            results = self._batch_fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"batch_fn returned {len(results)} results for {len(items)} items")
+        except Exception:
+            # One bad row should not fail its neighbours: retry each item on its own
+            for item, fut, _ in live:
+                try:
+                    fut.set_result(self._batch_fn([item])[0])
+                except Exception as exc:
+                    errors += 1
+                    fut.set_exception(exc)
+        else:
+            for (_, fut, _), result in zip(live, results):
+                fut.set_result(result)
+
+        finished = time.perf_counter()
+        size = len(live)
+        with self._lock:
+            self._batches += 1
+            self._rows += size
+            self._errors += errors
+            self._last_batch_size = size
+            self._max_batch_size = max(self._max_batch_size, size)
+            key = _bucket(size)
+            self._histogram[key] = self._histogram.get(key, 0) + 1
+            self._waits_ms.extend((started - queued_at) * 1000 for _, _, queued_at in live)
+            self._batch_ms.append((finished - started) * 1000)
@@ -0,0 +1,338 @@
+"""
+predictor_pool.py — Out-of-process workers for the symptom classifier
+----------------------------------------------------------------------
+Runs the disease model in a pool of worker processes so inference does not
+compete with request handling for the API process's GIL.
+
+  - each worker loads the model once at startup
+  - every worker owns a pair of shared-memory buffers (input rows, output
+    probabilities); only a tiny ("predict", n_rows) message crosses the pipe,
+    never pickled symptom dicts or arrays
+  - a worker that dies is restarted and the request is retried once; if the
+    restart fails, the worker is taken out of rotation (the pool reports
+    itself degraded) and restarted in the background with backoff
+  - large matrices are split across idle workers in parallel
+
+Enable from sicknessPredictor with PREDICT_WORKERS=<n>.
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+_dir = Path(__file__).resolve().parent
+
+READY_TIMEOUT = 120.0  # seconds a fresh worker gets to load the model
+REVIVE_MAX_DELAY = 60.0  # cap on the backoff between background restart attempts
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _load_predict_fn(engine, artifact_path):
+    """Return a callable(x) -> probabilities for the given engine, loaded inside the worker."""
+    if engine == "keras":
+        import pickle
+        from tensorflow.keras.models import load_model
+
+        model = load_model(str(_dir / "my_model.h5"))
+        with open(_dir / "scaler.pkl", "rb") as f:
+            scaler = pickle.load(f)
+        return lambda x: model.predict(scaler.transform(x), batch_size=len(x), verbose=0)
+
+    from numpy_predictor import NumpyClassifier
+
+    if engine == "int8":
+        from quantize_model import check_gate
+
+        check_gate(artifact_path)
+    clf = NumpyClassifier.load(artifact_path)
+    return clf.predict_proba
+
+
+def _worker_main(engine, artifact_path, in_name, out_name, max_rows, n_features, n_classes, conn):
+    try:
+        predict = _load_predict_fn(engine, artifact_path)
+        shm_in = shared_memory.SharedMemory(name=in_name)
+        shm_out = shared_memory.SharedMemory(name=out_name)
+    except Exception as exc:
+        conn.send(("error", f"{type(exc).__name__}: {exc}"))
+        return
+    x_buf = np.ndarray((max_rows, n_features), dtype=np.float32, buffer=shm_in.buf)
+    y_buf = np.ndarray((max_rows, n_classes), dtype=np.float32, buffer=shm_out.buf)
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg[0] == "stop":
+            break
+        n = msg[1]
+        try:
+            y_buf[:n] = predict(x_buf[:n])
+            conn.send(("ok", n))
+        except Exception as exc:
+            conn.send(("error", f"{type(exc).__name__}: {exc}"))
+
+    del x_buf, y_buf
+    shm_in.close()
+    shm_out.close()
+
+
+class _Worker:
+    """One worker process plus the shared-memory buffers it reads from and writes to."""
+
+    def __init__(self, ctx, index, engine, artifact_path, max_rows, n_features, n_classes):
+        self.ctx = ctx
+        self.index = index
+        self.engine = engine
+        self.artifact_path = str(artifact_path)
+        self.max_rows = max_rows
+        self.n_features = n_features
+        self.n_classes = n_classes
+        self.shm_in = shared_memory.SharedMemory(create=True, size=max_rows * n_features * 4)
+        self.shm_out = shared_memory.SharedMemory(create=True, size=max_rows * n_classes * 4)
+        self.x_buf = np.ndarray((max_rows, n_features), dtype=np.float32, buffer=self.shm_in.buf)
+        self.y_buf = np.ndarray((max_rows, n_classes), dtype=np.float32, buffer=self.shm_out.buf)
+        self.proc = None
+        self.conn = None
+        self.restarts = 0
+        self.start()
+
+    def start(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.proc = self.ctx.Process(
+            target=_worker_main,
+            args=(self.engine, self.artifact_path, self.shm_in.name, self.shm_out.name,
+                  self.max_rows, self.n_features, self.n_classes, child_conn),
+            name=f"predictor-worker-{self.index}",
+            daemon=True,
+        )
+        self.proc.start()
+        child_conn.close()
+        self.conn = parent_conn
+        status, detail = self._recv(READY_TIMEOUT)
+        if status != "ready":
+            self.stop()
+            raise RuntimeError(f"predictor worker {self.index} failed to start: {detail}")
+
+    def stop(self):
+        if self.proc is None:
+            return
+        try:
+            if self.proc.is_alive():
+                self.conn.send(("stop",))
+                self.proc.join(2)
+        except (BrokenPipeError, OSError):
+            pass
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join(2)
+        self.conn.close()
+        self.proc = None
+
+    def restart(self):
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def _recv(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.conn.poll(0.05):
+            if not self.proc.is_alive():
+                raise WorkerCrashed(f"predictor worker {self.index} exited with code {self.proc.exitcode}")
+            if time.monotonic() > deadline:
+                raise WorkerCrashed(f"predictor worker {self.index} timed out")
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            raise WorkerCrashed(f"predictor worker {self.index} closed its pipe") from None
+
+    def run(self, x, timeout):
+        n = len(x)
+        self.x_buf[:n] = x
+        try:
+            self.conn.send(("predict", n))
+        except (BrokenPipeError, OSError):
+            raise WorkerCrashed(f"predictor worker {self.index} is not accepting work") from None
+        status, detail = self._recv(timeout)
+        if status != "ok":
+            raise RuntimeError(f"predictor worker {self.index}: {detail}")
+        return self.y_buf[:n].copy()
+
+    def close(self):
+        self.stop()
+        del self.x_buf, self.y_buf
+        for shm in (self.shm_in, self.shm_out):
+            shm.close()
+            shm.unlink()
+
+
+class PredictorPool:
+    """
+    Pool of model worker processes fed through shared memory.
+
+    n_workers:  number of processes (each loads the model once)
+    max_rows:   rows per worker buffer; larger matrices are split into chunks
+    timeout:    seconds to wait for one chunk before treating the worker as hung
+    """
+
+    def __init__(self, n_workers, engine, artifact_path, n_features, n_classes,
+                 max_rows=256, timeout=30.0):
+        self.n_workers = max(1, int(n_workers))
+        self.max_rows = max(1, int(max_rows))
+        self.timeout = float(timeout)
+        self._ctx = mp.get_context("spawn")  # never fork a process that may hold TF/threads
+        self._idle: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._requests = 0
+        self._rows = 0
+        self._crashes = 0
+        self._dead = set()  # workers whose restart failed; revived by _revive_loop
+        self._reviver = None
+        self._workers = [
+            _Worker(self._ctx, i, engine, artifact_path, self.max_rows, n_features, n_classes)
+            for i in range(self.n_workers)
+        ]
+        for w in self._workers:
+            self._idle.put(w)
+        self._fanout = ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix="predictor-pool")
+
+    def _take(self):
+        """Next idle worker; raises instead of waiting forever when every worker is down."""
+        while True:
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                with self._lock:
+                    if len(self._dead) >= self.n_workers:
+                        raise WorkerCrashed("every predictor worker is down; restarting in the background")
+
+    def _mark_dead(self, worker, exc):
+        """Keep a worker that could not be restarted out of the idle queue until it is revived."""
+        print(f"[predictor_pool] restart of worker {worker.index} failed: {exc}; retrying in the background")
+        with self._lock:
+            self._dead.add(worker)
+            if self._reviver is None or not self._reviver.is_alive():
+                self._reviver = threading.Thread(target=self._revive_loop, name="predictor-pool-revive", daemon=True)
+                self._reviver.start()
+
+    def _revive_loop(self):
+        delay = 1.0
+        while not self._closed:
+            time.sleep(delay)
+            with self._lock:
+                dead = list(self._dead)
+            if not dead:
+                return
+            for worker in dead:
+                if self._closed:
+                    return
+                try:
+                    worker.restart()
+                except Exception as exc:
+                    print(f"[predictor_pool] worker {worker.index} still failing to start: {exc}")
+                    continue
+                with self._lock:
+                    self._dead.discard(worker)
+                self._idle.put(worker)
+                print(f"[predictor_pool] worker {worker.index} is back")
+            delay = min(delay * 2, REVIVE_MAX_DELAY)
+
+    def _restart_or_retire(self, worker):
+        """Restart a worker; False (and out of rotation) if that fails."""
+        try:
+            worker.restart()
+            return True
+        except Exception as exc:
+            self._mark_dead(worker, exc)
+            return False
+
+    def _run_chunk(self, x):
+        worker = self._take()
+        healthy = True
+        try:
+            try:
+                return worker.run(x, self.timeout)
+            except WorkerCrashed as exc:
+                # Replace the dead worker and retry this chunk once
+                print(f"[predictor_pool] {exc}; restarting")
+                with self._lock:
+                    self._crashes += 1
+                healthy = self._restart_or_retire(worker)
+                if healthy:
+                    return worker.run(x, self.timeout)
+        finally:
+            if healthy:
+                self._idle.put(worker)
+        # This worker is out of rotation: retry on another (raises once none are left)
+        return self._run_chunk(x)
+
+    def predict_proba(self, x):
+        """x: (n, n_features) float32 matrix -> (n, n_classes) probabilities."""
+        if self._closed:
+            raise RuntimeError("PredictorPool is closed")
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        with self._lock:
+            self._requests += 1
+            self._rows += len(x)
+        chunks = [x[i:i + self.max_rows] for i in range(0, len(x), self.max_rows)]
+        if len(chunks) == 1:
+            return self._run_chunk(chunks[0])
+        return np.vstack(list(self._fanout.map(self._run_chunk, chunks)))
+
+    def restart(self):
+        """
+        Restart every worker, e.g. after the model artifact changed on disk.
+        Workers already out of rotation pick up the new artifact when revived.
+        """
+        taken = []
+        while True:
+            with self._lock:
+                if len(taken) >= self.n_workers - len(self._dead):
+                    break
+            try:
+                taken.append(self._idle.get(timeout=1.0))
+            except queue.Empty:
+                continue
+        try:
+            for w in taken:
+                self._restart_or_retire(w)
+        finally:
+            for w in taken:
+                if w not in self._dead:
+                    self._idle.put(w)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "workers": self.n_workers,
+                "idle_workers": self._idle.qsize(),
+                "max_rows_per_worker": self.max_rows,
+                "requests": self._requests,
+                "rows": self._rows,
+                "crashes": self._crashes,
+                "dead_workers": len(self._dead),
+                "degraded": bool(self._dead),
+                "restarts": sum(w.restarts for w in self._workers),
+                "pids": [w.proc.pid if w.proc else None for w in self._workers],
+            }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._fanout.shutdown(wait=True)
+        for w in self._workers:
+            w.close()
@@ -0,0 +1,231 @@
+"""
+quantize_model.py — Int8 weight-only variant of the symptom classifier
+-----------------------------------------------------------------------
+Builds symptom_model_int8.npz from the float artifact (symptom_model.npz,
+see numpy_predictor.py). Each Dense kernel is stored as int8 with one
+float32 scale per output unit (symmetric, per-channel); biases stay float32.
+Serve it with SICKNESS_ENGINE=int8.
+
+Before publishing, the quantized model is compared against the float model
+on a held-out symptom set. If top-1 agreement drops below --min-agreement
+the artifact is NOT written and the command exits non-zero. A published
+artifact records the gate it passed (eval set, samples, agreement,
+threshold); SICKNESS_ENGINE=int8 refuses an artifact without that record.
+
+Held-out set (--eval-set, required for build):
+  - .csv   header row of symptom names (training column names), 0/1 rows;
+           extra columns such as "prognosis" are ignored, so the dataset's
+           test (or training) split can be passed as is
+  - .jsonl one JSON list of active symptom names per line
+
+`evaluate` may omit --eval-set to get a quick comparison on a reproducible
+synthetic set (every single symptom plus random sparse combinations). Random
+symptom vectors say little about real inputs, so they never gate a build.
+
+Usage:
+    python quantize_model.py build    --eval-set held_out.csv [--min-agreement 0.99]
+    python quantize_model.py evaluate [--eval-set held_out.csv]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from numpy_predictor import DEFAULT_ARTIFACT_PATH, NumpyClassifier, sample_symptom_inputs
+
+_dir = Path(__file__).resolve().parent
+
+DEFAULT_INT8_ARTIFACT_PATH = _dir / "symptom_model_int8.npz"
+DEFAULT_MIN_AGREEMENT = 0.99
+
+
+def quantize_kernel(kernel):
+    """Symmetric per-output-channel int8 quantization: kernel ≈ q * scale."""
+    kernel = np.asarray(kernel, dtype=np.float32)
+    max_abs = np.abs(kernel).max(axis=0)
+    scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    q = np.clip(np.round(kernel / scale), -127, 127).astype(np.int8)
+    return q, scale
+
+
+def quantize_artifact(float_path, out_path):
+    """Write an int8 weight-only copy of a float .npz artifact."""
+    with np.load(float_path, allow_pickle=False) as data:
+        arrays = {k: data[k] for k in data.files}
+    n_layers = int(arrays["n_layers"])
+    for i in range(n_layers):
+        q, scale = quantize_kernel(arrays[f"kernel_{i}"])
+        arrays[f"kernel_{i}"] = q
+        arrays[f"kernel_scale_{i}"] = scale
+    # np.savez appends .npz unless the name already ends with it
+    np.savez_compressed(out_path, **arrays)
+    return Path(out_path)
+
+
+def _stamp_gate(path, report, source, min_agreement):
+    """Record the accuracy gate an artifact passed inside the artifact itself."""
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {k: data[k] for k in data.files}
+    arrays.update(
+        gate_eval_set=np.array(Path(source).name),
+        gate_samples=np.array(report["samples"]),
+        gate_top1_agreement=np.array(report["top1_agreement"]),
+        gate_min_agreement=np.array(min_agreement),
+    )
+    np.savez_compressed(path, **arrays)
+
+
+def check_gate(path):
+    """
+    The gate record of an int8 artifact; raises ValueError if it has none (built
+    without a held-out eval set) or it did not meet its threshold.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if "gate_top1_agreement" not in data.files:
+            raise ValueError(f"{path} has no held-out accuracy gate record; rebuild it with "
+                             "`python quantize_model.py build --eval-set <held-out.csv>`")
+        gate = {
+            "eval_set": str(data["gate_eval_set"]),
+            "samples": int(data["gate_samples"]),
+            "top1_agreement": float(data["gate_top1_agreement"]),
+            "min_agreement": float(data["gate_min_agreement"]),
+        }
+    if gate["top1_agreement"] < gate["min_agreement"]:
+        raise ValueError(f"{path} failed its accuracy gate ({gate['top1_agreement']:.4f} < "
+                         f"{gate['min_agreement']:.4f})")
+    return gate
+
+
+def load_eval_set(path, feature_names):
+    """Load a held-out symptom set as a (n, n_features) float32 matrix."""
+    index = {name: i for i, name in enumerate(feature_names)}
+    path = Path(path)
+    rows = []
+    if path.suffix == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                row = np.zeros(len(index), dtype=np.float32)
+                for name in json.loads(line):
+                    if name not in index:
+                        raise ValueError(f"{path}:{line_no}: unknown symptom {name!r}")
+                    row[index[name]] = 1
+                rows.append(row)
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = [h.strip() for h in next(reader)]
+            cols = [(j, index[h]) for j, h in enumerate(header) if h in index]
+            if len(cols) != len(index):
+                missing = sorted(set(index) - set(header))
+                raise ValueError(f"{path}: missing symptom columns: {', '.join(missing[:10])}")
+            for record in reader:
+                if not record:
+                    continue
+                row = np.zeros(len(index), dtype=np.float32)
+                for j, i in cols:
+                    row[i] = float(record[j] or 0)
+                rows.append(row)
+    if not rows:
+        raise ValueError(f"{path}: no rows")
+    return np.vstack(rows)
+
+
+def evaluate(float_clf, quant_clf, x):
+    """Compare quantized against float predictions on x."""
+    p_float = float_clf.predict_proba(x)
+    p_quant = quant_clf.predict_proba(x)
+    agree = p_float.argmax(axis=1) == p_quant.argmax(axis=1)
+    return {
+        "samples": int(len(x)),
+        "top1_agreement": float(agree.mean()),
+        "disagreements": int((~agree).sum()),
+        "max_abs_prob_diff": float(np.abs(p_float - p_quant).max()),
+        "float_weight_bytes": float_clf.nbytes(),
+        "int8_weight_bytes": quant_clf.nbytes(),
+    }
+
+
+def _eval_matrix(eval_set, float_clf):
+    features = float_clf.feature_names
+    if eval_set:
+        if features is None:
+            raise ValueError("float artifact has no feature names; re-run `numpy_predictor.py export`")
+        return load_eval_set(eval_set, features), str(eval_set)
+    return sample_symptom_inputs(float_clf.n_features, n_random=5000, seed=1), "synthetic (not a build gate)"
+
+
+def _print_report(report, source):
+    print(f"   eval set:          {source} ({report['samples']} samples)")
+    print(f"   top-1 agreement:   {report['top1_agreement']:.4f} ({report['disagreements']} disagreements)")
+    print(f"   max |Δprob|:       {report['max_abs_prob_diff']:.2e}")
+    print(f"   weights:           {report['float_weight_bytes']} B float32 → {report['int8_weight_bytes']} B int8")
+
+
+def build(float_path, out_path, eval_set, min_agreement=DEFAULT_MIN_AGREEMENT):
+    """Quantize, evaluate on eval_set, and publish out_path only if agreement >= min_agreement."""
+    if not eval_set:
+        raise ValueError("build needs a held-out symptom set (--eval-set); synthetic inputs cannot gate a publish")
+    float_clf = NumpyClassifier.load(float_path)
+    x, source = _eval_matrix(eval_set, float_clf)
+
+    out_path = Path(out_path)
+    fd, tmp_name = tempfile.mkstemp(suffix=".npz", dir=out_path.parent)
+    os.close(fd)
+    try:
+        quantize_artifact(float_path, tmp_name)
+        report = evaluate(float_clf, NumpyClassifier.load(tmp_name), x)
+        _print_report(report, source)
+        report["published"] = report["top1_agreement"] >= min_agreement
+        if report["published"]:
+            _stamp_gate(tmp_name, report, source, min_agreement)
+            os.chmod(tmp_name, 0o644)  # mkstemp creates 0600
+            os.replace(tmp_name, out_path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+    return report
+
+
+# ── CLI entrypoint ────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build / evaluate the int8 symptom classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Quantize and publish if the accuracy gate passes")
+    p_build.add_argument("--float-artifact", default=str(DEFAULT_ARTIFACT_PATH))
+    p_build.add_argument("--out", default=str(DEFAULT_INT8_ARTIFACT_PATH))
+    p_build.add_argument("--eval-set", required=True, help="held-out .csv/.jsonl (or the training split)")
+    p_build.add_argument("--min-agreement", type=float, default=DEFAULT_MIN_AGREEMENT)
+
+    p_eval = sub.add_parser("evaluate", help="Compare an existing int8 artifact against the float model")
+    p_eval.add_argument("--float-artifact", default=str(DEFAULT_ARTIFACT_PATH))
+    p_eval.add_argument("--artifact", default=str(DEFAULT_INT8_ARTIFACT_PATH))
+    p_eval.add_argument("--eval-set", default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        report = build(args.float_artifact, args.out, args.eval_set, args.min_agreement)
+        if not report["published"]:
+            print(f"Agreement below {args.min_agreement:.4f}; NOT publishing {args.out}")
+            sys.exit(1)
+        print(f"Saved to: {args.out}")
+    else:
+        float_clf = NumpyClassifier.load(args.float_artifact)
+        x, source = _eval_matrix(args.eval_set, float_clf)
+        try:
+            gate = check_gate(args.artifact)
+            print(f"   build gate:        {gate['top1_agreement']:.4f} >= {gate['min_agreement']:.4f} "
+                  f"on {gate['eval_set']} ({gate['samples']} samples)")
+        except ValueError as exc:
+            print(f"   build gate:        {exc}")
+        _print_report(evaluate(float_clf, NumpyClassifier.load(args.artifact), x), source)
@@ -0,0 +1,125 @@
+"""
+recommendation_cache.py — Reuse LLM bloodwork recommendations across uploads
+-----------------------------------------------------------------------------
+analyze_bloodwork() pays for a 30-90 s reasoning-model call, yet its input is
+mostly a discrete status per marker plus a small profile. Recommendations
+are cached under a canonical signature of that input:
+
+  mode "status" (default)
+      marker -> status (optimal / borderline / low / high), plus a bucketed
+      profile: age band (decade), sex, BMI class (from weight + height),
+      activity level, and normalized goal / diet terms
+      The LLM prompt for a cached answer is built from these same inputs
+      (bloodwork_advisor._build_user_prompt(shared=True)), so a shared answer
+      never quotes one patient's exact values or measurements to another
+  mode "exact"
+      marker -> exact value, plus the exact profile
+
+The model, max_tokens and a hash of the prompt templates are part of every
+key, so changing any of them never serves stale text.
+
+Config (.env):
+    RECOMMENDATION_CACHE        "0" disables caching (default on)
+    RECOMMENDATION_CACHE_MODE   "status" or "exact", default "status"
+    RECOMMENDATION_CACHE_TTL    seconds, default 86400 (1 day)
+    RECOMMENDATION_CACHE_SIZE   max entries, default 1024
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from lru_cache import LRUCache
+
+CACHE_ENABLED = (os.getenv("RECOMMENDATION_CACHE") or "1").strip().lower() not in ("0", "false", "no")
+CACHE_MODE = (os.getenv("RECOMMENDATION_CACHE_MODE") or "status").strip().lower()
+CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL") or 86400)
+CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE") or 1024)
+
+MODES = ("status", "exact")
+if CACHE_MODE not in MODES:
+    raise ValueError(f"RECOMMENDATION_CACHE_MODE must be one of {MODES}, got {CACHE_MODE!r}")
+
+
+def _terms(text):
+    """'Lose weight, lower cholesterol' -> ['lose weight', 'lower cholesterol'] (sorted, deduped)."""
+    if not text:
+        return []
+    parts = re.split(r"[,;/\n]|\band\b", str(text).lower())
+    return sorted({" ".join(p.split()) for p in parts if p.strip()})
+
+
+def _age_band(age):
+    if age is None:
+        return None
+    decade = int(age) // 10 * 10
+    return f"{decade}-{decade + 9}"
+
+
+def _bmi_class(weight_kg, height_cm):
+    if not weight_kg or not height_cm:
+        return None
+    bmi = float(weight_kg) / (float(height_cm) / 100) ** 2
+    if bmi < 18.5:
+        return "underweight"
+    if bmi < 25:
+        return "normal"
+    if bmi < 30:
+        return "overweight"
+    return "obese"
+
+
+def profile_bucket(user_profile):
+    """Coarse, canonical view of a user profile for status-mode keys."""
+    p = user_profile or {}
+    bucket = {
+        "age": _age_band(p.get("age")),
+        "sex": (str(p["sex"]).strip().lower() if p.get("sex") else None),
+        "bmi": _bmi_class(p.get("weight_kg"), p.get("height_cm")),
+        "activity": (str(p["activity_level"]).strip().lower() if p.get("activity_level") else None),
+        "goals": _terms(p.get("goals")),
+        "diet": _terms(p.get("dietary_restrictions")),
+    }
+    return {k: v for k, v in bucket.items() if v not in (None, [])}
+
+
+def signature(flagged, user_profile, mode=CACHE_MODE, **request):
+    """
+    Canonical cache key.
+
+    flagged: _flag_biomarkers() output
+    request: anything else that changes the answer (model, max_tokens, prompt version)
+    """
+    if mode == "exact":
+        markers = {m: [info["value"], info["status"]] for m, info in flagged.items()}
+        profile = {k: v for k, v in (user_profile or {}).items() if v is not None}
+    else:
+        markers = {m: info["status"] for m, info in flagged.items()}
+        profile = profile_bucket(user_profile)
+    payload = json.dumps({"mode": mode, "markers": markers, "profile": profile, **request},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+_cache = LRUCache(CACHE_SIZE, ttl=CACHE_TTL) if CACHE_ENABLED else None
+
+
+def get(key):
+    return _cache.get(key) if _cache is not None else None
+
+
+def put(key, recommendations):
+    if _cache is not None:
+        _cache.put(key, recommendations)
+
+
+def clear():
+    if _cache is not None:
+        _cache.clear()
+
+
+def cache_stats():
+    if _cache is None:
+        return None
+    return {"mode": CACHE_MODE, "ttl_s": CACHE_TTL, **_cache.stats()}
@@ -3,6 +3,7 @@ run_pipeline.py — Run the full bloodwork analysis pipeline
 -----------------------------------------------------------
 Usage:
     python run_pipeline.py <bloodwork.pdf> [options]
+    python run_pipeline.py <folder | manifest.txt | manifest.jsonl> [options]   (batch mode)
 
 Options:
     --api-key       Featherless.ai API key (or set FEATHERLESS_API_KEY env var)
@@ -16,6 +17,13 @@ Options:
     --activity      Activity level (sedentary/light/moderate/active/very_active)
     --goals         Health goals e.g. "lose weight, lower cholesterol"
     --diet          Dietary restrictions e.g. "vegetarian, no gluten"
+
+Batch options (see batch_pipeline.py):
+    --output-jsonl  Results file, one JSON line per PDF; re-runs resume from it
+                    (default: batch_results.jsonl)
+    --workers       Extraction processes (default: min(4, CPU count))
+    --concurrency   Concurrent LLM requests (default: 4)
+    --extract-only  Skip the LLM step
 """
 
 from dotenv import load_dotenv
@@ -26,14 +34,15 @@ import json
 import os
 import sys
 
-from extract_bloodwork import extract_bloodwork
+from bloodwork_cache import extract_bloodwork_cached
 from bloodwork_advisor import analyze_bloodwork
+from batch_pipeline import is_batch_input, run_batch
 
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Bloodwork PDF → Personalized Meal & Exercise Plan")
-    parser.add_argument("pdf", help="Path to bloodwork PDF")
+    parser.add_argument("pdf", help="Path to bloodwork PDF, or a folder / manifest for batch mode")
     parser.add_argument("--api-key",       default=os.getenv("FEATHERLESS_API_KEY"))
     parser.add_argument("--output-json",   default=None)
     parser.add_argument("--output-report", default=None)
@@ -46,19 +55,48 @@ def parse_args():
                         choices=["sedentary","light","moderate","active","very_active"])
     parser.add_argument("--goals",         default=None)
     parser.add_argument("--diet",          default=None)
+    parser.add_argument("--output-jsonl",  default="batch_results.jsonl")
+    parser.add_argument("--workers",       type=int,   default=None)
+    parser.add_argument("--concurrency",   type=int,   default=4)
+    parser.add_argument("--extract-only",  action="store_true")
     return parser.parse_args()
 
 
+def _user_profile(args):
+    return {k: v for k, v in {
+        "age":                 args.age,
+        "sex":                 args.sex,
+        "weight_kg":           args.weight_kg,
+        "height_cm":           args.height_cm,
+        "activity_level":      args.activity,
+        "goals":               args.goals,
+        "dietary_restrictions":args.diet,
+    }.items() if v is not None}
+
+
 def run():
     args = parse_args()
 
-    if not args.api_key:
+    if not args.api_key and not args.extract_only:
         print("ERROR: Featherless API key required. Pass --api-key or set FEATHERLESS_API_KEY.")
         sys.exit(1)
 
+    if is_batch_input(args.pdf):
+        run_batch(
+            args.pdf,
+            args.output_jsonl,
+            api_key=args.api_key,
+            model=args.model,
+            default_profile=_user_profile(args),
+            workers=args.workers,
+            concurrency=args.concurrency,
+            extract_only=args.extract_only,
+        )
+        return
+
     # Step 1: Extract biomarkers from PDF
     print(f"\n📄 Extracting bloodwork from: {args.pdf}")
-    bloodwork = extract_bloodwork(args.pdf, args.output_json)
+    bloodwork = extract_bloodwork_cached(args.pdf, args.output_json)
     print(f"   Found {len(bloodwork['biomarkers'])} biomarkers: {list(bloodwork['biomarkers'].keys())}")
 
     if not bloodwork["biomarkers"]:
@@ -66,15 +104,7 @@ def run():
         sys.exit(1)
 
     # Step 2: Build optional user profile
-    user_profile = {k: v for k, v in {
-        "age":                 args.age,
-        "sex":                 args.sex,
-        "weight_kg":           args.weight_kg,
-        "height_cm":           args.height_cm,
-        "activity_level":      args.activity,
-        "goals":               args.goals,
-        "dietary_restrictions":args.diet,
-    }.items() if v is not None}
+    user_profile = _user_profile(args)
 
     # Step 3: Send to Featherless / DeepSeek
     print(f"\n🤖 Sending to Featherless.ai ({args.model})…")
@@ -108,4 +138,6 @@ def run():
         print(f"\n💾 Report saved to: {args.output_report}")
 
 
-run()
\ No newline at end of file
+# Batch mode spawns worker processes, which re-import this module: only run as a script
+if __name__ == "__main__":
+    run()
@@ -1,32 +1,326 @@
+import atexit
+import os
+import threading
+import time
 import numpy as np
 import pickle
 from pathlib import Path
-from tensorflow.keras.models import load_model
+
+from lru_cache import LRUCache
+from symptom_features import SYMPTOM_FEATURES
 
 _dir = Path(__file__).resolve().parent
 
+# "numpy" (default) serves symptom_model.npz without TensorFlow; "int8" serves the
+# weight-quantized symptom_model_int8.npz; "keras" loads my_model.h5.
+# Rebuild the .npz files with `python numpy_predictor.py export` and
+# `python quantize_model.py build --eval-set <held-out.csv>` after retraining.
+ENGINE = (os.getenv("SICKNESS_ENGINE") or "numpy").strip().lower()
+_DEFAULT_ARTIFACTS = {"numpy": "symptom_model.npz", "int8": "symptom_model_int8.npz"}
+ARTIFACT_PATH = Path(os.getenv("SICKNESS_MODEL_ARTIFACT") or (_dir / _DEFAULT_ARTIFACTS.get(ENGINE, "symptom_model.npz")))
+
+# Largest slice handed to Keras in one go; bigger batches are still a single predict() call
+MAX_PREDICT_BATCH = 4096
+
+# Micro-batching of concurrent predict_disease calls (off unless PREDICT_MICROBATCH=1)
+MICROBATCH_ENABLED = (os.getenv("PREDICT_MICROBATCH") or "").strip().lower() in ("1", "true", "yes")
+MICROBATCH_WINDOW_MS = float(os.getenv("PREDICT_BATCH_WINDOW_MS") or 2.0)
+MICROBATCH_MAX_ROWS = int(os.getenv("PREDICT_BATCH_MAX_ROWS") or 64)
+
+# Serve inference from N worker processes (0 = run in the API process)
+PREDICT_WORKERS = int(os.getenv("PREDICT_WORKERS") or 0)
+PREDICT_WORKER_MAX_ROWS = int(os.getenv("PREDICT_WORKER_MAX_ROWS") or 256)
+
+# Memoized predictions keyed by the symptom bitmask (0 disables)
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE") or 4096)
+# How often (seconds) to stat the model files and reload if they changed
+MODEL_WATCH_INTERVAL = float(os.getenv("SICKNESS_MODEL_WATCH_INTERVAL") or 5.0)
+
+if ENGINE not in ("numpy", "int8", "keras"):
+    raise ValueError(f"Unknown SICKNESS_ENGINE {ENGINE!r} (expected 'numpy', 'int8' or 'keras')")
+
+
+def _artifact_paths():
+    if ENGINE == "keras":
+        return [_dir / "my_model.h5", _dir / "scaler.pkl", _dir / "label_encoder.pkl"]
+    return [ARTIFACT_PATH]
+
+
+def _artifact_fingerprint():
+    """(path, mtime, size) of every file the loaded model came from."""
+    out = []
+    for path in _artifact_paths():
+        try:
+            st = path.stat()
+            out.append((str(path), st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append((str(path), None, None))
+    return tuple(out)
+
+
+def _load_model():
+    """Load model and preprocessing objects for ENGINE into module globals."""
+    global model, scaler, le, labels, FEATURE_INDEX
+    if ENGINE == "keras":
+        from tensorflow.keras.models import load_model
+
+        new_model = load_model(str(_dir / "my_model.h5"))
+        new_scaler = pickle.load(open(_dir / "scaler.pkl", "rb"))
+        new_le = pickle.load(open(_dir / "label_encoder.pkl", "rb"))
+        new_labels = np.array([str(c) for c in new_le.classes_])
+        features = SYMPTOM_FEATURES
+    else:
+        from numpy_predictor import NumpyClassifier
+
+        if ENGINE == "int8":
+            from quantize_model import check_gate
+
+            check_gate(ARTIFACT_PATH)  # only artifacts that passed the held-out gate are served
+        # Scaler is folded into the first layer of the exported artifact (float or int8)
+        new_model = NumpyClassifier.load(ARTIFACT_PATH)
+        new_scaler = new_le = None
+        new_labels = np.array([str(c) for c in new_model.classes_])
+        features = new_model.feature_names or SYMPTOM_FEATURES
+
+    # Symptom name -> training column, built once per load
+    new_index = {name: i for i, name in enumerate(features)}
+    model, scaler, le, labels, FEATURE_INDEX = new_model, new_scaler, new_le, new_labels, new_index
+
+
 # Load model and preprocessing objects
-model = load_model(str(_dir / "my_model.h5"))
-scaler = pickle.load(open(_dir / "scaler.pkl", "rb"))
-le = pickle.load(open(_dir / "label_encoder.pkl", "rb"))
+_load_model()
+_loaded_fingerprint = _artifact_fingerprint()
+_last_watch_check = time.monotonic()
+_watch_lock = threading.Lock()
+_model_change_hooks = []
 
-def predict_disease(patient_dict):
+_prediction_cache = LRUCache(PREDICT_CACHE_SIZE)
+
+
+def register_model_change_hook(fn):
+    """Call fn() after the model artifact changes on disk and has been reloaded."""
+    _model_change_hooks.append(fn)
+    return fn
+
+
+register_model_change_hook(_prediction_cache.clear)
+
+_pool = None
+if PREDICT_WORKERS > 0:
+    from predictor_pool import PredictorPool
+
+    _pool = PredictorPool(
+        PREDICT_WORKERS,
+        engine=ENGINE,
+        artifact_path=ARTIFACT_PATH,
+        n_features=len(FEATURE_INDEX),
+        n_classes=len(labels),
+        max_rows=PREDICT_WORKER_MAX_ROWS,
+    )
+    register_model_change_hook(_pool.restart)
+    atexit.register(_pool.close)
+
+
+def reload_model():
+    """Reload the model artifact now and fire every model-change hook (e.g. cache invalidation)."""
+    global _loaded_fingerprint
+    with _watch_lock:
+        _load_model()
+        _loaded_fingerprint = _artifact_fingerprint()
+    for hook in list(_model_change_hooks):
+        try:
+            hook()
+        except Exception as exc:
+            print(f"[sicknessPredictor] model change hook {hook!r} failed: {exc}")
+
+
+def _check_model_artifact():
+    """Cheap, rate-limited stat() of the artifact files; reloads when they change."""
+    global _last_watch_check
+    now = time.monotonic()
+    if MODEL_WATCH_INTERVAL <= 0 or now - _last_watch_check < MODEL_WATCH_INTERVAL:
+        return
+    _last_watch_check = now
+    if _artifact_fingerprint() != _loaded_fingerprint:
+        print("[sicknessPredictor] model artifact changed on disk, reloading")
+        reload_model()
+
+
+def _symptom_bitmask(row):
+    """Pack a 0/1 symptom row into (width, int) or return None if any value is not binary."""
+    active = row != 0
+    if not np.all(row[active] == 1):
+        return None
+    packed = np.packbits(active, bitorder="little").tobytes()
+    return len(row), int.from_bytes(packed, "little")
+
+
+def _active_indices(symptom_names):
+    """Map active symptom names to training columns; unknown names are an error."""
+    idx = []
+    unknown = []
+    for name in symptom_names:
+        i = FEATURE_INDEX.get(name)
+        if i is None:
+            unknown.append(name)
+        else:
+            idx.append(i)
+    if unknown:
+        raise ValueError(f"Unknown symptoms: {', '.join(map(str, unknown))}")
+    return idx
+
+
+def _encode_into(patient, row):
     """
-    patient_dict: dictionary of symptom features (0/1)
+    Write one patient into a zeroed feature row.
+
+    patient: list of active symptom names (preferred), or a symptom dict. Dicts whose keys are
+    all known feature names are placed by name; anything else falls back to the legacy
+    positional order, which must match the training column count exactly.
+    """
+    if isinstance(patient, dict):
+        if all(k in FEATURE_INDEX for k in patient):
+            for name, value in patient.items():
+                row[FEATURE_INDEX[name]] = value
+            return
+        values = list(patient.values())
+        if len(values) != len(row):
+            raise ValueError(f"{len(values)} symptoms given, expected {len(row)} (or use symptom names)")
+        row[:] = values
+        return
+    if isinstance(patient, str):
+        raise ValueError("symptoms must be a list of names or a symptom dict")
+    row[_active_indices(patient)] = 1
+
+
+def _encode_batch(patients):
+    """Encode every patient into one preallocated (n_patients, n_features) float32 matrix."""
+    x = np.zeros((len(patients), len(FEATURE_INDEX)), dtype=np.float32)
+    for i, patient in enumerate(patients):
+        try:
+            _encode_into(patient, x[i])
+        except ValueError as exc:
+            raise ValueError(f"patient {i}: {exc}") from None
+    return x
+
+
+def active_symptom_names(patient):
+    """Names of the symptoms flagged in a patient payload (list of names or symptom dict)."""
+    if isinstance(patient, dict):
+        return [k for k, v in patient.items() if v == 1]
+    return list(patient)
+
+
+def _predict_matrix(x):
+    """
+    x: (n_patients, n_features) array of symptom flags
+    returns: (n_patients, n_classes) array of class probabilities
+    """
+    # One scaler pass and one model dispatch for the whole matrix
+    if _pool is not None:
+        return _pool.predict_proba(x)
+    if ENGINE == "keras":
+        x_scaled = scaler.transform(x)
+        return model.predict(x_scaled, batch_size=min(len(x), MAX_PREDICT_BATCH), verbose=0)
+    return model.predict_proba(x)
+
+
+def _predict_rows(rows):
+    """Batch function for the micro-batcher: one probability row per encoded feature row."""
+    return list(_predict_matrix(np.stack(rows)))
+
+
+_batcher = None
+if MICROBATCH_ENABLED:
+    from prediction_batcher import MicroBatcher
+
+    _batcher = MicroBatcher(
+        _predict_rows,
+        window_ms=MICROBATCH_WINDOW_MS,
+        max_rows=MICROBATCH_MAX_ROWS,
+        name="sickness-microbatcher",
+    )
+
+
+def _cache_store(key, probs):
+    """Memoize (label, read-only probability vector) for a bitmask key; returns the entry."""
+    probs = np.array(probs, dtype=np.float32)
+    probs.setflags(write=False)
+    entry = (str(labels[int(probs.argmax())]), probs)
+    if key is not None:
+        _prediction_cache.put(key, entry)
+    return entry
+
+
+def predict_disease_batch(patients):
+    """
+    patients: list of patients, each a list of active symptom names or a symptom dict (0/1)
+    returns: list of {"disease": str, "probabilities": {label: float}} in input order
+    """
+    if not patients:
+        return []
+    _check_model_artifact()
+
+    # Stack every patient into one matrix
+    x = _encode_batch(patients)
+
+    # Serve repeated symptom combinations from the cache; score only the misses
+    keys = [_symptom_bitmask(row) for row in x]
+    entries = [_prediction_cache.get(k) if k is not None else None for k in keys]
+    missing = [i for i, e in enumerate(entries) if e is None]
+    if missing:
+        pred_probs = _predict_matrix(x[missing])
+        for i, probs in zip(missing, pred_probs):
+            entries[i] = _cache_store(keys[i], probs)
+
+    label_list = labels.tolist()
+    return [
+        {
+            "disease": disease,
+            "probabilities": dict(zip(label_list, probs.tolist())),
+        }
+        for disease, probs in entries
+    ]
+
+
+def predictor_metrics():
+    """Engine name plus cache, worker-pool and micro-batcher metrics (None when that feature is off)."""
+    return {
+        "engine": ENGINE,
+        "cache": _prediction_cache.stats(),
+        "pool": _pool.metrics() if _pool else None,
+        "microbatch": _batcher.metrics() if _batcher else None,
+    }
+
+
+def predict_disease(patient):
+    """
+    patient: list of active symptom names, e.g. ["itching", "chills"],
+             or a symptom dict of 0/1 flags keyed by symptom name
     returns: predicted disease as string
     """
-    # Convert dictionary to array (ensure order matches training data)
-    x = np.array([list(patient_dict.values())])
-    
-    # Scale features
-    x_scaled = scaler.transform(x)
-    
-    # Predict class index
-    pred_probs = model.predict(x_scaled)
-    pred_class = pred_probs.argmax(axis=1)
-    
+    _check_model_artifact()
+
+    # Place each symptom in its training column (order of the payload no longer matters)
+    x = np.zeros((1, len(FEATURE_INDEX)), dtype=np.float32)
+    row = x[0]
+    _encode_into(patient, row)
+
+    # Repeated symptom combinations skip scaling and inference entirely
+    key = _symptom_bitmask(row)
+    if key is not None:
+        cached = _prediction_cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+    if _batcher is not None:
+        # Concurrent callers share one model call; this blocks until our row is scored
+        pred_probs = _batcher(row)
+    else:
+        # Scale features and predict class probabilities
+        pred_probs = _predict_matrix(x)[0]
+
     # Convert class index to disease label
-    disease = le.inverse_transform(pred_class)[0]
-    
-    return disease
+    disease, _ = _cache_store(key, pred_probs)
 
+    return disease
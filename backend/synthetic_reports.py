@@ -0,0 +1,241 @@
+"""
+synthetic_reports.py — Reproducible synthetic lab-report PDFs with ground truth
+--------------------------------------------------------------------------------
+Generates a corpus of bloodwork PDFs for benchmarking extract_bloodwork
+(see bench_extraction.py). Everything is derived from --seed, so the same
+command always produces byte-identical files.
+
+Each report varies:
+  - page count (1 to --max-pages, skewed towards short reports)
+  - layout: "list" (Name: value unit), "table" (name / value / unit / range
+    columns) or "two_column" (two marker columns per line)
+  - which biomarkers are present, their order and the page they land on
+  - noise: header/footer lines, other analytes, comments, H/L flags, label
+    case, and a share of "hard" label variants (e.g. "HDL Cholesterol 45")
+    that the current patterns are known to miss
+
+PDFs are written directly (Helvetica text only), so no PDF library is needed.
+
+Output:
+    <out>/report_0000.pdf ...
+    <out>/manifest.jsonl   one line per PDF:
+        {"pdf", "pages", "layout", "seed", "truth": {biomarker: value}}
+    The manifest doubles as a run_pipeline.py batch manifest.
+
+Usage:
+    python synthetic_reports.py <out_dir> [--count 50] [--max-pages 40] [--seed 0]
+                                          [--hard-ratio 0.1]
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+
+# biomarker -> (labels the patterns should match, hard label variants, unit, value range, decimals)
+MARKERS = {
+    "total_cholesterol": (["Total Cholesterol"], ["Cholesterol, Total"], "mg/dL", (120, 300), 0),
+    "ldl": (["LDL", "Low Density"], ["LDL Cholesterol"], "mg/dL", (50, 220), 0),
+    "hdl": (["HDL", "High Density"], ["HDL Cholesterol"], "mg/dL", (25, 95), 0),
+    "triglycerides": (["Triglycerides", "Triglyceride"], [], "mg/dL", (40, 400), 0),
+    "glucose": (["Glucose"], ["Glucose, Fasting"], "mg/dL", (60, 200), 0),
+    "hba1c": (["HbA1c", "HA1c"], ["Hemoglobin A1c"], "%", (4.0, 11.0), 1),
+    "hemoglobin": (["Hemoglobin"], ["Hgb"], "g/dL", (9.0, 18.0), 1),
+    "hematocrit": (["Hematocrit"], ["Hct"], "%", (30.0, 52.0), 1),
+    "wbc": (["WBC", "White Blood"], ["White Blood Cell Count"], "K/uL", (3.0, 14.0), 1),
+    "platelets": (["Platelets", "Platelet"], ["Platelet Count"], "K/uL", (120, 450), 0),
+    "vitamin_d": (["Vitamin D"], ["Vitamin D, 25-Hydroxy"], "ng/mL", (8.0, 80.0), 1),
+    "vitamin_b12": (["Vitamin B12"], ["B12"], "pg/mL", (150, 1100), 0),
+    "ferritin": (["Ferritin"], [], "ng/mL", (8, 400), 0),
+    "iron": (["Iron"], ["Iron, Serum"], "ug/dL", (30, 200), 0),
+    "tsh": (["TSH"], ["Thyroid Stimulating Hormone"], "uIU/mL", (0.3, 6.0), 2),
+    "creatinine": (["Creatinine"], ["Creatinine, Serum"], "mg/dL", (0.5, 1.8), 2),
+    "bun": (["BUN"], ["Urea Nitrogen (BUN)"], "mg/dL", (6, 35), 0),
+    "alt": (["ALT"], ["ALT (SGPT)"], "U/L", (7, 90), 0),
+    "ast": (["AST"], ["AST (SGOT)"], "U/L", (8, 80), 0),
+}
+
+# Analytes that share no keyword with BIOMARKER_PATTERNS
+FILLER_ANALYTES = [
+    ("Sodium", "mmol/L", (133, 147)), ("Potassium", "mmol/L", (3.4, 5.3)),
+    ("Chloride", "mmol/L", (96, 109)), ("Calcium", "mg/dL", (8.4, 10.4)),
+    ("Magnesium", "mg/dL", (1.6, 2.6)), ("Albumin", "g/dL", (3.4, 5.2)),
+    ("Globulin", "g/dL", (1.9, 3.9)), ("Bilirubin, Total", "mg/dL", (0.1, 1.3)),
+    ("Alkaline Phosphatase", "U/L", (35, 130)), ("Uric Acid", "mg/dL", (2.5, 8.0)),
+    ("Neutrophils", "%", (40, 75)), ("Lymphocytes", "%", (18, 45)),
+    ("Monocytes", "%", (2, 11)), ("Eosinophils", "%", (0, 6)), ("MCV", "fL", (79, 99)),
+    ("MCHC", "g/dL", (31, 36)), ("RDW", "%", (11.5, 15.5)), ("GGT", "U/L", (8, 65)),
+    ("CRP", "mg/L", (0.1, 9.0)), ("PSA", "ng/mL", (0.1, 4.5)), ("Cortisol", "ug/dL", (4, 22)),
+]
+LAB_NAMES = ["Northside Clinical Laboratory", "Metro Diagnostics", "Riverside Pathology Group"]
+COMMENTS = [
+    "Specimen received in good condition.",
+    "Results should be interpreted in the context of clinical findings.",
+    "Reference intervals are age and sex specific.",
+    "Please contact the laboratory with any questions regarding this report.",
+    "Sample was collected after an overnight fast.",
+    "Repeat testing is recommended if results are unexpected.",
+]
+LAYOUTS = ("list", "table", "two_column")
+
+PAGE_W, PAGE_H = 612, 792
+TOP, BOTTOM, LEADING = 740, 60, 14
+LINES_PER_PAGE = (TOP - BOTTOM) // LEADING
+
+
+# ── Minimal PDF writer ────────────────────────────────────────────────────────
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages, font_size=10):
+    """
+    pages: list of pages, each a list of (x, y, text) items.
+    Writes a PDF with one Helvetica font and one content stream per page.
+    """
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    kids = []
+    for i, items in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        stream = "\n".join(
+            f"BT /F1 {font_size} Tf {x:.1f} {y:.1f} Td ({_pdf_escape(text)}) Tj ET" for x, y, text in items
+        )
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_W} {PAGE_H}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        objects[content_id] = f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += f"{obj_id} 0 obj\n{objects[obj_id]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    size = max(objects) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode()
+    for obj_id in range(1, size):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    Path(path).write_bytes(bytes(out))
+
+
+# ── Report generation ─────────────────────────────────────────────────────────
+
+def _value(rng, lo, hi, decimals):
+    value = round(rng.uniform(lo, hi), decimals)
+    return value, (f"{value:.{decimals}f}" if decimals else str(int(value)))
+
+
+def _case(rng, label):
+    return rng.choice([label, label, label.upper()])
+
+
+def _row(rng, label, text_value, unit, lo, hi):
+    """One result row as (label, value text, unit, reference range)."""
+    flag = rng.choice(["", "", "", " H", " L"])
+    return label, text_value + flag, unit, f"{lo} - {hi}"
+
+
+def _page_lines(rows, layout):
+    """Lay out one page's result rows as positioned (x, y, text) items."""
+    items = []
+    y = TOP
+    if layout == "two_column":
+        for i in range(0, len(rows), 2):
+            for col, row in enumerate(rows[i:i + 2]):
+                label, value, unit, _ = row
+                x = 50 if col == 0 else 320
+                items.append((x, y, f"{label}: {value} {unit}"))
+            y -= LEADING
+    else:
+        for label, value, unit, ref in rows:
+            if unit is None:  # free text line
+                items.append((50, y, label))
+            elif layout == "table":
+                items.extend([(50, y, label), (250, y, value), (330, y, unit), (420, y, ref)])
+            else:
+                items.append((50, y, f"{label}: {value} {unit}"))
+            y -= LEADING
+    return items
+
+
+def generate_report(seed, max_pages=40, hard_ratio=0.1):
+    """
+    Build one synthetic report.
+
+    Returns:
+        (pages, meta) where pages is the write_pdf() input and meta holds
+        layout, page count and the ground-truth {biomarker: value}
+    """
+    rng = random.Random(seed)
+    n_pages = min(max_pages, max(1, int(rng.paretovariate(1.2))))
+    layout = rng.choice(LAYOUTS)
+    lab = rng.choice(LAB_NAMES)
+    patient_id = rng.randint(100000, 999999)
+
+    present = [m for m in MARKERS if rng.random() < 0.8]
+    rng.shuffle(present)
+    truth = {}
+    pages_rows = [[] for _ in range(n_pages)]
+    for marker in present:
+        labels, hard_labels, unit, (lo, hi), decimals = MARKERS[marker]
+        label = rng.choice(hard_labels) if hard_labels and rng.random() < hard_ratio else rng.choice(labels)
+        value, text_value = _value(rng, lo, hi, decimals)
+        truth[marker] = value
+        pages_rows[rng.randrange(n_pages)].append(_row(rng, _case(rng, label), text_value, unit, lo, hi))
+
+    body_lines = LINES_PER_PAGE - 4  # header (2) + footer (2)
+    for rows in pages_rows:
+        while len(rows) < body_lines * (2 if layout == "two_column" else 1) * rng.uniform(0.5, 0.95):
+            if rng.random() < 0.15 and layout != "two_column":
+                rows.insert(rng.randrange(len(rows) + 1), (rng.choice(COMMENTS), None, None, None))
+            else:
+                name, unit, (lo, hi) = rng.choice(FILLER_ANALYTES)
+                _, text_value = _value(rng, lo, hi, 1)
+                rows.insert(rng.randrange(len(rows) + 1), _row(rng, _case(rng, name), text_value, unit, lo, hi))
+
+    pages = []
+    for number, rows in enumerate(pages_rows, start=1):
+        items = [(50, TOP + 2 * LEADING, lab), (50, TOP + LEADING, f"Patient ID {patient_id}  Collected 2026-03-0{number % 9 + 1}")]
+        items += _page_lines(rows, layout)
+        items.append((50, BOTTOM - LEADING, f"Page {number} of {n_pages}"))
+        pages.append(items)
+
+    return pages, {"pages": n_pages, "layout": layout, "seed": seed, "truth": truth}
+
+
+def generate_corpus(out_dir, count=50, max_pages=40, seed=0, hard_ratio=0.1):
+    """Write `count` reports plus manifest.jsonl into out_dir; returns the manifest path."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = out_dir / "manifest.jsonl"
+    with open(manifest, "w", encoding="utf-8") as f:
+        for i in range(count):
+            pages, meta = generate_report(seed * 1_000_003 + i, max_pages, hard_ratio)
+            name = f"report_{i:04d}.pdf"
+            write_pdf(out_dir / name, pages)
+            f.write(json.dumps({"pdf": name, **meta}) + "\n")
+    return manifest
+
+
+# ── CLI entrypoint ────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic lab-report PDF corpus")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--max-pages", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hard-ratio", type=float, default=0.1,
+                        help="Share of markers printed with a label variant the patterns may miss")
+    args = parser.parse_args()
+
+    manifest = generate_corpus(args.out_dir, args.count, args.max_pages, args.seed, args.hard_ratio)
+    print(f"Saved {args.count} reports + {manifest}")
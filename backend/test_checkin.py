@@ -0,0 +1,25 @@
+import checkin
+
+
+def _at(step):
+    """A started check-in waiting for the answer to QUESTIONS[step]."""
+    return {"started": True, "step": step, "answers": {}}
+
+
+def test_unparseable_steps_answer_gets_a_number_hint():
+    reply, state = checkin.advance(_at(0), "I walked to the shop and back")
+    assert reply == f"{checkin.NUMBER_HINTS['steps']} {checkin.QUESTIONS[0][1]}"
+    assert state["step"] == 0 and state["answers"] == {}
+
+
+def test_unparseable_water_and_rating_answers_get_their_own_hints():
+    water, _ = checkin.advance(_at(2), "quite a lot")
+    rating, _ = checkin.advance(_at(4), "pretty good")
+    assert water.startswith(checkin.NUMBER_HINTS["water"])
+    assert rating.startswith(checkin.NUMBER_HINTS["rating"])
+
+
+def test_parseable_steps_answer_moves_on():
+    reply, state = checkin.advance(_at(0), "about 8k")
+    assert state["answers"] == {"steps": 8000}
+    assert reply.endswith(checkin.QUESTIONS[1][1])
@@ -1,14 +1,14 @@
 import os
-import requests
 from dotenv import load_dotenv
 
+import upstream
+
 load_dotenv()
 
 LEMONFOX_URL = "https://api.lemonfox.ai/v1/audio/speech"
 
 
-def text_to_speech(text: str, voice: str = "sarah", response_format: str = "mp3") -> bytes:
-    """Call LEMONFOX TTS API and return audio bytes."""
+def _prepare_request(text: str, voice: str, response_format: str) -> tuple[dict, dict]:
     api_key = os.getenv("LEMONFOX_TTS")
     if not api_key:
         raise ValueError("LEMONFOX_TTS environment variable is not set")
@@ -21,7 +21,21 @@ def text_to_speech(text: str, voice: str = "sarah", response_format: str = "mp3"
         "voice": voice,
         "response_format": response_format,
     }
-    response = requests.post(LEMONFOX_URL, headers=headers, json=data, timeout=30)
+    return headers, data
+
+
+def text_to_speech(text: str, voice: str = "sarah", response_format: str = "mp3") -> bytes:
+    """Call LEMONFOX TTS API and return audio bytes."""
+    headers, data = _prepare_request(text, voice, response_format)
+    response = upstream.post("lemonfox", LEMONFOX_URL, headers=headers, json=data)
+    response.raise_for_status()
+    return response.content
+
+
+async def atext_to_speech(text: str, voice: str = "sarah", response_format: str = "mp3") -> bytes:
+    """Async variant of text_to_speech()."""
+    headers, data = _prepare_request(text, voice, response_format)
+    response = await upstream.apost("lemonfox", LEMONFOX_URL, headers=headers, json=data)
     response.raise_for_status()
     return response.content
 
@@ -0,0 +1,100 @@
+"""
+upload_stream.py — Size-capped PDF uploads without named temp files
+--------------------------------------------------------------------
+Starlette's multipart parser already streams each uploaded file into a
+SpooledTemporaryFile (kept in memory up to 1 MB, then rolled over to an
+anonymous temp file). The bloodwork endpoints hand that buffer straight to
+pdfplumber instead of copying it into a NamedTemporaryFile, so memory per
+upload stays bounded and nothing is left behind on disk.
+
+  - UploadSizeLimitMiddleware rejects oversized request bodies with 413
+    while they are still being received (Content-Length up front, a byte
+    counter for chunked bodies)
+  - hash_upload() reads the spooled file in chunks, enforcing the same cap
+    and returning the SHA-256 used by bloodwork_cache
+
+Config (.env):
+    BLOODWORK_UPLOAD_MAX_MB     max PDF upload size, default 20
+"""
+
+import hashlib
+import os
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+UPLOAD_MAX_BYTES = int(float(os.getenv("BLOODWORK_UPLOAD_MAX_MB") or 20) * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _too_large_detail(max_bytes):
+    return f"Upload exceeds the {max_bytes / (1024 * 1024):g} MB limit"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware capping the request body size on the given paths.
+
+    The multipart form is parsed before the endpoint runs, so the cap has to be
+    enforced here, while the body streams in, rather than inside the endpoint.
+    """
+
+    def __init__(self, app, max_bytes=UPLOAD_MAX_BYTES, paths=()):
+        self.app = app
+        self.max_bytes = int(max_bytes)
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = _too_large_detail(self.max_bytes)
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPException from body parsing, so this becomes a 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def hash_upload(file, max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Read an UploadFile in chunks and rewind it.
+
+    Returns:
+        (sha256 hex digest, size in bytes)
+
+    Raises:
+        UploadTooLarge if the file is bigger than max_bytes
+    """
+    h = hashlib.sha256()
+    size = 0
+    await file.seek(0)
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(_too_large_detail(max_bytes))
+        h.update(chunk)
+    await file.seek(0)
+    return h.hexdigest(), size
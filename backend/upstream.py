@@ -0,0 +1,155 @@
+"""
+upstream.py — Shared, pooled HTTP clients for every outbound API
+-----------------------------------------------------------------
+Each upstream (Featherless, LemonFox, Cal.com, Resend, Firebase Auth, job
+webhooks) gets one long-lived client, so keep-alive connections are reused
+instead of paying a TCP + TLS handshake per call:
+
+  - session(name)       requests.Session for sync callers (CLI, batch jobs,
+                        the APScheduler thread); post() / get() / request()
+  - async_client(name)  httpx.AsyncClient for FastAPI handlers, which await
+                        apost() / aget() / arequest() / astream() instead of
+                        holding a thread-pool thread for the whole call
+
+Both clients cap connections per upstream (callers wait for a free
+connection rather than opening more) and apply the upstream's timeout unless
+the call passes its own.
+
+Config (.env), NAME = FEATHERLESS, LEMONFOX, CAL, RESEND, FIREBASE, WEBHOOK:
+    UPSTREAM_<NAME>_TIMEOUT           read timeout in seconds
+    UPSTREAM_<NAME>_MAX_CONNECTIONS   concurrent connections
+    UPSTREAM_CONNECT_TIMEOUT          connect timeout for all upstreams, default 10
+"""
+
+import asyncio
+import os
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT") or 10)
+
+# name -> defaults; each can be overridden from .env
+_DEFAULTS = {
+    "featherless": {"timeout": 120.0, "max_connections": 32},
+    "lemonfox": {"timeout": 30.0, "max_connections": 8},
+    "cal": {"timeout": 15.0, "max_connections": 8},
+    "resend": {"timeout": 10.0, "max_connections": 4},
+    "firebase": {"timeout": 10.0, "max_connections": 4},
+    "webhook": {"timeout": 10.0, "max_connections": 8},
+}
+
+UPSTREAMS = {
+    name: {
+        "timeout": float(os.getenv(f"UPSTREAM_{name.upper()}_TIMEOUT") or cfg["timeout"]),
+        "max_connections": int(os.getenv(f"UPSTREAM_{name.upper()}_MAX_CONNECTIONS") or cfg["max_connections"]),
+    }
+    for name, cfg in _DEFAULTS.items()
+}
+
+_sessions = {}
+_async_clients = {}  # name -> (event loop, AsyncClient)
+_lock = threading.Lock()
+
+
+def _config(name):
+    try:
+        return UPSTREAMS[name]
+    except KeyError:
+        raise ValueError(f"Unknown upstream {name!r}; expected one of {sorted(UPSTREAMS)}") from None
+
+
+# ── sync ──
+
+def session(name):
+    """The shared requests.Session for an upstream (thread-safe for independent requests)."""
+    with _lock:
+        s = _sessions.get(name)
+        if s is None:
+            limit = _config(name)["max_connections"]
+            # pool_block: wait for a free connection instead of opening (and discarding) extras
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=limit, pool_block=True)
+            s = requests.Session()
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[name] = s
+        return s
+
+
+def request(name, method, url, timeout=None, **kwargs):
+    """requests.request() through the upstream's pooled session."""
+    read = timeout if timeout is not None else _config(name)["timeout"]
+    return session(name).request(method, url, timeout=(CONNECT_TIMEOUT, read), **kwargs)
+
+
+def post(name, url, **kwargs):
+    return request(name, "POST", url, **kwargs)
+
+
+def get(name, url, **kwargs):
+    return request(name, "GET", url, **kwargs)
+
+
+# ── async ──
+
+def async_client(name):
+    """
+    The shared httpx.AsyncClient for an upstream on the running event loop.
+
+    Connections belong to the loop that opened them, so a client is rebuilt if
+    it was created on a different loop (tests, or a restarted server).
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(name)
+    if entry is None or entry[0] is not loop:
+        cfg = _config(name)
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(cfg["timeout"], connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=cfg["max_connections"],
+                                max_keepalive_connections=cfg["max_connections"]),
+        )
+        entry = _async_clients[name] = (loop, client)
+    return entry[1]
+
+
+def _async_timeout(timeout):
+    return {} if timeout is None else {"timeout": httpx.Timeout(timeout, connect=CONNECT_TIMEOUT)}
+
+
+async def arequest(name, method, url, timeout=None, **kwargs):
+    """Async request through the upstream's pooled client; returns an httpx.Response."""
+    return await async_client(name).request(method, url, **_async_timeout(timeout), **kwargs)
+
+
+async def apost(name, url, **kwargs):
+    return await arequest(name, "POST", url, **kwargs)
+
+
+async def aget(name, url, **kwargs):
+    return await arequest(name, "GET", url, **kwargs)
+
+
+def astream(name, method, url, timeout=None, **kwargs):
+    """Streaming request: `async with upstream.astream(...) as response:`."""
+    return async_client(name).stream(method, url, **_async_timeout(timeout), **kwargs)
+
+
+# ── lifecycle ──
+
+def close():
+    """Close the sync sessions (process exit)."""
+    with _lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
+
+
+async def aclose():
+    """Close the async clients opened on the running loop (app shutdown)."""
+    loop = asyncio.get_running_loop()
+    for name, (client_loop, client) in list(_async_clients.items()):
+        if client_loop is loop:
+            await client.aclose()
+            del _async_clients[name]
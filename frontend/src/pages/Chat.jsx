@@ -21,44 +21,55 @@ export default function Chat() {
   const [recording, setRecording] = useState(false)
   const [interimTranscript, setInterimTranscript] = useState('')
   const [playingId, setPlayingId] = useState(null)
-  const [userContext, setUserContext] = useState({})
+  const [streamingText, setStreamingText] = useState('')
   const recognitionRef = useRef(null)
   const messagesEndRef = useRef(null)
   const audioRef = useRef(null)
+  const streamAbortRef = useRef(null)
+  // Server-side chat session: history and patient context live on the backend
+  const sessionRef = useRef(null)
+  // Resolves with the patient context once loaded; sessions wait for it, since
+  // the context is rendered into the session when it is created
+  const contextReadyRef = useRef(null)
 
   const switchMode = (newMode) => {
     if (newMode === mode) return
     setMode(newMode)
     setMessages([])
+    sessionRef.current = null
     setInput('')
     setError(null)
     setInterimTranscript('')
   }
 
   const scrollToBottom = () => messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
-  useEffect(() => { scrollToBottom() }, [messages])
+  useEffect(() => { scrollToBottom() }, [messages, streamingText])
+
+  // Leaving the page cancels an in-flight reply, so the backend stops generating it
+  useEffect(() => () => streamAbortRef.current?.abort(), [])
 
   // Fetch biomarkers + backgroundInfo once on mount
   useEffect(() => {
     const fetchContext = async () => {
       const user = auth.currentUser
-      if (!user) return
+      if (!user) return {}
       try {
         const [userSnap, bgSnap] = await Promise.all([
           getDoc(doc(firestore, 'users', user.uid)),
           getDoc(doc(firestore, 'users', user.uid, 'backgroundInfo', 'info')),
         ])
         const userData = userSnap.exists() ? userSnap.data() : {}
-        setUserContext({
+        return {
           biomarkers: userData.biomarkers || null,
           symptoms: userData.symptoms || null,
           backgroundInfo: bgSnap.exists() ? bgSnap.data() : null,
-        })
+        }
       } catch (e) {
         console.warn('Could not load patient context:', e)
+        return {}
       }
     }
-    fetchContext()
+    contextReadyRef.current = fetchContext()
   }, [])
 
   useEffect(() => {
@@ -114,19 +125,70 @@ export default function Chat() {
     setInterimTranscript('')
   }
 
-  const callChat = async (msgs, currentMode) => {
-    const user = auth.currentUser
-    if (!user) throw new Error('No logged-in user found.')
-    const chatRef = collection(firestore, 'users', user.uid, 'chats')
-    const chatMessages = msgs.map((m) => ({ role: m.role, content: m.content }))
-    const res = await fetch('/api/chat', {
+  const openSession = async (currentMode) => {
+    const res = await fetch('/api/chat/sessions', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ messages: chatMessages, mode: currentMode, user_context: userContext }),
+      body: JSON.stringify({ mode: currentMode, user_context: (await contextReadyRef.current) || {} }),
     })
     const data = await res.json()
-    if (!res.ok) throw new Error(data.detail || 'Chat failed')
-    const assistantMsg = { role: 'assistant', content: data.message }
+    if (!res.ok) throw new Error(data.detail || 'Could not start chat')
+    sessionRef.current = data.session_id
+    return data.session_id
+  }
+
+  // Sends only the new message; pass fresh to start a new conversation
+  const callChat = async (text, currentMode, fresh = false) => {
+    const user = auth.currentUser
+    if (!user) throw new Error('No logged-in user found.')
+    const chatRef = collection(firestore, 'users', user.uid, 'chats')
+    const controller = new AbortController()
+    streamAbortRef.current = controller
+    let reply = null
+    try {
+      const sessionId = (!fresh && sessionRef.current) || (await openSession(currentMode))
+      const post = (id) => fetch(`/api/chat/sessions/${id}/messages/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ content: text }),
+        signal: controller.signal,
+      })
+      let res = await post(sessionId)
+      // Session expired on the server: continue in a new one
+      if (res.status === 404) res = await post(await openSession(currentMode))
+      if (!res.ok) {
+        const data = await res.json().catch(() => ({}))
+        throw new Error(data.detail || 'Chat failed')
+      }
+      // Server-sent events: "event: delta|done|error" followed by a JSON "data:" line
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let partial = ''
+      while (reply === null) {
+        const { value, done } = await reader.read()
+        if (done) throw new Error('Chat stream ended unexpectedly')
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1]
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}')
+          if (event === 'delta') {
+            partial += data.text
+            setStreamingText(partial)
+          } else if (event === 'done') {
+            reply = data.message
+          } else if (event === 'error') {
+            throw new Error(data.detail || 'Chat failed')
+          }
+        }
+      }
+    } finally {
+      streamAbortRef.current = null
+      setStreamingText('')
+    }
+    const assistantMsg = { role: 'assistant', content: reply }
     await addDoc(chatRef, { ...assistantMsg, timestamp: serverTimestamp() })
     return assistantMsg
   }
@@ -153,7 +215,7 @@ export default function Chat() {
       const chatRef = collection(firestore, 'users', user.uid, 'chats')
       await addDoc(chatRef, { ...userMsg, timestamp: serverTimestamp() })
 
-      const assistantMsg = await callChat(nextMessages, mode)
+      const assistantMsg = await callChat(text, mode)
       setMessages((prev) => [...prev, assistantMsg])
     } catch (err) {
       console.error(err)
@@ -170,7 +232,7 @@ export default function Chat() {
     setLoading(true)
     setError(null)
     try {
-      const assistantMsg = await callChat([{ role: 'user', content: 'Start my daily check-in.' }], 'checkin')
+      const assistantMsg = await callChat('Start my daily check-in.', 'checkin', true)
       setMessages([assistantMsg])
     } catch (err) {
       setError(err.message || 'Could not start check-in.')
@@ -280,11 +342,15 @@ export default function Chat() {
             {loading && (
               <div className="chat-msg chat-msg--assistant">
                 <span className="chat-msg-role">Assistant</span>
-                <p className="chat-msg-content chat-msg-loading">
-                  <span className="typing-dot" />
-                  <span className="typing-dot" />
-                  <span className="typing-dot" />
-                </p>
+                {streamingText ? (
+                  <p className="chat-msg-content">{streamingText}</p>
+                ) : (
+                  <p className="chat-msg-content chat-msg-loading">
+                    <span className="typing-dot" />
+                    <span className="typing-dot" />
+                    <span className="typing-dot" />
+                  </p>
+                )}
               </div>
             )}
             <div ref={messagesEndRef} />
@@ -10,8 +10,9 @@ function ChatWidget() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
-  const [userContext, setUserContext] = useState({});
   const endRef = useRef(null);
+  const sessionRef = useRef(null);
+  const contextReadyRef = useRef(null); // patient context, awaited before a session is created
 
   useEffect(() => { endRef.current?.scrollIntoView({ behavior: "smooth" }); }, [messages]);
 
@@ -19,23 +20,24 @@ function ChatWidget() {
   useEffect(() => {
     const fetchContext = async () => {
       const user = auth.currentUser;
-      if (!user) return;
+      if (!user) return {};
       try {
         const [userSnap, bgSnap] = await Promise.all([
           getDoc(doc(firestore, "users", user.uid)),
           getDoc(doc(firestore, "users", user.uid, "backgroundInfo", "info")),
         ]);
         const userData = userSnap.exists() ? userSnap.data() : {};
-        setUserContext({
+        return {
           biomarkers: userData.biomarkers || null,
           symptoms: userData.symptoms || null,
           backgroundInfo: bgSnap.exists() ? bgSnap.data() : null,
-        });
+        };
       } catch (e) {
         console.warn("Could not load patient context:", e);
+        return {};
       }
     };
-    fetchContext();
+    contextReadyRef.current = fetchContext();
   }, []);
 
   const send = async () => {
@@ -45,17 +47,28 @@ function ChatWidget() {
     const userMsg = { role: "user", content: text };
     setMessages((p) => [...p, userMsg]);
     setLoading(true);
-    try {
-      const res = await fetch("/api/chat", {
+    // History and patient context are kept server-side; only the new message is sent
+    const openSession = async () => {
+      const res = await fetch("/api/chat/sessions", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          messages: [...messages, userMsg].map((m) => ({ role: m.role, content: m.content })),
-          user_context: userContext,
-        }),
+        body: JSON.stringify({ mode: "general", user_context: (await contextReadyRef.current) || {} }),
       });
       const data = await res.json();
       if (!res.ok) throw new Error(data.detail || "Chat failed");
+      sessionRef.current = data.session_id;
+      return data.session_id;
+    };
+    const post = (id) => fetch(`/api/chat/sessions/${id}/messages`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ content: text }),
+    });
+    try {
+      let res = await post(sessionRef.current || (await openSession()));
+      if (res.status === 404) res = await post(await openSession());
+      const data = await res.json();
+      if (!res.ok) throw new Error(data.detail || "Chat failed");
       setMessages((p) => [...p, { role: "assistant", content: data.message }]);
     } catch (err) {
       setMessages((p) => [...p, { role: "assistant", content: "Sorry, something went wrong. Please try again." }]);
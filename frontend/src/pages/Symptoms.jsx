@@ -92,9 +92,11 @@ export default function Symptoms() {
     setPredError(null);
     setPredicting(true);
 
+    // Active symptom names only; the backend maps them to model columns
+    const symptomsArray = SYMPTOM_KEYS_ORDER.filter((k) => selected.has(k));
+
     // Save selected symptoms as an array to users/{uid}
     if (user) {
-      const symptomsArray = SYMPTOM_KEYS_ORDER.filter((k) => selected.has(k));
       setDoc(
         doc(firestore, "users", user.uid),
         { symptoms: symptomsArray, symptoms_updated_at: serverTimestamp() },
@@ -107,7 +109,7 @@ export default function Symptoms() {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
-          symptoms: output,
+          symptoms: symptomsArray,
           patient_name: user?.displayName || "the patient",
           patient_email: user?.email || "",
           doctor_email: doctorEmail.trim(),